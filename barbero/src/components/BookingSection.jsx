@@ -7,9 +7,13 @@ import '../styles/BookingSection.css';
 // ========================
 // Componente del Calendario
 // ========================
-function CalendarPicker({ selectedDate, onDateSelect }) {
+function CalendarPicker({ selectedDate, onDateSelect, onMonthChange }) {
   const [currentMonth, setCurrentMonth] = useState(new Date())
 
+  useEffect(() => {
+    if (onMonthChange) onMonthChange(currentMonth)
+  }, [currentMonth])
+
   const getDaysInMonth = (date) => {
     const year = date.getFullYear()
     const month = date.getMonth()
@@ -112,7 +116,7 @@ function CalendarPicker({ selectedDate, onDateSelect }) {
 // ========================
 // Componente Selector de Horarios
 // ========================
-function TimeSelector({ selectedDate, selectedTime, onTimeSelect }) {
+function TimeSelector({ selectedDate, selectedTime, onTimeSelect, disponibilidadMes }) {
   const [horariosDisponibles, setHorariosDisponibles] = useState([])
   const [bloqueos, setBloqueos] = useState([])
   const [loading, setLoading] = useState(false)
@@ -134,7 +138,8 @@ function TimeSelector({ selectedDate, selectedTime, onTimeSelect }) {
           }
 
           const fechaStr = selectedDate.toISOString().split('T')[0]
-          const data = await turnosService.getHorariosDisponibles(fechaStr)
+          // Usar la disponibilidad ya cargada para el mes; si no está, pedir el día
+          const data = disponibilidadMes[fechaStr] || await turnosService.getHorariosDisponibles(fechaStr)
           setHorariosDisponibles(data.horarios_disponibles || [])
           setBloqueos(data.bloqueos || [])
         } catch (error) {
@@ -225,9 +230,29 @@ function BookingSection({ isVisible, onClose }) {
   const [selectedDate, setSelectedDate] = useState(null)
   const [selectedTime, setSelectedTime] = useState('')
   const [servicios, setServicios] = useState([])
+  const [disponibilidadMes, setDisponibilidadMes] = useState({})
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState('')
 
+  // Carga la disponibilidad de todo el mes visible en una sola request
+  const handleMonthChange = async (month) => {
+    const today = new Date()
+    today.setHours(0, 0, 0, 0)
+    const firstDay = new Date(month.getFullYear(), month.getMonth(), 1)
+    const lastDay = new Date(month.getFullYear(), month.getMonth() + 1, 0)
+    const desde = firstDay < today ? today : firstDay
+    if (lastDay < desde) return
+    try {
+      const data = await turnosService.getDisponibilidadRango(
+        desde.toISOString().split('T')[0],
+        lastDay.toISOString().split('T')[0]
+      )
+      setDisponibilidadMes(prev => ({ ...prev, ...data.dias }))
+    } catch (error) {
+      console.error('Error al cargar disponibilidad del mes:', error)
+    }
+  }
+
   const handleInputChange = (e) => {
     const { name, value } = e.target
     setFormData(prev => ({ ...prev, [name]: value }))
@@ -282,6 +307,7 @@ function BookingSection({ isVisible, onClose }) {
       setFormData({ name: '', lastName: '', phone: '', date: '', time: '', service: '' })
       setSelectedDate(null)
       setSelectedTime('')
+      setDisponibilidadMes({})
       setCurrentStep(1)
       onClose()
     } catch (error) {
@@ -338,8 +364,8 @@ function BookingSection({ isVisible, onClose }) {
 
         {/* Step Content */}
         <div className="step-content-agendar">
-          {currentStep === 1 && <CalendarPicker selectedDate={selectedDate} onDateSelect={handleDateSelect} />}
-          {currentStep === 2 && <TimeSelector selectedDate={selectedDate} selectedTime={selectedTime} onTimeSelect={handleTimeSelect} />}
+          {currentStep === 1 && <CalendarPicker selectedDate={selectedDate} onDateSelect={handleDateSelect} onMonthChange={handleMonthChange} />}
+          {currentStep === 2 && <TimeSelector selectedDate={selectedDate} selectedTime={selectedTime} onTimeSelect={handleTimeSelect} disponibilidadMes={disponibilidadMes} />}
           {currentStep === 3 && (
             <form onSubmit={handleSubmit} className="booking-form-agendar">
               <input type="text" name="name" value={formData.name} onChange={handleInputChange} placeholder="Nombre" required />
@@ -3,6 +3,7 @@ import { Calendar, Users, Clock, User, MessageCircle, Scissors, AlertCircle, Loc
 import { format } from 'date-fns';
 import { es } from 'date-fns/locale';
 import { turnosService } from '../services/api';
+import { config } from '../services/config';
 import { useAuth } from '../context/AuthContext';
 import MonthlyCalendar from './MonthlyCalendar';
 import BloqueoModal from './BloqueoModal';
@@ -173,8 +174,21 @@ const Dashboard = () => {
   };      
 
    cargarDatos(true);
-   const interval = setInterval(() => cargarDatos(false), 1 * 60 * 1000); // cada 1 min
-    return () => clearInterval(interval);
+
+   // Eventos en vivo: recargar apenas llega un turno nuevo o un cambio de estado
+   let recarga = null;
+   const cerrarEventos = turnosService.suscribirEventos(() => {
+     clearTimeout(recarga);
+     recarga = setTimeout(() => cargarDatos(false), 500);
+   });
+
+   // Refresco periódico sólo para pasar turnos a "en curso"/"completado" según la hora
+   const interval = setInterval(() => cargarDatos(false), config.AUTO_REFRESH_INTERVAL);
+    return () => {
+      clearInterval(interval);
+      clearTimeout(recarga);
+      cerrarEventos();
+    };
   }, []);
   
 
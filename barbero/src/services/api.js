@@ -143,6 +143,16 @@ export const turnosService = {
   return response.data;
   },
   
+  // Stream de eventos (SSE): turnos nuevos y cambios de estado en vivo.
+  // Devuelve una función para cerrar la conexión.
+  suscribirEventos: (onEvento) => {
+    const source = new EventSource(`${config.API_BASE_URL}/api/v1/turnos/eventos`);
+    ['turno_creado', 'turno_actualizado', 'turno_eliminado', 'resincronizar'].forEach((tipo) => {
+      source.addEventListener(tipo, (e) => onEvento(tipo, e.data ? JSON.parse(e.data) : {}));
+    });
+    return () => source.close();
+  },
+
   marcarTurnosLeidas: async () => {
     const response = await api.put('/notificaciones/marcar-leidas');
     return response.data;
@@ -153,6 +163,12 @@ export const turnosService = {
     return response.data;
   },
 
+  // Disponibilidad de todos los días del rango en una sola request
+  getDisponibilidadRango: async (desde, hasta) => {
+    const response = await api.get('/turnos/disponibilidad/rango', { params: { desde, hasta } });
+    return response.data;
+  },
+
   verificarDisponibilidad: async (fecha, horaInicio, horaFin) => {
     const response = await api.get('/turnos/disponibilidad', {
       params: { fecha, hora_inicio: horaInicio, hora_fin: horaFin }
@@ -0,0 +1,65 @@
+"""Cache de usuarios autenticados para resolver el JWT sin ir a la base.
+
+La primera vez que se ve un token (barbería + ``sub`` + ``iat``) se busca el
+usuario y se guarda una copia liviana; los pedidos siguientes con el mismo
+token no hacen consultas. ``crud.update_usuario`` invalida las entradas del
+usuario modificado; en otros procesos el ``ttl`` acota cuánto dura el dato viejo.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.core.config import settings
+
+
+class Principal:
+    """Datos del usuario autenticado, sin sesión de base asociada."""
+    __slots__ = ("id", "usuario", "nombre", "rol")
+
+    def __init__(self, id: int, usuario: str, nombre: str, rol: str):
+        self.id = id
+        self.usuario = usuario
+        self.nombre = nombre
+        self.rol = rol
+
+    @classmethod
+    def desde_usuario(cls, usuario) -> "Principal":
+        return cls(usuario.id, usuario.usuario, usuario.nombre, usuario.rol)
+
+
+class CachePrincipales:
+    def __init__(self, max_entradas: int = 10000, ttl: float = 300.0):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._entradas: "OrderedDict[Tuple[str, str, Optional[int]], Tuple[Principal, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, tenant: str, usuario: str, iat: Optional[int]) -> Optional[Principal]:
+        clave = (tenant, usuario, iat)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            principal, guardado_en = entrada
+            if self.ttl and time.monotonic() - guardado_en > self.ttl:
+                del self._entradas[clave]
+                return None
+            self._entradas.move_to_end(clave)
+            return principal
+
+    def guardar(self, tenant: str, usuario: str, iat: Optional[int], principal: Principal):
+        with self._lock:
+            self._entradas[(tenant, usuario, iat)] = (principal, time.monotonic())
+            self._entradas.move_to_end((tenant, usuario, iat))
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self, tenant: str, usuario: str):
+        """Descarta todas las entradas (de cualquier token) de ese usuario."""
+        with self._lock:
+            for clave in [c for c in self._entradas if c[0] == tenant and c[1] == usuario]:
+                del self._entradas[clave]
+
+
+principales = CachePrincipales(max_entradas=settings.AUTH_CACHE_MAX, ttl=settings.AUTH_CACHE_TTL)
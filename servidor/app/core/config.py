@@ -1,8 +1,14 @@
+import asyncio
 import os
+import threading
+import time
+from collections import OrderedDict
 from pydantic_settings import BaseSettings
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
-from typing import Generator, Optional
+from typing import AsyncGenerator, Generator, Optional
 
 
 class Settings(BaseSettings):
@@ -18,6 +24,49 @@ class Settings(BaseSettings):
     # Base de datos (PostgreSQL)
     DATABASE_URL: str | None = None
 
+    # Contraseñas: costo de bcrypt y pool dedicado (hilos y pedidos en espera)
+    BCRYPT_ROUNDS: int = 12
+    HASH_WORKERS: int = 2
+    HASH_MAX_EN_ESPERA: int = 32
+
+    # Usuarios autenticados cacheados por token (cantidad y segundos de vigencia)
+    AUTH_CACHE_MAX: int = 10000
+    AUTH_CACHE_TTL: int = 300
+
+    # Índice en memoria de la agenda (días cacheados y segundos de vigencia)
+    AGENDA_CACHE_DIAS: int = 4096
+    AGENDA_CACHE_TTL: int = 60
+
+    # Respuestas condicionales: cada cuántos segundos un worker relee la tabla
+    # de versiones y max-age de las lecturas públicas (proxy / CDN)
+    VERSIONES_INTERVALO: float = 2.0
+    CACHE_PUBLICO_MAX_AGE: int = 5
+
+    # Métricas (/metrics): desde cuántos ms una consulta cuenta como lenta y
+    # cuántas de las últimas se muestran con su SQL
+    METRICAS_SQL_LENTO_MS: int = 250
+    METRICAS_MUESTRAS_SQL: int = 20
+
+    # Logging (app.core.registro): JSON a stdout por una cola acotada. El SQL
+    # ya no usa echo del engine: con SQL_ECHO se registra esa fracción de las
+    # sentencias (sin parámetros); las lentas se registran siempre
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = True
+    LOG_COLA_MAX: int = 10000
+    SQL_ECHO: bool = False
+    SQL_LOG_MUESTREO: float = 1.0
+
+    # Pool de la base principal
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+
+    # Barberías recibidas por header 'tenant_db_url' (pool por barbería y tope global)
+    TENANT_POOL_SIZE: int = 2
+    TENANT_MAX_OVERFLOW: int = 3
+    TENANT_MAX_ENGINES: int = 50
+    TENANT_MAX_CONEXIONES: int = 200
+    TENANT_INACTIVIDAD_SEGUNDOS: int = 600
+
     class Config:
         extra = "ignore"
         env_file = ".env"
@@ -34,19 +83,214 @@ ALGORITHM = settings.ALGORITHM
 Base = declarative_base()
 TenantBase = declarative_base()
 
+def opciones_pool(url: str, pool_size: int, max_overflow: int) -> dict:
+    # SQLite no usa QueuePool en memoria; sólo se acota el pool en servidores reales
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {"pool_size": pool_size, "max_overflow": max_overflow}
+
+
+def transacciones_sqlite(engine):
+    """
+    pysqlite y aiosqlite no emiten BEGIN antes de un SAVEPOINT, así que su
+    RELEASE confirma todo lo hecho hasta ahí (por ejemplo, el cliente de una
+    reserva que después falla). Si el SAVEPOINT va a abrir la transacción se
+    emite antes BEGIN IMMEDIATE: toma el lock de escritura de entrada y espera
+    el ``timeout`` del driver en vez de fallar con "database is locked" al
+    pasar de lectura a escritura, como pasaría con un BEGIN diferido.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if sync_engine.dialect.name != "sqlite":
+        return engine
+
+    @event.listens_for(sync_engine, "savepoint")
+    def _begin_antes_de_savepoint(conn, nombre):
+        dbapi_connection = conn.connection.dbapi_connection
+        # aiosqlite: el adaptador de SQLAlchemy envuelve la conexión de aiosqlite
+        conexion = getattr(dbapi_connection, "_connection", dbapi_connection)
+        if not conexion.in_transaction:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return engine
+
+
+def url_async(url: str) -> str:
+    """Traduce la URL de la base al driver async equivalente."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend == "postgresql":
+        url = url.set(drivername="postgresql+psycopg")
+    elif backend == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url.render_as_string(hide_password=False)
+
+
 # Motor y fábrica de sesión para la única base de datos
-tenant_engine = create_engine(
+tenant_engine = transacciones_sqlite(create_engine(
     settings.DATABASE_URL,
-    echo=settings.DEBUG,
     pool_pre_ping=True,
-)
+    **opciones_pool(settings.DATABASE_URL, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW),
+))
 TenantSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=tenant_engine)
 
+# Motor async (rutas públicas de reservas); se crea recién al usarse para no
+# exigir el driver async en scripts síncronos
+_async_engine = None
+_AsyncTenantSessionLocal = None
+
+
+def get_async_sessionmaker():
+    global _async_engine, _AsyncTenantSessionLocal
+    if _AsyncTenantSessionLocal is None:
+        _async_engine = transacciones_sqlite(create_async_engine(
+            url_async(settings.DATABASE_URL),
+            pool_pre_ping=True,
+            **opciones_pool(settings.DATABASE_URL, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW),
+        ))
+        _AsyncTenantSessionLocal = async_sessionmaker(_async_engine, class_=AsyncSession, expire_on_commit=False)
+    return _AsyncTenantSessionLocal
+
+
+# --- Registro de engines por barbería ---
+class _EngineTenant:
+    __slots__ = ("engine", "Session", "async_engine", "AsyncSession", "usado_en")
+
+    def __init__(self):
+        self.engine = None
+        self.Session = None
+        self.async_engine = None
+        self.AsyncSession = None
+        self.usado_en = time.monotonic()
+
+    def engines_abiertos(self) -> int:
+        return (self.engine is not None) + (self.async_engine is not None)
+
+
+class RegistroEngines:
+    """
+    Engines reutilizables por URL de barbería, con pool acotado por barbería.
+
+    Las barberías que no se usan hace más de ``inactividad`` segundos, o las
+    menos usadas cuando se supera ``max_engines`` o el tope de conexiones, se
+    desalojan con ``dispose()``. Cada engine abre como mucho
+    ``pool_size + max_overflow`` conexiones, así que el total queda acotado
+    por ``max_conexiones``.
+    """
+
+    def __init__(self, pool_size: int, max_overflow: int, max_engines: int,
+                 max_conexiones: int, inactividad: float):
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.max_engines = max_engines
+        self.max_conexiones = max_conexiones
+        self.inactividad = inactividad
+        self._tenants: "OrderedDict[str, _EngineTenant]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def conexiones_por_engine(self) -> int:
+        return self.pool_size + self.max_overflow
+
+    def conexiones_maximas(self) -> int:
+        """Conexiones que podrían llegar a abrir los engines registrados."""
+        with self._lock:
+            return self._conexiones_maximas()
+
+    def _conexiones_maximas(self) -> int:
+        return sum(t.engines_abiertos() for t in self._tenants.values()) * self.conexiones_por_engine
+
+    def _entrada(self, url: str, nuevo_engine: bool) -> _EngineTenant:
+        ahora = time.monotonic()
+        entrada = self._tenants.get(url)
+        if entrada is None:
+            entrada = _EngineTenant()
+            self._tenants[url] = entrada
+        entrada.usado_en = ahora
+        self._tenants.move_to_end(url)
+
+        # Desalojar barberías inactivas y, si hace falta lugar, las menos usadas
+        for otra_url, otra in list(self._tenants.items()):
+            if otra is not entrada and self.inactividad and ahora - otra.usado_en > self.inactividad:
+                self._desalojar(otra_url)
+        if nuevo_engine:
+            while len(self._tenants) > 1 and (
+                len(self._tenants) > self.max_engines
+                or self._conexiones_maximas() + self.conexiones_por_engine > self.max_conexiones
+            ):
+                self._desalojar(next(iter(self._tenants)))
+        return entrada
+
+    def _desalojar(self, url: str):
+        entrada = self._tenants.pop(url)
+        if entrada.engine is not None:
+            entrada.engine.dispose()
+        if entrada.async_engine is not None:
+            try:
+                asyncio.get_running_loop().create_task(entrada.async_engine.dispose())
+            except RuntimeError:
+                # Sin event loop: soltar el pool sin cerrar conexiones en uso
+                entrada.async_engine.sync_engine.dispose(close=False)
+
+    def sesiones(self, url: str) -> sessionmaker:
+        with self._lock:
+            entrada = self._tenants.get(url)
+            entrada = self._entrada(url, nuevo_engine=entrada is None or entrada.engine is None)
+            if entrada.engine is None:
+                entrada.engine = transacciones_sqlite(create_engine(
+                    url, pool_pre_ping=True,
+                    **opciones_pool(url, self.pool_size, self.max_overflow),
+                ))
+                entrada.Session = sessionmaker(autocommit=False, autoflush=False, bind=entrada.engine)
+            return entrada.Session
+
+    def sesiones_async(self, url: str) -> async_sessionmaker:
+        with self._lock:
+            entrada = self._tenants.get(url)
+            entrada = self._entrada(url, nuevo_engine=entrada is None or entrada.async_engine is None)
+            if entrada.async_engine is None:
+                entrada.async_engine = transacciones_sqlite(create_async_engine(
+                    url_async(url), pool_pre_ping=True,
+                    **opciones_pool(url, self.pool_size, self.max_overflow),
+                ))
+                entrada.AsyncSession = async_sessionmaker(entrada.async_engine, class_=AsyncSession, expire_on_commit=False)
+            return entrada.AsyncSession
+
+    def pools(self) -> list:
+        """(url, tipo, pool) de los engines abiertos, para las métricas."""
+        with self._lock:
+            entradas = list(self._tenants.items())
+        pools = []
+        for url, entrada in entradas:
+            if entrada.engine is not None:
+                pools.append((url, "sync", entrada.engine.pool))
+            if entrada.async_engine is not None:
+                pools.append((url, "async", entrada.async_engine.sync_engine.pool))
+        return pools
+
+    async def cerrar(self):
+        with self._lock:
+            entradas = list(self._tenants.values())
+            self._tenants.clear()
+        for entrada in entradas:
+            if entrada.engine is not None:
+                entrada.engine.dispose()
+            if entrada.async_engine is not None:
+                await entrada.async_engine.dispose()
+
+
+registro_engines = RegistroEngines(
+    pool_size=settings.TENANT_POOL_SIZE,
+    max_overflow=settings.TENANT_MAX_OVERFLOW,
+    max_engines=settings.TENANT_MAX_ENGINES,
+    max_conexiones=settings.TENANT_MAX_CONEXIONES,
+    inactividad=settings.TENANT_INACTIVIDAD_SEGUNDOS,
+)
+
 
 def get_tenant_db(tenant_db_url: Optional[str] = None) -> Generator:
     # Permite inyectar otra barbería si se pasa un URL
-    if tenant_db_url:
-        Session = sessionmaker(autocommit=False, autoflush=False, bind=create_engine(tenant_db_url, echo=settings.DEBUG, pool_pre_ping=True))
+    if tenant_db_url and tenant_db_url != settings.DATABASE_URL:
+        Session = registro_engines.sesiones(tenant_db_url)
     else:
         Session = TenantSessionLocal
     db = Session()
@@ -54,3 +298,43 @@ def get_tenant_db(tenant_db_url: Optional[str] = None) -> Generator:
         yield db
     finally:
         db.close()
+
+
+async def get_tenant_async_db(tenant_db_url: Optional[str] = None) -> AsyncGenerator:
+    # Variante async de get_tenant_db; mismo criterio para el header de barbería
+    if tenant_db_url and tenant_db_url != settings.DATABASE_URL:
+        Session = registro_engines.sesiones_async(tenant_db_url)
+    else:
+        Session = get_async_sessionmaker()
+    async with Session() as db:
+        yield db
+
+
+async def cerrar_engines():
+    """Libera los pools al apagar la aplicación."""
+    await registro_engines.cerrar()
+    tenant_engine.dispose()
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+
+def pools_abiertos() -> list:
+    """(url, tipo, pool) de la base principal y de las barberías con engine abierto."""
+    pools = [(settings.DATABASE_URL, "sync", tenant_engine.pool)]
+    if _async_engine is not None:
+        pools.append((settings.DATABASE_URL, "async", _async_engine.sync_engine.pool))
+    return pools + registro_engines.pools()
+
+
+def clave_tenant(db) -> str:
+    """Identifica la base de la barbería de una sesión (URL sin driver ni contraseña).
+
+    Acepta tanto Session como AsyncSession: ambas comparten la misma clave.
+    """
+    return clave_tenant_url(db.get_bind().url)
+
+
+def clave_tenant_url(url=None) -> str:
+    """Misma clave que clave_tenant, a partir de una URL (None = base principal)."""
+    url = make_url(url or settings.DATABASE_URL)
+    return url.set(drivername=url.get_backend_name()).render_as_string(hide_password=True)
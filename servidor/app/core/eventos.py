@@ -0,0 +1,109 @@
+"""Bus de eventos en proceso para notificar a los dashboards por SSE.
+
+Las funciones de ``crud`` publican (desde el threadpool o desde el event loop)
+y cada conexión SSE se suscribe con una cola asyncio propia. Se guarda un
+historial acotado por barbería para poder retomar desde ``Last-Event-ID``.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+# Los ids llevan la marca de arranque del proceso: un id de otro arranque (o
+# de otro worker) no se puede retomar y obliga al cliente a resincronizar.
+_ARRANQUE = format(int(time.time() * 1000), "x")
+
+
+class Evento:
+    __slots__ = ("id", "numero", "tipo", "datos")
+
+    def __init__(self, numero: int, tipo: str, datos: dict):
+        self.numero = numero
+        self.id = f"{_ARRANQUE}-{numero}"
+        self.tipo = tipo
+        self.datos = datos
+
+    def sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.tipo}\ndata: {json.dumps(self.datos, default=str)}\n\n"
+
+
+class _Suscripcion:
+    __slots__ = ("loop", "cola")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_pendientes: int):
+        self.loop = loop
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=max_pendientes)
+
+
+class BusEventos:
+    def __init__(self, historial: int = 500, max_pendientes: int = 100):
+        self.historial = historial
+        self.max_pendientes = max_pendientes
+        self._numeros: Dict[str, int] = {}
+        self._historial: Dict[str, Deque[Evento]] = {}
+        self._suscripciones: Dict[str, Set[_Suscripcion]] = {}
+        self._lock = threading.Lock()
+
+    def publicar(self, tenant: str, tipo: str, datos: dict) -> Evento:
+        """Registra el evento y lo entrega a los dashboards conectados. Thread-safe."""
+        with self._lock:
+            numero = self._numeros.get(tenant, 0) + 1
+            self._numeros[tenant] = numero
+            evento = Evento(numero, tipo, datos)
+            self._historial.setdefault(tenant, deque(maxlen=self.historial)).append(evento)
+            suscripciones = list(self._suscripciones.get(tenant, ()))
+        for suscripcion in suscripciones:
+            try:
+                suscripcion.loop.call_soon_threadsafe(self._entregar, suscripcion, evento)
+            except RuntimeError:
+                # El loop de esa conexión ya se cerró
+                self._quitar(tenant, suscripcion)
+        return evento
+
+    @staticmethod
+    def _entregar(suscripcion: _Suscripcion, evento: Evento):
+        cola = suscripcion.cola
+        try:
+            cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Cliente demasiado lento: se le pide resincronizar en vez de acumular
+            while not cola.empty():
+                cola.get_nowait()
+            cola.put_nowait(None)
+
+    def suscribir(self, tenant: str, ultimo_id: Optional[str] = None) -> Tuple[_Suscripcion, List[Evento], bool]:
+        """
+        Devuelve (suscripción, eventos pendientes desde ``ultimo_id``, resincronizar).
+        ``resincronizar`` es True cuando no se puede garantizar continuidad.
+        """
+        suscripcion = _Suscripcion(asyncio.get_running_loop(), self.max_pendientes)
+        with self._lock:
+            self._suscripciones.setdefault(tenant, set()).add(suscripcion)
+            historial = list(self._historial.get(tenant, ()))
+
+        if not ultimo_id:
+            return suscripcion, [], False
+        arranque, _, numero = ultimo_id.partition("-")
+        if arranque != _ARRANQUE or not numero.isdigit():
+            return suscripcion, [], True
+        numero = int(numero)
+        pendientes = [e for e in historial if e.numero > numero]
+        # Si el historial ya descartó eventos posteriores a ultimo_id hay un hueco
+        hueco = bool(historial) and historial[0].numero > numero + 1
+        return suscripcion, pendientes, hueco
+
+    def desuscribir(self, tenant: str, suscripcion: _Suscripcion):
+        self._quitar(tenant, suscripcion)
+
+    def _quitar(self, tenant: str, suscripcion: _Suscripcion):
+        with self._lock:
+            suscripciones = self._suscripciones.get(tenant)
+            if suscripciones is not None:
+                suscripciones.discard(suscripcion)
+                if not suscripciones:
+                    del self._suscripciones[tenant]
+
+
+bus = BusEventos()
@@ -0,0 +1,260 @@
+"""Métricas de rendimiento en formato de texto de Prometheus.
+
+- ``MiddlewareMetricas`` (ASGI) mide cada pedido por barbería, método y
+  plantilla de ruta ("/api/v1/turnos/fecha/{fecha}", no la URL concreta) y
+  abre un contexto donde se cuentan sus consultas.
+- Los eventos ``before/after_cursor_execute`` de todos los engines (el
+  principal, el async y los de cada barbería) suman consultas y tiempo de
+  SQL al pedido en curso y guardan las más lentas con su sentencia; la
+  misma medición pasa a ``registro`` para el log de SQL lento o muestreado.
+- El uso de los pools se lee al exponer, directamente de cada engine.
+
+``/metrics`` devuelve todo con ``exponer()``. Los valores son por proceso:
+con varios workers Prometheus debe leer cada uno o sumar por instancia.
+"""
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core import registro
+from app.core.config import clave_tenant_url, settings
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIN_RUTA = "sin_ruta"
+OTRAS_BARBERIAS = "otras"
+
+
+class Histograma:
+    __slots__ = ("limites", "cuentas", "suma", "total")
+
+    def __init__(self, limites: Tuple[float, ...]):
+        self.limites = limites
+        self.cuentas = [0] * len(limites)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.cuentas[i] += 1
+                break
+        self.suma += valor
+        self.total += 1
+
+    def acumulados(self) -> Iterable[Tuple[str, int]]:
+        acumulado = 0
+        for limite, cuenta in zip(self.limites, self.cuentas):
+            acumulado += cuenta
+            yield _numero(limite), acumulado
+        yield "+Inf", self.total
+
+
+class Pedido:
+    """Consultas del pedido en curso (se comparte con los hilos y greenlets que lo atienden)."""
+    __slots__ = ("tenant", "ruta", "consultas", "segundos_sql")
+
+    def __init__(self, tenant: str):
+        self.tenant = tenant
+        self.ruta = SIN_RUTA
+        self.consultas = 0
+        self.segundos_sql = 0.0
+
+
+_pedido: ContextVar[Optional[Pedido]] = ContextVar("pedido_metricas", default=None)
+
+
+class Metricas:
+    def __init__(self, umbral_lento_ms: float, muestras_lentas: int, max_tenants: int):
+        self.umbral_lento = umbral_lento_ms / 1000
+        self.max_tenants = max_tenants
+        self._duracion: Dict[tuple, Histograma] = {}
+        self._consultas_pedido: Dict[tuple, Histograma] = {}
+        self._pedidos: Dict[tuple, int] = {}
+        self._consultas: Dict[str, int] = {}
+        self._segundos_sql: Dict[str, float] = {}
+        self._lentas_total: Dict[str, int] = {}
+        # (tenant, pedido, sql, segundos); la ruta del pedido se conoce recién al terminar el ruteo
+        self._lentas: "deque[Tuple[str, Optional[Pedido], str, float]]" = deque(maxlen=muestras_lentas)
+        self._tenants: set = set()
+        self._lock = threading.Lock()
+
+    def tenant(self, url: Optional[str]) -> str:
+        """Etiqueta de la barbería; el header es libre, así que se acota la cantidad."""
+        try:
+            clave = clave_tenant_url(url)
+        except Exception:
+            return OTRAS_BARBERIAS
+        with self._lock:
+            if clave in self._tenants:
+                return clave
+            if len(self._tenants) >= self.max_tenants:
+                return OTRAS_BARBERIAS
+            self._tenants.add(clave)
+            return clave
+
+    def registrar_pedido(self, pedido: Pedido, metodo: str, estado: int, segundos: float):
+        clave = (pedido.tenant, metodo, pedido.ruta)
+        with self._lock:
+            if clave not in self._duracion:
+                self._duracion[clave] = Histograma(BUCKETS_SEGUNDOS)
+                self._consultas_pedido[clave] = Histograma(BUCKETS_CONSULTAS)
+            self._duracion[clave].observar(segundos)
+            self._consultas_pedido[clave].observar(pedido.consultas)
+            self._pedidos[clave + (estado,)] = self._pedidos.get(clave + (estado,), 0) + 1
+
+    def registrar_consulta(self, tenant: str, sentencia: str, segundos: float):
+        pedido = _pedido.get()
+        if pedido is not None:
+            pedido.consultas += 1
+            pedido.segundos_sql += segundos
+        with self._lock:
+            self._consultas[tenant] = self._consultas.get(tenant, 0) + 1
+            self._segundos_sql[tenant] = self._segundos_sql.get(tenant, 0.0) + segundos
+            if segundos >= self.umbral_lento:
+                self._lentas_total[tenant] = self._lentas_total.get(tenant, 0) + 1
+                self._lentas.append((tenant, pedido, _resumir_sql(sentencia), segundos))
+
+    def exponer(self, pools: Iterable[Tuple[str, str, object]] = ()) -> str:
+        """Texto para Prometheus; ``pools`` son (tenant, tipo de engine, pool)."""
+        lineas: List[str] = []
+        with self._lock:
+            _histogramas(lineas, "barberia_http_request_duration_seconds",
+                         "Duración de los pedidos por plantilla de ruta.", self._duracion)
+            _encabezado(lineas, "barberia_http_requests_total", "counter", "Pedidos atendidos por estado HTTP.")
+            for (tenant, metodo, ruta, estado), valor in sorted(self._pedidos.items()):
+                lineas.append(_muestra("barberia_http_requests_total",
+                                       {"tenant": tenant, "method": metodo, "route": ruta, "status": estado}, valor))
+            _histogramas(lineas, "barberia_db_queries_per_request",
+                         "Consultas SQL por pedido.", self._consultas_pedido)
+            _contadores(lineas, "barberia_db_queries_total", "Consultas SQL ejecutadas.", self._consultas)
+            _contadores(lineas, "barberia_db_query_seconds_total", "Tiempo total en SQL.", self._segundos_sql)
+            _contadores(lineas, "barberia_db_slow_queries_total",
+                        f"Consultas de {self.umbral_lento * 1000:g} ms o más.", self._lentas_total)
+            _encabezado(lineas, "barberia_db_slow_query_seconds", "gauge",
+                        "Últimas consultas lentas con su sentencia.")
+            for tenant, pedido, sentencia, segundos in self._lentas:
+                ruta = pedido.ruta if pedido is not None else SIN_RUTA
+                lineas.append(_muestra("barberia_db_slow_query_seconds",
+                                       {"tenant": tenant, "route": ruta, "sql": sentencia}, segundos))
+
+        estados = [(tenant, tipo, pool) for tenant, tipo, pool in pools if hasattr(pool, "checkedout")]
+        for nombre, ayuda, leer in (
+            ("barberia_db_pool_checked_out", "Conexiones del pool en uso.", lambda p: p.checkedout()),
+            ("barberia_db_pool_overflow", "Conexiones abiertas por encima de pool_size (negativo: sin usar).",
+             lambda p: p.overflow()),
+            ("barberia_db_pool_size", "Tamaño configurado del pool.", lambda p: p.size()),
+        ):
+            _encabezado(lineas, nombre, "gauge", ayuda)
+            for tenant, tipo, pool in estados:
+                lineas.append(_muestra(nombre, {"tenant": tenant, "engine": tipo}, leer(pool)))
+        return "\n".join(lineas) + "\n"
+
+
+metricas = Metricas(
+    umbral_lento_ms=settings.METRICAS_SQL_LENTO_MS,
+    muestras_lentas=settings.METRICAS_MUESTRAS_SQL,
+    max_tenants=settings.TENANT_MAX_ENGINES + 1,
+)
+
+
+# --- Formato de texto ---
+def _numero(valor) -> str:
+    if isinstance(valor, float):
+        return repr(valor) if valor != int(valor) else f"{valor:.1f}"
+    return str(valor)
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _muestra(nombre: str, etiquetas: dict, valor) -> str:
+    texto = ",".join(f'{clave}="{_escapar(v)}"' for clave, v in etiquetas.items())
+    return f"{nombre}{{{texto}}} {_numero(valor)}"
+
+def _encabezado(lineas: List[str], nombre: str, tipo: str, ayuda: str):
+    lineas.append(f"# HELP {nombre} {ayuda}")
+    lineas.append(f"# TYPE {nombre} {tipo}")
+
+def _histogramas(lineas: List[str], nombre: str, ayuda: str, series: Dict[tuple, Histograma]):
+    _encabezado(lineas, nombre, "histogram", ayuda)
+    for (tenant, metodo, ruta), histograma in sorted(series.items()):
+        etiquetas = {"tenant": tenant, "method": metodo, "route": ruta}
+        for limite, acumulado in histograma.acumulados():
+            lineas.append(_muestra(nombre + "_bucket", {**etiquetas, "le": limite}, acumulado))
+        lineas.append(_muestra(nombre + "_sum", etiquetas, histograma.suma))
+        lineas.append(_muestra(nombre + "_count", etiquetas, histograma.total))
+
+def _contadores(lineas: List[str], nombre: str, ayuda: str, valores: Dict[str, float]):
+    _encabezado(lineas, nombre, "counter", ayuda)
+    for tenant, valor in sorted(valores.items()):
+        lineas.append(_muestra(nombre, {"tenant": tenant}, valor))
+
+def _resumir_sql(sentencia: str, largo: int = 300) -> str:
+    sentencia = re.sub(r"\s+", " ", sentencia).strip()
+    return sentencia if len(sentencia) <= largo else sentencia[:largo] + "..."
+
+
+# --- Eventos de SQLAlchemy (todos los engines, sync y async) ---
+@event.listens_for(Engine, "before_cursor_execute")
+def _antes_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metricas_inicio", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _despues_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get("metricas_inicio")
+    if not inicios:
+        return
+    segundos = time.perf_counter() - inicios.pop()
+    tenant = conn.info.get("metricas_tenant")
+    if tenant is None:
+        tenant = conn.info["metricas_tenant"] = metricas.tenant(conn.engine.url)
+    metricas.registrar_consulta(tenant, statement, segundos)
+    registro.registrar_consulta(statement, segundos, executemany)
+
+
+@event.listens_for(Engine, "handle_error")
+def _consulta_fallida(contexto):
+    # Sin after_cursor_execute: descartar el inicio pendiente
+    inicios = contexto.connection.info.get("metricas_inicio") if contexto.connection is not None else None
+    if inicios:
+        inicios.pop()
+
+
+# --- Middleware ASGI ---
+class MiddlewareMetricas:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # Mismo header que lee get_tenant_db_dep (FastAPI cambia "_" por "-")
+        tenant_url = dict(scope.get("headers") or ()).get(b"tenant-db-url")
+        pedido = Pedido(metricas.tenant(tenant_url.decode("latin-1") if tenant_url else None))
+        token = _pedido.set(pedido)
+        estado = 500
+        inicio = time.perf_counter()
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            # Plantilla de la ruta (no la URL, para no abrir una serie por id o fecha)
+            ruta = scope.get("route")
+            if ruta is not None and getattr(ruta, "path", None):
+                pedido.ruta = ruta.path
+            metricas.registrar_pedido(pedido, scope["method"], estado, time.perf_counter() - inicio)
+            _pedido.reset(token)
@@ -0,0 +1,218 @@
+"""Logging estructurado sin bloquear a los hilos que atienden pedidos.
+
+Los registros se encolan con un ``QueueHandler`` (cola acotada: si se llena
+se descartan y se cuentan, nunca se espera) y un ``QueueListener`` en su
+propio hilo los redacta, los formatea y los escribe. Cada línea es un JSON
+con el id de correlación del pedido (``X-Request-ID``, recibido o generado
+por ``MiddlewareCorrelacion``).
+
+Antes de escribir se ocultan contraseñas, tokens y credenciales de las URLs
+de base. El SQL no usa ``echo`` del engine: con ``SQL_ECHO`` se registra
+una fracción ``SQL_LOG_MUESTREO`` de las sentencias, y las que superan
+``METRICAS_SQL_LENTO_MS`` se registran siempre como advertencia.
+"""
+import copy
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+import orjson
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+logger_sql = logging.getLogger("app.sql")
+logger_pedidos = logging.getLogger("app.pedidos")
+
+_id_pedido: ContextVar[Optional[str]] = ContextVar("id_pedido", default=None)
+_ID_VALIDO = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Atributos propios de LogRecord; el resto (extra=...) va al JSON
+_ATRIBUTOS_RECORD = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "id_pedido"}
+_FORMATO_BASE = logging.Formatter()
+
+
+# --- Redacción de credenciales ---
+_CLAVES_SENSIBLES = re.compile(r"pass(word)?|contrase(ñ|n)a|secret|token|authorization|password_hash", re.IGNORECASE)
+_PATRONES = [
+    # password=..., "password": "...", contraseña: ...
+    (re.compile(r"""(?i)((?:password|contrase(?:ñ|n)a|secret|token)["']?\s*[:=]\s*["']?)[^"',\s&}]+"""), r"\1***"),
+    # Bearer <jwt> y JWT sueltos
+    (re.compile(r"(?i)(bearer\s+)[A-Za-z0-9._~+/=-]+"), r"\1***"),
+    (re.compile(r"\beyJ[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]*"), "***"),
+    # usuario:contraseña@ de las URLs de base
+    (re.compile(r"(://[^:/@\s]+:)[^@\s]+@"), r"\1***@"),
+]
+
+
+def redactar(texto: str) -> str:
+    for patron, reemplazo in _PATRONES:
+        texto = patron.sub(reemplazo, texto)
+    return texto
+
+
+def _redactar_valor(clave: str, valor):
+    if _CLAVES_SENSIBLES.search(clave):
+        return "***"
+    if isinstance(valor, str):
+        return redactar(valor)
+    if isinstance(valor, dict):
+        return {k: _redactar_valor(str(k), v) for k, v in valor.items()}
+    return valor
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por registro, con los campos de ``extra`` y sin credenciales."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": redactar(record.getMessage()),
+        }
+        if getattr(record, "id_pedido", None):
+            datos["id_pedido"] = record.id_pedido
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_RECORD:
+                datos[clave] = _redactar_valor(clave, valor)
+        if record.exc_text:
+            datos["excepcion"] = redactar(record.exc_text)
+        return orjson.dumps(datos, default=str).decode()
+
+
+class FormatoTexto(logging.Formatter):
+    """Formato legible para desarrollo (LOG_JSON=false), también redactado."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(id_pedido)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "id_pedido"):
+            record.id_pedido = "-"
+        return redactar(super().format(record))
+
+
+# --- Cola ---
+class ColaSinEspera(logging.handlers.QueueHandler):
+    """QueueHandler que nunca bloquea: con la cola llena descarta y cuenta."""
+
+    def __init__(self, cola: queue.Queue):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Se resuelve todo en el hilo del pedido (el contexto con el id y los
+        # argumentos del mensaje); el traceback queda aparte del mensaje.
+        record = copy.copy(record)
+        record.id_pedido = _id_pedido.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _FORMATO_BASE.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_cola: Optional[ColaSinEspera] = None
+
+
+def configurar():
+    """Instala la cola en el logger raíz y arranca el hilo que escribe (idempotente)."""
+    global _listener, _cola
+    if _listener is not None:
+        return
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(FormatoJSON() if settings.LOG_JSON else FormatoTexto())
+    _cola = ColaSinEspera(queue.Queue(maxsize=settings.LOG_COLA_MAX))
+    _listener = logging.handlers.QueueListener(_cola.queue, salida, respect_handler_level=True)
+
+    raiz = logging.getLogger()
+    raiz.handlers = [h for h in raiz.handlers if not isinstance(h, ColaSinEspera)] + [_cola]
+    raiz.setLevel(settings.LOG_LEVEL.upper())
+    logging.getLogger("app").setLevel(logging.DEBUG if settings.DEBUG else settings.LOG_LEVEL.upper())
+    if settings.SQL_ECHO:
+        # El muestreo es a nivel INFO; sin SQL_ECHO rige LOG_LEVEL (lentas = WARNING)
+        logger_sql.setLevel(logging.INFO)
+    _listener.start()
+
+
+def detener():
+    """Vacía la cola y detiene el hilo (al apagar la aplicación)."""
+    global _listener
+    if _listener is not None:
+        if _cola is not None and _cola.descartados:
+            logger.warning("Registros descartados por cola llena: %d", _cola.descartados)
+        _listener.stop()
+        _listener = None
+
+
+def descartados() -> int:
+    return _cola.descartados if _cola is not None else 0
+
+
+# --- SQL muestreado ---
+def registrar_consulta(sentencia: str, segundos: float, lote: bool):
+    """Registra una sentencia ya medida (la mide el listener de ``metricas``)."""
+    ms = segundos * 1000
+    # Sin parámetros: pueden traer hashes, teléfonos o tokens
+    if ms >= settings.METRICAS_SQL_LENTO_MS:
+        logger_sql.warning("Consulta lenta", extra={"sql": sentencia, "ms": round(ms, 2), "lote": lote})
+    elif settings.SQL_ECHO and random.random() < settings.SQL_LOG_MUESTREO:
+        logger_sql.info("Consulta", extra={"sql": sentencia, "ms": round(ms, 2), "lote": lote})
+
+
+# --- Id de correlación ---
+class MiddlewareCorrelacion:
+    """Asigna el id de pedido (``X-Request-ID`` si es válido, si no uno nuevo),
+    lo devuelve en la respuesta y registra el pedido al terminar."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        recibido = dict(scope.get("headers") or ()).get(b"x-request-id", b"").decode("latin-1")
+        id_pedido = recibido if _ID_VALIDO.match(recibido) else uuid.uuid4().hex[:16]
+        token = _id_pedido.set(id_pedido)
+        estado = 500
+        inicio = time.perf_counter()
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+                mensaje = {**mensaje, "headers": list(mensaje.get("headers", [])) + [(b"x-request-id", id_pedido.encode())]}
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        except Exception:
+            logger_pedidos.exception("Error no controlado", extra={"metodo": scope["method"], "ruta": scope["path"]})
+            raise
+        finally:
+            ruta = scope.get("route")
+            logger_pedidos.info("Pedido", extra={
+                "metodo": scope["method"],
+                "ruta": getattr(ruta, "path", None) or scope["path"],
+                "estado": estado,
+                "ms": round((time.perf_counter() - inicio) * 1000, 2),
+            })
+            _id_pedido.reset(token)
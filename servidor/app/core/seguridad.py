@@ -0,0 +1,70 @@
+"""Hash y verificación de contraseñas fuera de los hilos de las peticiones.
+
+bcrypt tarda cientos de milisegundos de CPU por operación. Se hace en un pool
+de ``HASH_WORKERS`` hilos (bcrypt libera el GIL) con un único CryptContext
+compartido. Como mucho ``HASH_MAX_EN_ESPERA`` operaciones pueden estar en
+curso o en cola; las que sobran fallan enseguida con ``SaturacionHash`` (503)
+en vez de acumular peticiones bloqueadas.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from app.core.config import settings
+
+# Los hashes con otro costo se marcan para actualizar (ver verificar_y_actualizar)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+
+class SaturacionHash(Exception):
+    """Hay demasiadas operaciones de contraseña en curso."""
+
+
+class PoolHash:
+    def __init__(self, workers: int, max_en_espera: int):
+        self.max_en_espera = max_en_espera
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hash")
+        self._en_curso = 0
+        self._lock = threading.Lock()
+
+    def _liberar(self, _futuro: Future):
+        with self._lock:
+            self._en_curso -= 1
+
+    def enviar(self, funcion, *args) -> Future:
+        with self._lock:
+            if self._en_curso >= self.max_en_espera:
+                raise SaturacionHash()
+            self._en_curso += 1
+        try:
+            futuro = self._executor.submit(funcion, *args)
+        except Exception:
+            self._liberar(None)
+            raise
+        futuro.add_done_callback(self._liberar)
+        return futuro
+
+    def ejecutar(self, funcion, *args):
+        """Versión bloqueante, para código síncrono (crud, scripts)."""
+        return self.enviar(funcion, *args).result()
+
+    async def ejecutar_async(self, funcion, *args):
+        return await asyncio.wrap_future(self.enviar(funcion, *args))
+
+    def cerrar(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+pool_hash = PoolHash(workers=settings.HASH_WORKERS, max_en_espera=settings.HASH_MAX_EN_ESPERA)
+
+
+def hashear(password: str) -> str:
+    return pool_hash.ejecutar(pwd_context.hash, password)
+
+
+async def verificar_y_actualizar(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """Devuelve (válida, hash nuevo o None); hay hash nuevo si cambió el costo configurado."""
+    return await pool_hash.ejecutar_async(pwd_context.verify_and_update, password, password_hash)
@@ -0,0 +1,527 @@
+"""Índice en memoria de ocupación diaria de la agenda.
+
+Cada día se representa con enteros usados de bitmask: el bit ``i`` corresponde
+a la franja de 30 minutos que empieza en ``i * 30`` minutos desde la medianoche.
+Hay una máscara por barbero más una común (bloqueos y turnos sin barbero, que
+ocupan a todos). El índice se arma una sola vez por fecha (tenant + día) y
+luego se mantiene al día desde las funciones de escritura de ``crud``.
+"""
+import threading
+import time as _reloj
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+
+MINUTOS_FRANJA = 30
+FRANJAS_POR_DIA = 24 * 60 // MINUTOS_FRANJA
+MASCARA_DIA_COMPLETO = (1 << FRANJAS_POR_DIA) - 1
+
+
+# --- Conversión entre horas y bits ---
+def _minutos(hora: time) -> int:
+    return hora.hour * 60 + hora.minute
+
+
+def hora_franja(indice: int) -> time:
+    minutos = indice * MINUTOS_FRANJA
+    return time(minutos // 60, minutos % 60)
+
+
+def mascara_intervalo(hora_inicio: time, hora_fin: time) -> int:
+    """Bits de las franjas que se superponen con [hora_inicio, hora_fin)."""
+    inicio = _minutos(hora_inicio) // MINUTOS_FRANJA
+    fin = -(-_minutos(hora_fin) // MINUTOS_FRANJA)  # redondeo hacia arriba
+    if fin <= inicio:
+        return 0
+    return ((1 << (fin - inicio)) - 1) << inicio
+
+
+def mascara_posterior(hora: time) -> int:
+    """Bits de las franjas que empiezan estrictamente después de ``hora``."""
+    primera = _minutos(hora) // MINUTOS_FRANJA + 1
+    if primera >= FRANJAS_POR_DIA:
+        return 0
+    return MASCARA_DIA_COMPLETO & ~((1 << primera) - 1)
+
+
+# Etiquetas "HH:MM" de cada franja, armadas una sola vez
+ETIQUETAS_FRANJA = tuple(hora_franja(i).strftime("%H:%M") for i in range(FRANJAS_POR_DIA))
+
+
+def horarios(mascara: int) -> List[str]:
+    """Convierte una máscara en la lista de horarios "HH:MM" ordenada."""
+    resultado = []
+    while mascara:
+        bit = mascara & -mascara
+        resultado.append(ETIQUETAS_FRANJA[bit.bit_length() - 1])
+        mascara ^= bit
+    return resultado
+
+
+# Horario de trabajo por defecto (9:00 a 22:00, cada 30 minutos), usado
+# mientras la barbería no cargue su propio horario
+MASCARA_JORNADA = mascara_intervalo(time(9, 0), time(22, 0))
+
+
+# --- Plantillas de horario de trabajo ---
+class PlantillaHorario:
+    """Máscaras de jornada precompiladas por día de la semana, general y por barbero.
+
+    ``tramos``: (barbero_id, dia_semana, hora_inicio, hora_fin); varios tramos
+    el mismo día dejan los descansos entre ellos. Un barbero con tramos en un
+    día reemplaza el horario general de ese día. Sin tramos generales se usa
+    MASCARA_JORNADA. ``feriados``: (fecha, barbero_id), con None para toda la
+    barbería.
+    """
+    __slots__ = ("general", "por_barbero", "feriados")
+
+    def __init__(self, tramos: Iterable[tuple] = (), feriados: Iterable[tuple] = ()):
+        general = [0] * 7
+        hay_general = False
+        por_barbero: Dict[int, list] = {}
+        for barbero_id, dia_semana, hora_inicio, hora_fin in tramos:
+            mascara = mascara_intervalo(hora_inicio, hora_fin)
+            if barbero_id is None:
+                general[dia_semana] |= mascara
+                hay_general = True
+            else:
+                semana = por_barbero.setdefault(barbero_id, [None] * 7)
+                semana[dia_semana] = (semana[dia_semana] or 0) | mascara
+        self.general = tuple(general) if hay_general else (MASCARA_JORNADA,) * 7
+        self.por_barbero = {barbero_id: tuple(semana) for barbero_id, semana in por_barbero.items()}
+        self.feriados: Dict[date, set] = {}
+        for fecha, barbero_id in feriados:
+            self.feriados.setdefault(fecha, set()).add(barbero_id)
+
+    def jornada(self, fecha: date, barbero_id: Optional[int] = None) -> int:
+        cerrados = self.feriados.get(fecha)
+        if cerrados and (None in cerrados or barbero_id in cerrados):
+            return 0
+        dia_semana = fecha.weekday()
+        semana = self.por_barbero.get(barbero_id)
+        if semana is not None and semana[dia_semana] is not None:
+            return semana[dia_semana]
+        return self.general[dia_semana]
+
+    def jornadas(self, fecha: date) -> Callable[[Optional[int]], int]:
+        return lambda barbero_id: self.jornada(fecha, barbero_id)
+
+    def cubre(self, fecha: date, barbero_id: Optional[int], mascara: int) -> bool:
+        """El intervalo cae completo dentro del horario de trabajo (uno vacío no cae)."""
+        return bool(mascara) and not mascara & ~self.jornada(fecha, barbero_id)
+
+    def minutos(self, dias: Iterable[date], barberos: Iterable[Optional[int]]) -> int:
+        """Minutos de trabajo de los barberos en esos días (None = horario general)."""
+        barberos = list(barberos)
+        return sum(bin(self.jornada(dia, b)).count("1") for dia in dias for b in barberos) * MINUTOS_FRANJA
+
+
+PLANTILLA_DEFECTO = PlantillaHorario()
+
+
+def _jornada_defecto(barbero_id: Optional[int]) -> int:
+    return MASCARA_JORNADA
+
+
+def mascara_bloqueo(todo_dia: bool, hora_inicio: Optional[time], hora_fin: Optional[time]) -> int:
+    if todo_dia:
+        return MASCARA_DIA_COMPLETO
+    if hora_inicio is None or hora_fin is None:
+        return 0
+    return mascara_intervalo(hora_inicio, hora_fin)
+
+
+# Reservas atómicas (tabla reservas_horario): franjas finas de 5 minutos
+MINUTOS_RESERVA = 5
+
+
+def franjas_reserva(hora_inicio: time, hora_fin: time) -> range:
+    """Franjas de 5 minutos del turno; ValueError si no ocupa ninguna (fin <= inicio)."""
+    inicio = _minutos(hora_inicio) // MINUTOS_RESERVA
+    fin = -(-_minutos(hora_fin) // MINUTOS_RESERVA)
+    if fin <= inicio:
+        raise ValueError("El turno debe terminar el mismo día y después de su hora de inicio")
+    return range(inicio, fin)
+
+
+def franjas_duracion(minutos: int) -> int:
+    """Cantidad de franjas consecutivas que ocupa un servicio de esa duración."""
+    return max(1, -(-minutos // MINUTOS_FRANJA))
+
+
+def inicios_libres(ocupado: int, franjas: int = 1, jornada: int = MASCARA_JORNADA) -> int:
+    """Franjas de la jornada donde entra un turno de ``franjas`` franjas seguidas.
+
+    Se resta la ocupación de la plantilla de jornada, se desplaza la máscara de
+    libres y se intersecta consigo misma, así que el costo depende de la
+    duración y no de la cantidad de turnos del día.
+    """
+    libres = jornada & ~ocupado
+    inicios = libres
+    for desplazamiento in range(1, franjas):
+        inicios &= libres >> desplazamiento
+    return inicios
+
+
+# --- Ocupación de un día por barbero ---
+class OcupacionDia:
+    """Foto de un día: máscara común (bloqueos y turnos sin barbero) y una por barbero.
+
+    Con ``barberos`` vacío la barbería se trata como una sola silla.
+    """
+    __slots__ = ("comun", "por_barbero", "bloqueos")
+
+    def __init__(self, comun: int, por_barbero: Dict[int, int], bloqueos: List[tuple]):
+        self.comun = comun
+        self.por_barbero = por_barbero
+        self.bloqueos = bloqueos
+
+    @property
+    def ocupado(self) -> int:
+        """Todo lo ocupado del día, sin distinguir barbero (una sola silla)."""
+        ocupado = self.comun
+        for mascara in self.por_barbero.values():
+            ocupado |= mascara
+        return ocupado
+
+    def de_barbero(self, barbero_id: Optional[int]) -> int:
+        if barbero_id is None:
+            return self.ocupado
+        return self.comun | self.por_barbero.get(barbero_id, 0)
+
+    def inicios(self, barberos: Iterable[int] = (), franjas: int = 1, barbero_id: Optional[int] = None,
+                jornada: Callable[[Optional[int]], int] = _jornada_defecto) -> int:
+        """Inicios libres para un barbero, o la unión de todos ("cualquier barbero").
+
+        ``jornada`` da la máscara de horario de trabajo de cada barbero ese día.
+        """
+        if barbero_id is not None:
+            return inicios_libres(self.de_barbero(barbero_id), franjas, jornada(barbero_id))
+        inicios = 0
+        barberos = list(barberos)
+        if not barberos:
+            return inicios_libres(self.ocupado, franjas, jornada(None))
+        for barbero in barberos:
+            inicios |= inicios_libres(self.de_barbero(barbero), franjas, jornada(barbero))
+        return inicios
+
+    def elegir_barbero(self, barberos: Iterable[int], mascara: int, barbero_id: Optional[int] = None,
+                       jornada: Callable[[Optional[int]], int] = _jornada_defecto) -> Tuple[bool, Optional[int]]:
+        """(disponible, barbero) para ``mascara``; prefiere al barbero con menos ocupación."""
+        barberos = list(barberos)
+        if barbero_id is not None:
+            candidatos = [barbero_id]
+        elif barberos:
+            candidatos = sorted(barberos, key=lambda b: bin(self.de_barbero(b)).count("1"))
+        else:
+            candidatos = [None]
+        for candidato in candidatos:
+            if not self.de_barbero(candidato) & mascara and not mascara & ~jornada(candidato):
+                return True, candidato
+        return False, None
+
+    def ocupar(self, mascara: int, barbero_id: Optional[int]):
+        """Marca la máscara como tomada (para reservas en lote antes del commit)."""
+        if barbero_id is None:
+            self.comun |= mascara
+        else:
+            self.por_barbero[barbero_id] = self.por_barbero.get(barbero_id, 0) | mascara
+
+
+# --- Armado de respuestas de disponibilidad ---
+def horarios_libres(fecha: date, inicios: int) -> List[str]:
+    fecha_actual = date.today()
+    if fecha < fecha_actual:
+        return []
+
+    # Si es el día actual, sólo mostrar horarios posteriores a la hora actual
+    if fecha == fecha_actual:
+        inicios &= mascara_posterior(datetime.now().time())
+    return horarios(inicios)
+
+
+def serializar_bloqueo(fecha: date, bloqueo: tuple) -> dict:
+    bloqueo_id, todo_dia, hora_inicio, hora_fin, motivo = bloqueo
+    return {
+        "id": bloqueo_id,
+        "fecha": fecha.isoformat(),
+        "todo_dia": todo_dia,
+        "hora_inicio": hora_inicio.strftime("%H:%M") if hora_inicio else None,
+        "hora_fin": hora_fin.strftime("%H:%M") if hora_fin else None,
+        "motivo": motivo,
+    }
+
+
+def respuesta_dia(fecha: date, ocupacion: OcupacionDia, barberos: Iterable[int] = (),
+                  franjas: int = 1, barbero_id: Optional[int] = None,
+                  plantilla: PlantillaHorario = PLANTILLA_DEFECTO) -> dict:
+    inicios = ocupacion.inicios(barberos, franjas, barbero_id, plantilla.jornadas(fecha))
+    return {
+        "horarios_disponibles": horarios_libres(fecha, inicios),
+        "bloqueos": [serializar_bloqueo(fecha, b) for b in ocupacion.bloqueos],
+    }
+
+
+def dias_rango(fecha_inicio: date, fecha_fin: date) -> List[date]:
+    return [fecha_inicio + timedelta(days=i) for i in range((fecha_fin - fecha_inicio).days + 1)]
+
+
+# --- Turnos recurrentes ---
+FRECUENCIAS = ("diaria", "semanal", "mensual")
+MAX_OCURRENCIAS = 200
+
+
+def fechas_recurrencia(fecha_inicio: date, frecuencia: str, intervalo: int = 1,
+                       repeticiones: Optional[int] = None, fecha_fin: Optional[date] = None) -> List[date]:
+    """Fechas de una regla tipo RRULE (FREQ/INTERVAL/COUNT/UNTIL).
+
+    En la frecuencia mensual se salta un mes que no tiene el día de inicio
+    (p. ej. el 31), como hace RRULE. Nunca devuelve más de MAX_OCURRENCIAS.
+    """
+    if frecuencia not in FRECUENCIAS:
+        raise ValueError(f"La frecuencia debe ser una de: {', '.join(FRECUENCIAS)}")
+    if intervalo < 1:
+        raise ValueError("El intervalo debe ser mayor a cero")
+    if repeticiones is None and fecha_fin is None:
+        raise ValueError("Indique la cantidad de repeticiones o la fecha de fin")
+    limite = min(repeticiones or MAX_OCURRENCIAS, MAX_OCURRENCIAS)
+
+    fechas = []
+    paso = 0
+    while len(fechas) < limite:
+        if frecuencia == "mensual":
+            meses = fecha_inicio.month - 1 + paso * intervalo
+            anio, mes = fecha_inicio.year + meses // 12, meses % 12 + 1
+            if anio > date.max.year:
+                break
+            try:
+                fecha = fecha_inicio.replace(year=anio, month=mes)
+            except ValueError:
+                paso += 1
+                continue
+        else:
+            dias = paso * intervalo * (7 if frecuencia == "semanal" else 1)
+            fecha = fecha_inicio + timedelta(days=dias)
+        if fecha_fin is not None and fecha > fecha_fin:
+            break
+        fechas.append(fecha)
+        paso += 1
+    return fechas
+
+
+# --- Estado de un día ---
+class _Dia:
+    __slots__ = ("turnos", "bloqueos", "comun", "por_barbero", "cargado_en")
+
+    def __init__(self):
+        # id -> (barbero_id, mascara)
+        self.turnos: Dict[int, Tuple[Optional[int], int]] = {}
+        # id -> (mascara, todo_dia, hora_inicio, hora_fin, motivo)
+        self.bloqueos: Dict[int, tuple] = {}
+        self.comun = 0
+        self.por_barbero: Dict[int, int] = {}
+        self.cargado_en = _reloj.monotonic()
+
+    def recalcular(self):
+        comun = 0
+        por_barbero: Dict[int, int] = {}
+        for barbero_id, mascara in self.turnos.values():
+            if barbero_id is None:
+                comun |= mascara
+            else:
+                por_barbero[barbero_id] = por_barbero.get(barbero_id, 0) | mascara
+        for bloqueo in self.bloqueos.values():
+            comun |= bloqueo[0]
+        self.comun = comun
+        self.por_barbero = por_barbero
+
+
+class IndiceAgenda:
+    """Cache LRU de ocupación por (tenant, fecha).
+
+    Las escrituras sólo modifican días ya cargados; un día frío se vuelve a
+    construir desde la base en la próxima lectura. ``ttl`` acota cuánto puede
+    quedar desactualizado un día cuando otro proceso escribe en la misma base.
+    """
+
+    def __init__(self, max_dias: int = 4096, ttl: float = 60.0):
+        self.max_dias = max_dias
+        self.ttl = ttl
+        self._dias: "OrderedDict[Tuple[str, date], _Dia]" = OrderedDict()
+        self._versiones: "OrderedDict[Tuple[str, date], int]" = OrderedDict()
+        self._barberos: Dict[str, Tuple[List[int], float]] = {}
+        self._plantillas: Dict[str, Tuple[PlantillaHorario, float]] = {}
+        self._lock = threading.Lock()
+
+    # --- Lecturas ---
+    def _vigente(self, clave) -> Optional[_Dia]:
+        dia = self._dias.get(clave)
+        if dia is None:
+            return None
+        if self.ttl and _reloj.monotonic() - dia.cargado_en > self.ttl:
+            del self._dias[clave]
+            return None
+        self._dias.move_to_end(clave)
+        return dia
+
+    def obtener(self, tenant: str, fecha: date) -> Optional[OcupacionDia]:
+        """Devuelve la ocupación del día si está cargado, o None."""
+        with self._lock:
+            dia = self._vigente((tenant, fecha))
+            if dia is None:
+                return None
+            return self._foto(dia)
+
+    def version(self, tenant: str, fecha: date) -> int:
+        """Versión de escrituras del día; se toma antes de consultar la base."""
+        with self._lock:
+            return self._versiones.get((tenant, fecha), 0)
+
+    # --- Carga desde la base ---
+    def cargar(self, tenant: str, fecha: date, turnos: Iterable[tuple],
+               bloqueos: Iterable[tuple], version: int) -> OcupacionDia:
+        """Arma el día con filas (id, hora_inicio, hora_fin, barbero_id) de turnos y
+        (id, todo_dia, hora_inicio, hora_fin, motivo) de bloqueos.
+
+        Si hubo escrituras sobre el día desde que se tomó ``version`` el
+        resultado se devuelve pero no se guarda, para no cachear datos viejos.
+        """
+        dia = _Dia()
+        for turno_id, hora_inicio, hora_fin, barbero_id in turnos:
+            dia.turnos[turno_id] = (barbero_id, mascara_intervalo(hora_inicio, hora_fin))
+        for bloqueo_id, todo_dia, hora_inicio, hora_fin, motivo in bloqueos:
+            dia.bloqueos[bloqueo_id] = (
+                mascara_bloqueo(todo_dia, hora_inicio, hora_fin), todo_dia, hora_inicio, hora_fin, motivo
+            )
+        dia.recalcular()
+
+        clave = (tenant, fecha)
+        with self._lock:
+            if self._versiones.get(clave, 0) == version:
+                self._dias[clave] = dia
+                self._dias.move_to_end(clave)
+                while len(self._dias) > self.max_dias:
+                    self._dias.popitem(last=False)
+        return self._foto(dia)
+
+    def separar(self, tenant: str, dias: Iterable[date]):
+        """Divide los días en (ocupacion cacheada, {dia: version} a cargar)."""
+        ocupacion, pendientes = {}, {}
+        for dia in dias:
+            cacheado = self.obtener(tenant, dia)
+            if cacheado is not None:
+                ocupacion[dia] = cacheado
+            else:
+                pendientes[dia] = self.version(tenant, dia)
+        return ocupacion, pendientes
+
+    def cargar_rango(self, tenant: str, pendientes: Dict[date, int], turnos: Iterable[tuple],
+                     bloqueos: Iterable[tuple]) -> Dict[date, OcupacionDia]:
+        """Agrupa en memoria filas de varios días y carga cada día pendiente.
+
+        ``turnos``: (id, fecha, hora_inicio, hora_fin, barbero_id);
+        ``bloqueos``: (id, fecha, todo_dia, hora_inicio, hora_fin, motivo).
+        """
+        turnos_por_dia = {dia: [] for dia in pendientes}
+        for turno_id, fecha, hora_inicio, hora_fin, barbero_id in turnos:
+            if fecha in turnos_por_dia:
+                turnos_por_dia[fecha].append((turno_id, hora_inicio, hora_fin, barbero_id))
+        bloqueos_por_dia = {dia: [] for dia in pendientes}
+        for bloqueo_id, fecha, todo_dia, hora_inicio, hora_fin, motivo in bloqueos:
+            if fecha in bloqueos_por_dia:
+                bloqueos_por_dia[fecha].append((bloqueo_id, todo_dia, hora_inicio, hora_fin, motivo))
+        return {
+            dia: self.cargar(tenant, dia, turnos_por_dia[dia], bloqueos_por_dia[dia], version)
+            for dia, version in pendientes.items()
+        }
+
+    # --- Escrituras ---
+    def _modificar(self, tenant: str, fecha: date, cambio):
+        clave = (tenant, fecha)
+        with self._lock:
+            self._versiones[clave] = self._versiones.get(clave, 0) + 1
+            self._versiones.move_to_end(clave)
+            while len(self._versiones) > self.max_dias:
+                self._versiones.popitem(last=False)
+            dia = self._vigente(clave)
+            if dia is not None:
+                cambio(dia)
+                dia.recalcular()
+
+    def registrar_turno(self, tenant: str, fecha: date, turno_id: int, hora_inicio: time, hora_fin: time,
+                        barbero_id: Optional[int] = None):
+        datos = (barbero_id, mascara_intervalo(hora_inicio, hora_fin))
+        self._modificar(tenant, fecha, lambda dia: dia.turnos.__setitem__(turno_id, datos))
+
+    def quitar_turno(self, tenant: str, fecha: date, turno_id: int):
+        self._modificar(tenant, fecha, lambda dia: dia.turnos.pop(turno_id, None))
+
+    def registrar_bloqueo(self, tenant: str, fecha: date, bloqueo_id: int, todo_dia: bool,
+                          hora_inicio: Optional[time], hora_fin: Optional[time], motivo: Optional[str]):
+        datos = (mascara_bloqueo(todo_dia, hora_inicio, hora_fin), todo_dia, hora_inicio, hora_fin, motivo)
+        self._modificar(tenant, fecha, lambda dia: dia.bloqueos.__setitem__(bloqueo_id, datos))
+
+    def quitar_bloqueo(self, tenant: str, fecha: date, bloqueo_id: int):
+        self._modificar(tenant, fecha, lambda dia: dia.bloqueos.pop(bloqueo_id, None))
+
+    # --- Datos por tenant que no dependen del día (con el mismo TTL) ---
+    def _leer(self, cache: dict, tenant: str):
+        with self._lock:
+            entrada = cache.get(tenant)
+            if entrada is None or (self.ttl and _reloj.monotonic() - entrada[1] > self.ttl):
+                return None
+            return entrada[0]
+
+    def _guardar(self, cache: dict, tenant: str, valor):
+        with self._lock:
+            cache[tenant] = (valor, _reloj.monotonic())
+
+    # Barberos de la barbería (usuarios con rol 'barbero')
+    def barberos(self, tenant: str) -> Optional[List[int]]:
+        return self._leer(self._barberos, tenant)
+
+    def guardar_barberos(self, tenant: str, barberos: List[int]):
+        self._guardar(self._barberos, tenant, list(barberos))
+
+    def invalidar_barberos(self, tenant: str):
+        with self._lock:
+            self._barberos.pop(tenant, None)
+
+    # Plantilla de horario de trabajo y feriados
+    def plantilla(self, tenant: str) -> Optional[PlantillaHorario]:
+        return self._leer(self._plantillas, tenant)
+
+    def guardar_plantilla(self, tenant: str, plantilla: PlantillaHorario):
+        self._guardar(self._plantillas, tenant, plantilla)
+
+    def invalidar_plantilla(self, tenant: str):
+        with self._lock:
+            self._plantillas.pop(tenant, None)
+
+    def invalidar(self, tenant: Optional[str] = None):
+        with self._lock:
+            if tenant is None:
+                self._dias.clear()
+                self._barberos.clear()
+                self._plantillas.clear()
+            else:
+                for clave in [c for c in self._dias if c[0] == tenant]:
+                    del self._dias[clave]
+                self._barberos.pop(tenant, None)
+                self._plantillas.pop(tenant, None)
+
+    @classmethod
+    def _foto(cls, dia: _Dia) -> OcupacionDia:
+        return OcupacionDia(dia.comun, dict(dia.por_barbero), cls._bloqueos_ordenados(dia))
+
+    @staticmethod
+    def _bloqueos_ordenados(dia: _Dia) -> List[tuple]:
+        """Bloqueos como (id, todo_dia, hora_inicio, hora_fin, motivo), ordenados por hora."""
+        filas = [(bloqueo_id,) + datos[1:] for bloqueo_id, datos in dia.bloqueos.items()]
+        filas.sort(key=lambda b: (b[2] is not None, b[2] or time.min, b[0]))
+        return filas
+
+
+indice = IndiceAgenda(max_dias=settings.AGENDA_CACHE_DIAS, ttl=settings.AGENDA_CACHE_TTL)
@@ -0,0 +1,94 @@
+"""Catálogo de servicios en memoria, por barbería.
+
+La tabla tiene pocas filas y casi no cambia, así que se carga entera y se
+busca por id o por nombre sin ir a la base. Cada copia queda marcada con la
+versión de la clave "servicios" de ``versiones``: ``create_servicio`` y
+``update_servicio`` la descartan en este proceso, y los demás workers ven la
+versión nueva al releer la tabla de versiones (cada ``VERSIONES_INTERVALO``).
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.crud import versiones
+from app.models.models import Servicio
+
+
+class ServicioCatalogo:
+    """Copia de sólo lectura de un servicio, sin sesión de base asociada."""
+    __slots__ = ("id", "nombre", "duracion_min", "precio", "barbero_id")
+
+    def __init__(self, id: int, nombre: str, duracion_min: int, precio: int, barbero_id: Optional[int]):
+        self.id = id
+        self.nombre = nombre
+        self.duracion_min = duracion_min
+        self.precio = precio
+        self.barbero_id = barbero_id
+
+
+class Catalogo:
+    def __init__(self, filas: Iterable[tuple]):
+        self.servicios: List[ServicioCatalogo] = [ServicioCatalogo(*fila) for fila in filas]
+        self.por_id: Dict[int, ServicioCatalogo] = {s.id: s for s in self.servicios}
+        self.por_nombre: Dict[str, ServicioCatalogo] = {}
+        for servicio in self.servicios:
+            # Con nombres repetidos gana el de menor id
+            self.por_nombre.setdefault(servicio.nombre, servicio)
+
+    def pagina(self, skip: int = 0, limit: int = 100) -> List[ServicioCatalogo]:
+        return self.servicios[skip:skip + limit]
+
+
+class CacheCatalogo:
+    def __init__(self):
+        self._tenants: Dict[str, Tuple[int, Catalogo]] = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, tenant: str, version: int) -> Optional[Catalogo]:
+        with self._lock:
+            entrada = self._tenants.get(tenant)
+        if entrada is None or entrada[0] != version:
+            return None
+        return entrada[1]
+
+    def guardar(self, tenant: str, version: int, catalogo: Catalogo):
+        with self._lock:
+            self._tenants[tenant] = (version, catalogo)
+
+    def invalidar(self, tenant: str):
+        with self._lock:
+            self._tenants.pop(tenant, None)
+
+
+cache = CacheCatalogo()
+
+_CONSULTA = select(
+    Servicio.id, Servicio.nombre, Servicio.duracion_min, Servicio.precio, Servicio.barbero_id
+).order_by(Servicio.id)
+
+
+def catalogo(db: Session) -> Catalogo:
+    """Catálogo vigente del tenant de ``db``; sólo lee la tabla si cambió la versión.
+
+    La versión se toma antes que las filas: si alguien escribe en el medio la
+    copia queda con la versión vieja y se recarga en el pedido siguiente.
+    """
+    tenant = versiones.al_dia(db)
+    version = versiones.cache.version(tenant, versiones.SERVICIOS)
+    actual = cache.obtener(tenant, version)
+    if actual is None:
+        actual = Catalogo(db.execute(_CONSULTA).all())
+        cache.guardar(tenant, version, actual)
+    return actual
+
+
+async def catalogo_async(db) -> Catalogo:
+    tenant = await versiones.al_dia_async(db)
+    version = versiones.cache.version(tenant, versiones.SERVICIOS)
+    actual = cache.obtener(tenant, version)
+    if actual is None:
+        actual = Catalogo((await db.execute(_CONSULTA)).all())
+        cache.guardar(tenant, version, actual)
+    return actual
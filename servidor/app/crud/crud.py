@@ -1,29 +1,74 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, func
-from typing import List, Optional
+from sqlalchemy import and_, bindparam, or_, exists, func, insert, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from typing import Iterable, List, Optional
 from datetime import datetime, date, time, timedelta
+import base64
 import hashlib
+import json
 
-from app.models.models import Usuario, Clientes, Servicio, Turno, BloqueoAgenda
-from app.schemas.schemas import UsuarioCreate, ServicioCreate, TurnoCreate, BloqueoCreate
+from app.core import autenticacion, eventos, seguridad
+from app.core.config import clave_tenant
+from app.crud import agenda, catalogo, resumen, telefonos, versiones
+from app.models.models import (
+    Usuario, Clientes, Servicio, Turno, TurnoRecurrente, BloqueoAgenda, ReservaHorario, ResumenDiario,
+    HorarioTrabajo, Feriado
+)
+from app.schemas.schemas import UsuarioCreate, ServicioCreate, TurnoCreate, BloqueoCreate, HorarioTrabajoCreate, FeriadoCreate
 
 # Funciones CRUD para Usuarios (admin)
+# --- Paginación por cursor ---
+# El cursor codifica la clave de orden de la última fila devuelta; la página
+# siguiente filtra con (columnas) > (clave), que usa el índice en vez de
+# recorrer todas las filas anteriores como OFFSET.
+def codificar_cursor(valores: tuple) -> str:
+    crudo = json.dumps([v.isoformat() if isinstance(v, (date, time)) else v for v in valores])
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+def decodificar_cursor(cursor: str, tipos: tuple) -> tuple:
+    try:
+        crudo = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        valores = json.loads(crudo)
+        if not isinstance(valores, list) or len(valores) != len(tipos):
+            raise ValueError
+        return tuple(tipo(valor) for tipo, valor in zip(tipos, valores))
+    except (ValueError, TypeError):
+        raise ValueError("Cursor inválido")
+
+def siguiente_cursor(filas: list, limit: int, clave) -> Optional[str]:
+    """Cursor de la página siguiente, o None si ésta fue la última."""
+    if not filas or len(filas) < limit:
+        return None
+    return codificar_cursor(clave(filas[-1]))
+
+CURSOR_ID = (int,)
+CURSOR_TURNOS = (date.fromisoformat, time.fromisoformat, int)
+
+def clave_id(fila) -> tuple:
+    return (fila.id,)
+
+def clave_turno(turno: Turno) -> tuple:
+    return turno.fecha, turno.hora_inicio, turno.id
+
 def get_usuario(db: Session, usuario_id: int) -> Optional[Usuario]:
     return db.query(Usuario).filter(Usuario.id == usuario_id).first()
 
 def get_usuario_by_usuario(db: Session, usuario: str) -> Optional[Usuario]:
     return db.query(Usuario).filter(Usuario.usuario == usuario).first()
 
-def get_usuarios(db: Session, skip: int = 0, limit: int = 100, rol: Optional[str] = None) -> List[Usuario]:
+def get_usuarios(db: Session, skip: int = 0, limit: int = 100, rol: Optional[str] = None,
+                 cursor: Optional[str] = None) -> List[Usuario]:
     query = db.query(Usuario)
     if rol:
         query = query.filter(Usuario.rol == rol)
-    return query.offset(skip).limit(limit).all()
+    if cursor:
+        query = query.filter(Usuario.id > decodificar_cursor(cursor, CURSOR_ID)[0])
+    elif skip:
+        query = query.offset(skip)
+    return query.order_by(Usuario.id).limit(limit).all()
 
 def create_usuario(db: Session, usuario: UsuarioCreate) -> Usuario:
-    from passlib.context import CryptContext
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    password_hash = pwd_context.hash(usuario.password)
+    password_hash = seguridad.hashear(usuario.password)
     
     db_usuario = Usuario(
         nombre=usuario.nombre,
@@ -32,27 +77,203 @@ def create_usuario(db: Session, usuario: UsuarioCreate) -> Usuario:
         rol=usuario.rol
     )
     db.add(db_usuario)
+    versiones.registrar(db, versiones.BARBEROS)
     db.commit()
     db.refresh(db_usuario)
+    agenda.indice.invalidar_barberos(clave_tenant(db))
     return db_usuario
 
+def update_usuario(db: Session, usuario_id: int, usuario_update: dict) -> Optional[Usuario]:
+    """Actualiza campos del usuario (nunca password_hash) e invalida sus tokens cacheados."""
+    db_usuario = get_usuario(db, usuario_id)
+    if not db_usuario:
+        return None
+    usuario_anterior = db_usuario.usuario
+    for field, value in usuario_update.items():
+        if field != "password_hash" and hasattr(db_usuario, field):
+            setattr(db_usuario, field, value)
+    versiones.registrar(db, versiones.BARBEROS)
+    db.commit()
+    db.refresh(db_usuario)
+    tenant = clave_tenant(db)
+    autenticacion.principales.invalidar(tenant, usuario_anterior)
+    autenticacion.principales.invalidar(tenant, db_usuario.usuario)
+    agenda.indice.invalidar_barberos(tenant)
+    return db_usuario
+
+def ids_barberos(db: Session) -> List[int]:
+    """Ids de los usuarios con rol 'barbero' (cacheados por tenant en el índice de agenda)."""
+    tenant = clave_tenant(db)
+    barberos = agenda.indice.barberos(tenant)
+    if barberos is None:
+        barberos = [fila.id for fila in db.query(Usuario.id).filter(Usuario.rol == "barbero").order_by(Usuario.id)]
+        agenda.indice.guardar_barberos(tenant, barberos)
+    return barberos
+
 # Funciones CRUD para Clientes
 def get_cliente(db: Session, cliente_id: int) -> Optional[Clientes]:
     return db.query(Clientes).filter(Clientes.id == cliente_id).first()
 
 def get_cliente_by_telefono(db: Session, telefono: str) -> Optional[Clientes]:
-    return db.query(Clientes).filter(Clientes.telefono == telefono).first()
+    """Busca por el teléfono normalizado (índice único); ValueError si el teléfono no es válido."""
+    return db.query(Clientes).filter(Clientes.telefono_normalizado == telefonos.normalizar(telefono)).first()
 
-def get_clientes(db: Session, skip: int = 0, limit: int = 100) -> List[Clientes]:
-    return db.query(Clientes).offset(skip).limit(limit).all()
+def obtener_o_crear_cliente(db: Session, nombre: str, telefono: str) -> Clientes:
+    """
+    Cliente con ese teléfono, creándolo (sin confirmar) si no existe. Si otra
+    reserva lo crea al mismo tiempo, el índice único lo rechaza y se usa ese.
+    """
+    normalizado = telefonos.normalizar(telefono)
+    cliente = db.query(Clientes).filter(Clientes.telefono_normalizado == normalizado).first()
+    if cliente:
+        return cliente
+    try:
+        with db.begin_nested():
+            cliente = Clientes(nombre=nombre, telefono=telefono, telefono_normalizado=normalizado)
+            db.add(cliente)
+            db.flush()
+        return cliente
+    except IntegrityError:
+        return db.query(Clientes).filter(Clientes.telefono_normalizado == normalizado).one()
+
+def get_clientes(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Clientes]:
+    query = db.query(Clientes)
+    if cursor:
+        query = query.filter(Clientes.id > decodificar_cursor(cursor, CURSOR_ID)[0])
+    elif skip:
+        query = query.offset(skip)
+    return query.order_by(Clientes.id).limit(limit).all()
 
 def create_cliente(db: Session, nombre: str, telefono: str) -> Clientes:
-    db_cliente = Clientes(nombre=nombre, telefono=telefono)
+    db_cliente = Clientes(nombre=nombre, telefono=telefono, telefono_normalizado=telefonos.normalizar(telefono))
     db.add(db_cliente)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise ValueError("Ya existe un cliente con ese teléfono")
     db.refresh(db_cliente)
     return db_cliente
 
+MAX_ERRORES_IMPORTACION = 100
+
+def importar_clientes(db: Session, filas: Iterable[dict], tamano_lote: int = 1000) -> dict:
+    """
+    Alta o actualización masiva de clientes ({nombre, telefono}) por teléfono
+    normalizado: los que no existen se insertan y a los que existen se les
+    actualiza el nombre. Si un número se repite en el archivo gana la última
+    fila. Cada lote se confirma por separado, así que un archivo grande no
+    retiene la transacción ni se pierde entero por una fila mala.
+    Retorna {creados, actualizados, sin_cambios, errores, detalle_errores}.
+    """
+    resultado = {"creados": 0, "actualizados": 0, "sin_cambios": 0, "errores": 0, "detalle_errores": []}
+    lote = {}
+    for numero, fila in enumerate(filas, start=1):
+        nombre = (fila.get("nombre") or "").strip()
+        telefono = (fila.get("telefono") or "").strip()
+        try:
+            if not nombre or not telefono:
+                raise ValueError("Faltan nombre o teléfono")
+            if len(nombre) > 100 or len(telefono) > 20:
+                raise ValueError("Nombre o teléfono demasiado largo")
+            lote[telefonos.normalizar(telefono)] = (nombre, telefono)
+        except ValueError as e:
+            resultado["errores"] += 1
+            if len(resultado["detalle_errores"]) < MAX_ERRORES_IMPORTACION:
+                resultado["detalle_errores"].append({"fila": numero, "detalle": str(e)})
+            continue
+        if len(lote) >= tamano_lote:
+            _importar_lote_clientes(db, lote, resultado)
+            lote = {}
+    if lote:
+        _importar_lote_clientes(db, lote, resultado)
+    return resultado
+
+def _importar_lote_clientes(db: Session, lote: dict, resultado: dict):
+    # Dos intentos: si una reserva crea uno de estos clientes entre la lectura
+    # y el insert, el índice único lo rechaza y al releer ya figura como existente
+    for intento in range(2):
+        existentes = {
+            normalizado: (cliente_id, nombre)
+            for normalizado, cliente_id, nombre in db.query(
+                Clientes.telefono_normalizado, Clientes.id, Clientes.nombre
+            ).filter(Clientes.telefono_normalizado.in_(list(lote)))
+        }
+        nuevos, cambios = [], []
+        for normalizado, (nombre, telefono) in lote.items():
+            if normalizado not in existentes:
+                nuevos.append({"nombre": nombre, "telefono": telefono, "telefono_normalizado": normalizado})
+            elif existentes[normalizado][1] != nombre:
+                cambios.append({"id": existentes[normalizado][0], "nombre": nombre})
+        try:
+            if nuevos:
+                db.execute(insert(Clientes), nuevos)
+            if cambios:
+                db.execute(update(Clientes), cambios)
+                # Los listados de turnos incluyen el nombre del cliente
+                versiones.registrar(db, versiones.CLIENTES)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            if intento:
+                raise
+            continue
+        resultado["creados"] += len(nuevos)
+        resultado["actualizados"] += len(cambios)
+        resultado["sin_cambios"] += len(lote) - len(nuevos) - len(cambios)
+        return
+
+def normalizar_telefonos(db: Session, fusionar: bool = False, tamano_lote: int = 5000) -> dict:
+    """
+    Completa telefono_normalizado de los clientes creados antes de la columna.
+    Si varios clientes tienen el mismo número, se normaliza el primero (el de
+    menor id, salvo que ya hubiera uno normalizado) y los demás quedan en NULL:
+    no se borran, pero las reservas ya no los encuentran. Con fusionar=True sus
+    turnos y turnos recurrentes pasan al cliente que queda.
+    Retorna {normalizados, duplicados, invalidos, clientes_fusionados}.
+    """
+    resultado = {"normalizados": 0, "duplicados": 0, "invalidos": 0, "clientes_fusionados": 0}
+    reasignar = {
+        tabla: update(tabla.__table__).where(tabla.cliente_id == bindparam("anterior")).values(cliente_id=bindparam("nuevo"))
+        for tabla in (Turno, TurnoRecurrente)
+    }
+    ultimo_id = 0
+    while True:
+        filas = db.query(Clientes.id, Clientes.telefono).filter(
+            Clientes.telefono_normalizado.is_(None), Clientes.id > ultimo_id
+        ).order_by(Clientes.id).limit(tamano_lote).all()
+        if not filas:
+            break
+        ultimo_id = filas[-1].id
+        normalizados = []
+        for cliente_id, telefono in filas:
+            try:
+                normalizados.append((cliente_id, telefonos.normalizar(telefono)))
+            except ValueError:
+                resultado["invalidos"] += 1
+        canonicos = dict(db.query(Clientes.telefono_normalizado, Clientes.id).filter(
+            Clientes.telefono_normalizado.in_({n for _, n in normalizados})
+        ))
+        cambios, fusiones = [], []
+        for cliente_id, normalizado in normalizados:
+            if normalizado in canonicos:
+                resultado["duplicados"] += 1
+                fusiones.append({"anterior": cliente_id, "nuevo": canonicos[normalizado]})
+            else:
+                canonicos[normalizado] = cliente_id
+                cambios.append({"id": cliente_id, "telefono_normalizado": normalizado})
+        if cambios:
+            db.execute(update(Clientes), cambios)
+        if fusionar and fusiones:
+            for sentencia in reasignar.values():
+                db.execute(sentencia, fusiones)
+            versiones.registrar(db, versiones.CLIENTES)
+            resultado["clientes_fusionados"] += len(fusiones)
+        db.commit()
+        resultado["normalizados"] += len(cambios)
+    return resultado
+
+
 # Funciones CRUD para Servicios
 def get_servicio(db: Session, servicio_id: int) -> Optional[Servicio]:
     return db.query(Servicio).filter(Servicio.id == servicio_id).first()
@@ -63,24 +284,36 @@ def get_servicios(db: Session, skip: int = 0, limit: int = 100) -> List[Servicio
 def create_servicio(db: Session, servicio: ServicioCreate) -> Servicio:
     db_servicio = Servicio(**servicio.dict())
     db.add(db_servicio)
+    versiones.registrar(db, versiones.SERVICIOS)
+    db.commit()
+    db.refresh(db_servicio)
+    catalogo.cache.invalidar(clave_tenant(db))
+    return db_servicio
+
+def update_servicio(db: Session, servicio_id: int, servicio_update: dict) -> Optional[Servicio]:
+    db_servicio = get_servicio(db, servicio_id)
+    if not db_servicio:
+        return None
+    for field, value in servicio_update.items():
+        if hasattr(db_servicio, field):
+            setattr(db_servicio, field, value)
+    versiones.registrar(db, versiones.SERVICIOS)
     db.commit()
     db.refresh(db_servicio)
+    catalogo.cache.invalidar(clave_tenant(db))
     return db_servicio
 
 # Funciones CRUD para Turnos (modificadas para usar Clientes)
 def get_turno(db: Session, turno_id: int) -> Optional[Turno]:
     return db.query(Turno).filter(Turno.id == turno_id).first()
 
-def get_turnos(db: Session, skip: int = 0, limit: int = 100, 
-                cliente_id: Optional[int] = None, 
-                fecha_inicio: Optional[date] = None,
-                fecha_fin: Optional[date] = None,
-                estado: Optional[str] = None) -> List[Turno]:
-    query = db.query(Turno).options(
-        joinedload(Turno.cliente),
-        joinedload(Turno.servicio)
-    )
-    
+def filtrar_turnos(query, skip: int = 0, limit: Optional[int] = 100,
+                   cliente_id: Optional[int] = None,
+                   fecha_inicio: Optional[date] = None,
+                   fecha_fin: Optional[date] = None,
+                   estado: Optional[str] = None,
+                   cursor: Optional[str] = None):
+    """Filtros, orden y página de los listados de turnos (sirve para entidades o columnas)."""
     if cliente_id:
         query = query.filter(Turno.cliente_id == cliente_id)
     if fecha_inicio:
@@ -89,13 +322,46 @@ def get_turnos(db: Session, skip: int = 0, limit: int = 100,
         query = query.filter(Turno.fecha <= fecha_fin)
     if estado:
         query = query.filter(Turno.estado == estado)
-    
-    return query.order_by(Turno.fecha, Turno.hora_inicio).offset(skip).limit(limit).all()
+    if cursor:
+        query = query.filter(
+            tuple_(Turno.fecha, Turno.hora_inicio, Turno.id) > decodificar_cursor(cursor, CURSOR_TURNOS)
+        )
+    elif skip:
+        query = query.offset(skip)
+    query = query.order_by(Turno.fecha, Turno.hora_inicio, Turno.id)
+    return query.limit(limit) if limit is not None else query
 
-def create_turno(db: Session, cliente_id: int, servicio_id: int, fecha: date, hora_inicio: time, hora_fin: time) -> Turno:
+def get_turnos(db: Session, skip: int = 0, limit: int = 100, 
+                cliente_id: Optional[int] = None, 
+                fecha_inicio: Optional[date] = None,
+                fecha_fin: Optional[date] = None,
+                estado: Optional[str] = None,
+                cursor: Optional[str] = None) -> List[Turno]:
+    query = db.query(Turno).options(
+        joinedload(Turno.cliente),
+        joinedload(Turno.servicio)
+    )
+    return filtrar_turnos(query, skip, limit, cliente_id, fecha_inicio, fecha_fin, estado, cursor).all()
+
+def validar_horario(hora_inicio: time, hora_fin: time):
+    """ValueError si el turno termina antes de empezar (p. ej. pasaría la medianoche)."""
+    if hora_fin <= hora_inicio:
+        raise ValueError("El turno debe terminar el mismo día y después de su hora de inicio")
+
+def hora_fin_servicio(servicio: Optional[Servicio], fecha: date, hora_inicio: time) -> time:
+    """Hora de fin según la duración del servicio (una franja si no la tiene); ValueError si pasa la medianoche."""
+    duracion = (servicio.duracion_min if servicio else None) or agenda.MINUTOS_FRANJA
+    hora_fin = (datetime.combine(fecha, hora_inicio) + timedelta(minutes=duracion)).time()
+    validar_horario(hora_inicio, hora_fin)
+    return hora_fin
+
+def create_turno(db: Session, cliente_id: int, servicio_id: int, fecha: date, hora_inicio: time, hora_fin: time,
+                 barbero_id: Optional[int] = None) -> Turno:
+    validar_horario(hora_inicio, hora_fin)
     db_turno = Turno(
         cliente_id=cliente_id,
         servicio_id=servicio_id,
+        barbero_id=barbero_id,
         fecha=fecha,
         hora_inicio=hora_inicio,
         hora_fin=hora_fin,
@@ -103,28 +369,223 @@ def create_turno(db: Session, cliente_id: int, servicio_id: int, fecha: date, ho
         notificado=False
     )
     db.add(db_turno)
-    db.commit()
+    db.flush()
+    _actualizar_reserva(db, db_turno)
+    _actualizar_resumen(db, None, _aporte_resumen(db, db_turno))
+    versiones.registrar(db, versiones.clave_agenda(fecha))
+    _commit_reserva(db)
+    db.refresh(db_turno)
+    _sincronizar_agenda_turno(db, db_turno)
+    _notificar_turno(db, "turno_creado", db_turno)
+    return db_turno
+
+def reservar_turno(db: Session, nombre: str, telefono: str, servicio_id: int,
+                   fecha: date, hora_inicio: time, hora_fin: time, barbero_id: Optional[int] = None) -> Turno:
+    """
+    Crea (si hace falta) el cliente y el turno en una sola transacción.
+    El horario queda tomado por las filas de ReservaHorario: si otra reserva
+    concurrente ganó la misma franja, el commit falla y se lanza ValueError.
+    Sin barbero_id se asigna el barbero libre con menos ocupación; si otra
+    reserva le gana la franja se prueba con el siguiente.
+    """
+    validar_horario(hora_inicio, hora_fin)
+    try:
+        cliente = obtener_o_crear_cliente(db, nombre, telefono)
+
+        db_turno = None
+        for candidato in barberos_disponibles(db, fecha, hora_inicio, hora_fin, barbero_id):
+            try:
+                with db.begin_nested():
+                    db_turno = Turno(
+                        cliente_id=cliente.id,
+                        servicio_id=servicio_id,
+                        barbero_id=candidato,
+                        fecha=fecha,
+                        hora_inicio=hora_inicio,
+                        hora_fin=hora_fin,
+                        estado="pendiente",
+                        notificado=False
+                    )
+                    db.add(db_turno)
+                    db.flush()
+                    _insertar_reservas(db, [db_turno])
+                break
+            except IntegrityError:
+                db_turno = None
+        if db_turno is None:
+            raise ValueError("El horario no está disponible")
+        _actualizar_resumen(db, None, _aporte_resumen(db, db_turno))
+        versiones.registrar(db, versiones.clave_agenda(fecha))
+    except Exception:
+        db.rollback()
+        raise
+    _commit_reserva(db)
     db.refresh(db_turno)
+    _sincronizar_agenda_turno(db, db_turno)
+    _notificar_turno(db, "turno_creado", db_turno)
     return db_turno
 
 def update_turno(db: Session, turno_id: int, turno_update: dict) -> Optional[Turno]:
     db_turno = get_turno(db, turno_id)
     if db_turno:
+        fecha_anterior = db_turno.fecha
+        antes = _aporte_resumen(db, db_turno)
         for field, value in turno_update.items():
             if value is not None:
                 setattr(db_turno, field, value)
-        db.commit()
+        db.flush()
+        db.refresh(db_turno)
+        try:
+            validar_horario(db_turno.hora_inicio, db_turno.hora_fin)
+        except ValueError:
+            db.rollback()
+            raise
+        _actualizar_reserva(db, db_turno)
+        _actualizar_resumen(db, antes, _aporte_resumen(db, db_turno))
+        versiones.registrar(db, versiones.clave_agenda(fecha_anterior), versiones.clave_agenda(db_turno.fecha))
+        _commit_reserva(db)
         db.refresh(db_turno)
+        if db_turno.fecha != fecha_anterior:
+            agenda.indice.quitar_turno(clave_tenant(db), fecha_anterior, db_turno.id)
+        _sincronizar_agenda_turno(db, db_turno)
+        _notificar_turno(db, "turno_actualizado", db_turno)
     return db_turno
 
 def delete_turno(db: Session, turno_id: int) -> bool:
     db_turno = get_turno(db, turno_id)
     if db_turno:
+        fecha = db_turno.fecha
+        _actualizar_resumen(db, _aporte_resumen(db, db_turno), None)
+        db.query(ReservaHorario).filter(ReservaHorario.turno_id == turno_id).delete(synchronize_session=False)
         db.delete(db_turno)
+        versiones.registrar(db, versiones.clave_agenda(fecha))
         db.commit()
+        agenda.indice.quitar_turno(clave_tenant(db), fecha, turno_id)
+        eventos.bus.publicar(clave_tenant(db), "turno_eliminado", {"id": turno_id, "fecha": fecha.isoformat()})
         return True
     return False
 
+def marcar_notificados(db: Session) -> int:
+    """Marca como notificados los turnos pendientes de aviso; retorna cuántos cambiaron."""
+    fechas = [fila.fecha for fila in db.query(Turno.fecha).filter(Turno.notificado == False).distinct()]
+    if not fechas:
+        return 0
+    cantidad = db.query(Turno).filter(Turno.notificado == False).update({"notificado": True}, synchronize_session=False)
+    versiones.registrar(db, *(versiones.clave_agenda(fecha) for fecha in fechas))
+    db.commit()
+    return cantidad
+
+def _sincronizar_agenda_turno(db: Session, turno: Turno):
+    """Refleja el turno ya confirmado en la base dentro del índice de agenda."""
+    if turno.estado == "cancelado":
+        agenda.indice.quitar_turno(clave_tenant(db), turno.fecha, turno.id)
+    else:
+        agenda.indice.registrar_turno(
+            clave_tenant(db), turno.fecha, turno.id, turno.hora_inicio, turno.hora_fin, turno.barbero_id
+        )
+
+def datos_evento_turno(turno: Turno) -> dict:
+    return {
+        "id": turno.id,
+        "cliente_id": turno.cliente_id,
+        "servicio_id": turno.servicio_id,
+        "barbero_id": turno.barbero_id,
+        "fecha": turno.fecha.isoformat(),
+        "hora_inicio": turno.hora_inicio.strftime("%H:%M"),
+        "hora_fin": turno.hora_fin.strftime("%H:%M"),
+        "estado": turno.estado,
+    }
+
+def _notificar_turno(db: Session, tipo: str, turno: Turno):
+    """Avisa a los dashboards conectados (SSE) de un cambio ya confirmado."""
+    eventos.bus.publicar(clave_tenant(db), tipo, datos_evento_turno(turno))
+
+# --- Resumen diario ---
+def _aporte_resumen(db: Session, turno: Turno) -> resumen.Aporte:
+    servicio = catalogo.catalogo(db).por_id.get(turno.servicio_id)
+    return resumen.aporte(
+        turno.fecha, turno.barbero_id, turno.servicio_id, turno.estado,
+        turno.hora_inicio, turno.hora_fin, servicio.precio if servicio else 0
+    )
+
+def _actualizar_resumen(db: Session, antes: Optional[resumen.Aporte], despues: Optional[resumen.Aporte]):
+    """Suma al resumen diario la diferencia de aportes, dentro de la transacción actual."""
+    _actualizar_resumen_lote(db, [(antes, despues)])
+
+def _actualizar_resumen_lote(db: Session, pares: list):
+    for sentencia in resumen.sentencias_lote(db.get_bind().dialect.name, pares):
+        db.execute(sentencia)
+
+# --- Reserva atómica de franjas ---
+def carriles_reserva(barbero_id: Optional[int], barberos: Iterable[int]) -> List[int]:
+    """
+    Valores de ReservaHorario.barbero_id que toma un turno: el de su barbero o,
+    sin barbero, el 0 y el de cada barbero, porque ocupa a todos. Así la
+    restricción única también choca entre un turno sin barbero y uno con barbero.
+    """
+    return [barbero_id] if barbero_id is not None else [0, *barberos]
+
+def filas_reserva(turno: Turno, barberos: Iterable[int]) -> List[ReservaHorario]:
+    return [
+        ReservaHorario(turno_id=turno.id, fecha=turno.fecha, barbero_id=carril, franja=franja)
+        for carril in carriles_reserva(turno.barbero_id, barberos)
+        for franja in agenda.franjas_reserva(turno.hora_inicio, turno.hora_fin)
+    ]
+
+def _insertar_reservas(db: Session, turnos: list):
+    """Inserta las franjas de varios turnos con un solo executemany (sin RETURNING)."""
+    barberos = ids_barberos(db) if any(t.barbero_id is None for t in turnos) else []
+    valores = [
+        {"turno_id": t.id, "fecha": t.fecha, "barbero_id": carril, "franja": franja}
+        for t in turnos
+        for carril in carriles_reserva(t.barbero_id, barberos)
+        for franja in agenda.franjas_reserva(t.hora_inicio, t.hora_fin)
+    ]
+    if valores:
+        db.execute(insert(ReservaHorario), valores)
+
+def _actualizar_reserva(db: Session, turno: Turno):
+    """
+    Reemplaza las franjas reservadas por el turno dentro de la transacción actual.
+    Los turnos cancelados no reservan franjas.
+    """
+    db.query(ReservaHorario).filter(ReservaHorario.turno_id == turno.id).delete(synchronize_session=False)
+    if turno.estado == "cancelado":
+        return
+    db.add_all(filas_reserva(turno, ids_barberos(db) if turno.barbero_id is None else []))
+
+def _commit_reserva(db: Session):
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise ValueError("El horario no está disponible")
+
+def sincronizar_reservas(db: Session, desde: Optional[date] = None) -> int:
+    """
+    Genera las franjas de turnos activos creados antes de existir ReservaHorario.
+    Los turnos que se superponen con otro ya reservado se omiten.
+    Retorna la cantidad de turnos sincronizados.
+    """
+    con_reserva = db.query(ReservaHorario.turno_id).distinct()
+    turnos = db.query(Turno).filter(
+        Turno.fecha >= (desde or date.today()),
+        Turno.estado != "cancelado",
+        Turno.id.not_in(con_reserva)
+    ).order_by(Turno.fecha, Turno.hora_inicio, Turno.id).all()
+
+    sincronizados = 0
+    for turno in turnos:
+        try:
+            with db.begin_nested():
+                _actualizar_reserva(db, turno)
+            sincronizados += 1
+        except (IntegrityError, ValueError):
+            # Superpuesto con otro ya reservado, o con hora de fin inválida
+            pass
+    db.commit()
+    return sincronizados
+
 
 # Manejo de Estados para los turnos
 def update_turno_estado(db: Session, turno_id: int, nuevo_estado: str) -> Turno | None:
@@ -132,165 +593,515 @@ def update_turno_estado(db: Session, turno_id: int, nuevo_estado: str) -> Turno
     if not db_turno:
         return None  # No existe el turno
     
+    antes = _aporte_resumen(db, db_turno)
     db_turno.estado = nuevo_estado
-    db.commit()
+    _actualizar_reserva(db, db_turno)
+    _actualizar_resumen(db, antes, _aporte_resumen(db, db_turno))
+    versiones.registrar(db, versiones.clave_agenda(db_turno.fecha))
+    _commit_reserva(db)
     db.refresh(db_turno)
+    _sincronizar_agenda_turno(db, db_turno)
+    _notificar_turno(db, "turno_actualizado", db_turno)
     return db_turno
 
 # Funciones adicionales necesarias para el frontend
-def get_servicio_by_nombre(db: Session, nombre: str) -> Optional[Servicio]:
-    return db.query(Servicio).filter(Servicio.nombre == nombre).first()
+def get_servicio_by_nombre(db: Session, nombre: str) -> Optional[catalogo.ServicioCatalogo]:
+    return catalogo.catalogo(db).por_nombre.get(nombre)
 
-def verificar_disponibilidad_turno(db: Session, fecha: date, hora_inicio: time, hora_fin: time) -> bool:
-    """
-    Verifica si hay disponibilidad para un turno en la fecha y horario especificados.
-    Retorna True si está disponible, False si hay conflicto.
-    """
-    # Verificar que la fecha no sea pasada
+def horario_en_plazo(fecha: date, hora_inicio: time) -> bool:
+    """La fecha no es pasada y, si es hoy, hay al menos 30 minutos de anticipación."""
     fecha_actual = date.today()
     if fecha < fecha_actual:
         return False
-    
-    # Si es el día actual, verificar que la hora no sea pasada
     if fecha == fecha_actual:
         hora_actual = datetime.now().time()
-        # Permitir agendar con al menos 30 minutos de anticipación
         hora_minima = (datetime.combine(date.today(), hora_actual) + timedelta(minutes=30)).time()
         if hora_inicio <= hora_minima:
             return False
-    
-    # Verificar bloqueos de agenda
-    bloqueo_count = db.query(BloqueoAgenda).filter(
+    return True
+
+# Dos intervalos [a, b) y [c, d) se superponen si a < d y b > c. Con una sola
+# comparación por extremo (en vez de tres casos unidos con OR) la consulta
+# recorre el rango del índice (fecha, estado, hora_inicio, hora_fin).
+def filtro_bloqueos_solapados(fecha: date, hora_inicio: time, hora_fin: time):
+    """Condición SQL de bloqueos que afectan el horario (compartida con crud_async)."""
+    return and_(
         BloqueoAgenda.fecha == fecha,
-        (
-            (BloqueoAgenda.todo_dia == True) |
-            (
-                (BloqueoAgenda.hora_inicio <= hora_inicio) & (BloqueoAgenda.hora_fin > hora_inicio)
-            ) |
-            (
-                (BloqueoAgenda.hora_inicio < hora_fin) & (BloqueoAgenda.hora_fin >= hora_fin)
-            ) |
-            (
-                (BloqueoAgenda.hora_inicio >= hora_inicio) & (BloqueoAgenda.hora_fin <= hora_fin)
-            )
+        or_(
+            BloqueoAgenda.todo_dia == True,
+            and_(BloqueoAgenda.hora_inicio < hora_fin, BloqueoAgenda.hora_fin > hora_inicio)
         )
-    ).count()
-    if bloqueo_count > 0:
-        return False
+    )
 
-    # Buscar turnos que se superpongan con el horario solicitado
-    turnos_conflicto = db.query(Turno).filter(
-        and_(
-            Turno.fecha == fecha,
-            Turno.estado != "cancelado",
-            or_(
-                # El turno solicitado empieza durante un turno existente
-                and_(Turno.hora_inicio <= hora_inicio, Turno.hora_fin > hora_inicio),
-                # El turno solicitado termina durante un turno existente
-                and_(Turno.hora_inicio < hora_fin, Turno.hora_fin >= hora_fin),
-                # El turno solicitado contiene completamente un turno existente
-                and_(Turno.hora_inicio >= hora_inicio, Turno.hora_fin <= hora_fin)
-            )
-        )
-    ).count()
-    
-    return turnos_conflicto == 0
+def filtro_turnos_solapados(fecha: date, hora_inicio: time, hora_fin: time):
+    """Condición SQL de turnos activos que se superponen con el horario."""
+    return and_(
+        Turno.fecha == fecha,
+        Turno.estado != "cancelado",
+        Turno.hora_inicio < hora_fin,
+        Turno.hora_fin > hora_inicio
+    )
 
-def get_horarios_disponibles(db: Session, fecha: date) -> List[str]:
+def validar_barbero(barbero_id: Optional[int], barberos: List[int]):
+    """ValueError si se pide un barbero que la barbería no tiene."""
+    if barbero_id is not None and barbero_id not in barberos:
+        raise ValueError("Barbero no encontrado")
+
+def ordenar_candidatos(tenant: str, fecha: date, mascara: int, barberos: List[int], ocupados: set,
+                       plantilla: agenda.PlantillaHorario, barbero_id: Optional[int] = None) -> list:
     """
-    Obtiene los horarios disponibles para una fecha específica.
-    Retorna una lista de horarios en formato "HH:MM".
+    Barberos que pueden tomar el horario, dados los barbero_id de los turnos
+    que se superponen. Un turno sin barbero ocupa a todos; sin barberos
+    cargados la barbería es una sola silla (candidato None). Se descartan
+    los que no trabajan en ese horario y, si el día está en el índice, se
+    prefiere al barbero con menos ocupación. ValueError si ``barbero_id`` no
+    es uno de ``barberos``.
     """
-    # Verificar que la fecha no sea pasada
-    fecha_actual = date.today()
-    if fecha < fecha_actual:
+    validar_barbero(barbero_id, barberos)
+    if None in ocupados:
         return []
-    
-    # Horarios de trabajo (9:00 a 22:00, cada 30 minutos)
-    horarios_trabajo = []
-    hora_actual = time(9, 0)  # 9:00 AM
-    hora_fin = time(22, 0)    # 10:00 PM
-    
-    while hora_actual < hora_fin:
-        horarios_trabajo.append(hora_actual.strftime("%H:%M"))
-        # Avanzar 30 minutos
-        hora_actual = (datetime.combine(date.today(), hora_actual) + timedelta(minutes=30)).time()
-    
-    # Si es el día actual, filtrar horarios pasados
-    if fecha == fecha_actual:
-        hora_actual_dt = datetime.now()
-        hora_actual_str = hora_actual_dt.strftime("%H:%M")
-        # Solo mostrar horarios que sean al menos 30 minutos después de la hora actual
-        horarios_trabajo = [h for h in horarios_trabajo if h > hora_actual_str]
-    
-    # Obtener turnos existentes para esa fecha
-    turnos_existentes = db.query(Turno).filter(
+    if barbero_id is not None:
+        candidatos = [barbero_id]
+    elif barberos:
+        candidatos = list(barberos)
+        ocupacion = agenda.indice.obtener(tenant, fecha)
+        if ocupacion is not None:
+            candidatos.sort(key=lambda b: bin(ocupacion.de_barbero(b)).count("1"))
+    else:
+        candidatos = [None]
+    if candidatos == [None] and ocupados:
+        return []
+    return [b for b in candidatos if b not in ocupados and plantilla.cubre(fecha, b, mascara)]
+
+def barberos_disponibles(db: Session, fecha: date, hora_inicio: time, hora_fin: time,
+                         barbero_id: Optional[int] = None) -> list:
+    """Candidatos libres para el horario (ver ordenar_candidatos); vacío si no hay lugar."""
+    if not horario_en_plazo(fecha, hora_inicio):
+        return []
+    if db.query(exists().where(filtro_bloqueos_solapados(fecha, hora_inicio, hora_fin))).scalar():
+        return []
+    ocupados = {
+        fila.barbero_id for fila in
+        db.query(Turno.barbero_id).filter(filtro_turnos_solapados(fecha, hora_inicio, hora_fin)).distinct()
+    }
+    return ordenar_candidatos(
+        clave_tenant(db), fecha, agenda.mascara_intervalo(hora_inicio, hora_fin),
+        ids_barberos(db), ocupados, plantilla_horario(db), barbero_id
+    )
+
+def verificar_disponibilidad_turno(db: Session, fecha: date, hora_inicio: time, hora_fin: time,
+                                   barbero_id: Optional[int] = None) -> bool:
+    """
+    Verifica si hay disponibilidad para un turno en la fecha y horario especificados
+    (para ese barbero, o para alguno si no se indica).
+    Retorna True si está disponible, False si hay conflicto.
+    """
+    return bool(barberos_disponibles(db, fecha, hora_inicio, hora_fin, barbero_id))
+
+def _ocupacion_dia(db: Session, fecha: date) -> agenda.OcupacionDia:
+    """
+    Devuelve la ocupación del día (por barbero y bloqueos) desde el índice de agenda.
+    Sólo consulta la base si el día todavía no está cargado.
+    """
+    tenant = clave_tenant(db)
+    cacheado = agenda.indice.obtener(tenant, fecha)
+    if cacheado is not None:
+        return cacheado
+
+    version = agenda.indice.version(tenant, fecha)
+    turnos = db.query(Turno.id, Turno.hora_inicio, Turno.hora_fin, Turno.barbero_id).filter(
         and_(
             Turno.fecha == fecha,
             Turno.estado != "cancelado"
         )
     ).all()
-    
-    # Crear conjunto de horarios ocupados
-    horarios_ocupados = set()
-    for turno in turnos_existentes:
-        hora_actual = turno.hora_inicio
-        while hora_actual < turno.hora_fin:
-            horarios_ocupados.add(hora_actual.strftime("%H:%M"))
-            hora_actual = (datetime.combine(date.today(), hora_actual) + timedelta(minutes=30)).time()
-    
-    # Aplicar bloqueos de agenda
-    bloqueos = db.query(BloqueoAgenda).filter(BloqueoAgenda.fecha == fecha).all()
-    for bloqueo in bloqueos:
-        if bloqueo.todo_dia:
-            # Todo el día bloqueado
-            return []
+    bloqueos = db.query(
+        BloqueoAgenda.id, BloqueoAgenda.todo_dia, BloqueoAgenda.hora_inicio,
+        BloqueoAgenda.hora_fin, BloqueoAgenda.motivo
+    ).filter(BloqueoAgenda.fecha == fecha).all()
+    return agenda.indice.cargar(tenant, fecha, turnos, bloqueos, version)
+
+def get_horarios_disponibles(db: Session, fecha: date, barbero_id: Optional[int] = None,
+                             duracion_min: int = agenda.MINUTOS_FRANJA) -> List[str]:
+    """
+    Obtiene los horarios disponibles para una fecha específica: inicios donde
+    entra un servicio de ``duracion_min`` con ese barbero (o con cualquiera).
+    Retorna una lista de horarios en formato "HH:MM".
+    """
+    if fecha < date.today():
+        return []
+    inicios = _ocupacion_dia(db, fecha).inicios(
+        ids_barberos(db), agenda.franjas_duracion(duracion_min), barbero_id, plantilla_horario(db).jornadas(fecha)
+    )
+    return agenda.horarios_libres(fecha, inicios)
+
+def get_disponibilidad_dia(db: Session, fecha: date, barbero_id: Optional[int] = None,
+                           duracion_min: int = agenda.MINUTOS_FRANJA) -> dict:
+    """
+    Horarios disponibles y bloqueos de un día, servidos desde el índice de agenda.
+    """
+    return agenda.respuesta_dia(
+        fecha, _ocupacion_dia(db, fecha), ids_barberos(db), agenda.franjas_duracion(duracion_min), barbero_id,
+        plantilla_horario(db)
+    )
+
+def get_disponibilidad_rango(db: Session, fecha_inicio: date, fecha_fin: date, barbero_id: Optional[int] = None,
+                             duracion_min: int = agenda.MINUTOS_FRANJA) -> dict:
+    """
+    Disponibilidad de cada día del rango (ambos extremos incluidos).
+    Los días que no están en el índice se cargan con una sola consulta de
+    turnos y una de bloqueos para todo el rango, agrupadas en memoria.
+    """
+    dias = agenda.dias_rango(fecha_inicio, fecha_fin)
+    ocupacion = _ocupacion_dias(db, dias)
+    barberos, franjas, plantilla = ids_barberos(db), agenda.franjas_duracion(duracion_min), plantilla_horario(db)
+    return {
+        dia.isoformat(): agenda.respuesta_dia(dia, ocupacion[dia], barberos, franjas, barbero_id, plantilla)
+        for dia in dias
+    }
+
+def _ocupacion_dias(db: Session, dias: List[date]) -> dict:
+    """Ocupación (agenda.OcupacionDia) de cada día, cargando los días fríos en una sola pasada."""
+    tenant = clave_tenant(db)
+    ocupacion, pendientes = agenda.indice.separar(tenant, dias)
+
+    if pendientes:
+        desde, hasta = min(pendientes), max(pendientes)
+        turnos = db.query(Turno.id, Turno.fecha, Turno.hora_inicio, Turno.hora_fin, Turno.barbero_id).filter(
+            and_(
+                Turno.fecha >= desde,
+                Turno.fecha <= hasta,
+                Turno.estado != "cancelado"
+            )
+        ).all()
+        bloqueos = db.query(
+            BloqueoAgenda.id, BloqueoAgenda.fecha, BloqueoAgenda.todo_dia,
+            BloqueoAgenda.hora_inicio, BloqueoAgenda.hora_fin, BloqueoAgenda.motivo
+        ).filter(BloqueoAgenda.fecha >= desde, BloqueoAgenda.fecha <= hasta).all()
+        ocupacion.update(agenda.indice.cargar_rango(tenant, pendientes, turnos, bloqueos))
+    return ocupacion
+
+# --------------- Operaciones en lote ---------------
+ESTADOS_TURNO = ("pendiente", "confirmado", "en_curso", "completado", "cancelado")
+
+def actualizar_estado_turnos(db: Session, nuevo_estado: str, ids: Optional[List[int]] = None,
+                             fecha: Optional[date] = None, barbero_id: Optional[int] = None) -> List[dict]:
+    """
+    Cambia el estado de varios turnos (por ids, o por fecha y opcionalmente
+    barbero) con un único UPDATE y un solo commit. Los turnos cancelados que
+    se restauran vuelven a reservar su horario; si ya está tomado quedan como
+    'conflicto' y el resto se aplica igual.
+    Retorna [{id, resultado}] con resultado: actualizado, sin_cambios,
+    conflicto o no_encontrado.
+    """
+    if nuevo_estado not in ESTADOS_TURNO:
+        raise ValueError(f"El estado debe ser uno de: {', '.join(ESTADOS_TURNO)}")
+    if not ids and fecha is None:
+        raise ValueError("Indique los ids de los turnos o una fecha")
+
+    query = db.query(
+        Turno.id, Turno.cliente_id, Turno.servicio_id, Turno.barbero_id, Turno.fecha,
+        Turno.hora_inicio, Turno.hora_fin, Turno.estado, Servicio.precio
+    ).outerjoin(Servicio, Servicio.id == Turno.servicio_id)
+    if ids:
+        query = query.filter(Turno.id.in_(ids))
+    if fecha is not None:
+        query = query.filter(Turno.fecha == fecha)
+    if barbero_id is not None:
+        query = query.filter(Turno.barbero_id == barbero_id)
+    filas = query.order_by(Turno.fecha, Turno.hora_inicio, Turno.id).with_for_update(of=Turno).all()
+
+    resultados = {}
+    cambiados, pares = [], []
+    try:
+        for fila in filas:
+            if fila.estado == nuevo_estado:
+                resultados[fila.id] = "sin_cambios"
+                continue
+            if fila.estado == "cancelado" and nuevo_estado != "cancelado":
+                try:
+                    with db.begin_nested():
+                        _insertar_reservas(db, [fila])
+                except IntegrityError:
+                    resultados[fila.id] = "conflicto"
+                    continue
+            resultados[fila.id] = "actualizado"
+            cambiados.append(fila)
+            precio = fila.precio or 0
+            pares.append((
+                resumen.aporte(fila.fecha, fila.barbero_id, fila.servicio_id, fila.estado, fila.hora_inicio, fila.hora_fin, precio),
+                resumen.aporte(fila.fecha, fila.barbero_id, fila.servicio_id, nuevo_estado, fila.hora_inicio, fila.hora_fin, precio),
+            ))
+
+        if cambiados:
+            ids_cambiados = [fila.id for fila in cambiados]
+            db.query(Turno).filter(Turno.id.in_(ids_cambiados)).update(
+                {Turno.estado: nuevo_estado}, synchronize_session=False
+            )
+            if nuevo_estado == "cancelado":
+                db.query(ReservaHorario).filter(ReservaHorario.turno_id.in_(ids_cambiados)).delete(synchronize_session=False)
+            _actualizar_resumen_lote(db, pares)
+            versiones.registrar(db, *(versiones.clave_agenda(fila.fecha) for fila in cambiados))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    tenant = clave_tenant(db)
+    for fila in cambiados:
+        if nuevo_estado == "cancelado":
+            agenda.indice.quitar_turno(tenant, fila.fecha, fila.id)
         else:
-            hora_actual = bloqueo.hora_inicio
-            while hora_actual < bloqueo.hora_fin:
-                horarios_ocupados.add(hora_actual.strftime("%H:%M"))
-                hora_actual = (datetime.combine(date.today(), hora_actual) + timedelta(minutes=30)).time()
+            agenda.indice.registrar_turno(tenant, fila.fecha, fila.id, fila.hora_inicio, fila.hora_fin, fila.barbero_id)
+        eventos.bus.publicar(tenant, "turno_actualizado", {**datos_evento_turno(fila), "estado": nuevo_estado})
 
-    # Filtrar horarios disponibles
-    horarios_disponibles = [h for h in horarios_trabajo if h not in horarios_ocupados]
-    
-    return horarios_disponibles
+    orden = ids if ids else [fila.id for fila in filas]
+    return [{"id": turno_id, "resultado": resultados.get(turno_id, "no_encontrado")} for turno_id in orden]
+
+def reservar_turnos_lote(db: Session, items: List[dict]) -> List[dict]:
+    """
+    Reserva varios turnos en una transacción. Cada item tiene nombre,
+    telefono, servicio (nombre), fecha, hora_inicio y opcionalmente hora_fin
+    (por defecto según la duración del servicio) y barbero_id (por defecto el
+    barbero libre con menos ocupación). Clientes, servicios y ocupación de los
+    días se cargan de una vez; cada turno se inserta en un savepoint para que
+    un horario tomado no anule al resto.
+    Retorna [{indice, resultado, turno_id | detalle}].
+    """
+    servicios = catalogo.catalogo(db).por_nombre
+    normalizados = {}
+    for item in items:
+        try:
+            normalizados[item["telefono"]] = telefonos.normalizar(item["telefono"])
+        except ValueError:
+            pass
+    clientes = {
+        cliente.telefono_normalizado: cliente
+        for cliente in db.query(Clientes).filter(Clientes.telefono_normalizado.in_(set(normalizados.values())))
+    }
+    ocupacion = _ocupacion_dias(db, sorted({i["fecha"] for i in items}))
+    barberos, plantilla = ids_barberos(db), plantilla_horario(db)
+
+    resultados, creados, pares = [], [], []
+    try:
+        for indice, item in enumerate(items):
+            servicio = servicios.get(item["servicio"])
+            if servicio is None:
+                resultados.append({"indice": indice, "resultado": "error", "detalle": "Servicio no encontrado"})
+                continue
+            normalizado = normalizados.get(item["telefono"])
+            if normalizado is None:
+                resultados.append({"indice": indice, "resultado": "error", "detalle": "Teléfono inválido"})
+                continue
+            try:
+                validar_barbero(item.get("barbero_id"), barberos)
+            except ValueError as e:
+                resultados.append({"indice": indice, "resultado": "error", "detalle": str(e)})
+                continue
+            fecha, hora_inicio = item["fecha"], item["hora_inicio"]
+            try:
+                hora_fin = item.get("hora_fin") or hora_fin_servicio(servicio, fecha, hora_inicio)
+                validar_horario(hora_inicio, hora_fin)
+            except ValueError as e:
+                resultados.append({"indice": indice, "resultado": "error", "detalle": str(e)})
+                continue
+            mascara = agenda.mascara_intervalo(hora_inicio, hora_fin)
+            disponible, barbero = ocupacion[fecha].elegir_barbero(
+                barberos, mascara, item.get("barbero_id"), plantilla.jornadas(fecha)
+            )
+            if not horario_en_plazo(fecha, hora_inicio) or not disponible:
+                resultados.append({"indice": indice, "resultado": "error", "detalle": "El horario no está disponible"})
+                continue
+            try:
+                with db.begin_nested():
+                    cliente = clientes.get(normalizado)
+                    if cliente is None:
+                        cliente = Clientes(nombre=item["nombre"], telefono=item["telefono"], telefono_normalizado=normalizado)
+                        db.add(cliente)
+                        db.flush()
+                    db_turno = Turno(
+                        cliente_id=cliente.id,
+                        servicio_id=servicio.id,
+                        barbero_id=barbero,
+                        fecha=fecha,
+                        hora_inicio=hora_inicio,
+                        hora_fin=hora_fin,
+                        estado="pendiente",
+                        notificado=False
+                    )
+                    db.add(db_turno)
+                    db.flush()
+                    _insertar_reservas(db, [db_turno])
+            except IntegrityError:
+                resultados.append({"indice": indice, "resultado": "error", "detalle": "El horario no está disponible"})
+                continue
+            clientes[normalizado] = cliente
+            ocupacion[fecha].ocupar(mascara, barbero)
+            # Datos tomados antes del commit, que expira los objetos
+            creados.append(datos_evento_turno(db_turno))
+            pares.append((None, resumen.aporte(fecha, barbero, servicio.id, "pendiente", hora_inicio, hora_fin, servicio.precio)))
+            resultados.append({"indice": indice, "resultado": "creado", "turno_id": db_turno.id})
+
+        _actualizar_resumen_lote(db, pares)
+        versiones.registrar(db, *(versiones.clave_agenda(date.fromisoformat(turno["fecha"])) for turno in creados))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    tenant = clave_tenant(db)
+    for turno in creados:
+        agenda.indice.registrar_turno(
+            tenant, date.fromisoformat(turno["fecha"]), turno["id"],
+            time.fromisoformat(turno["hora_inicio"]), time.fromisoformat(turno["hora_fin"]), turno["barbero_id"]
+        )
+        eventos.bus.publicar(tenant, "turno_creado", turno)
+    return resultados
+
+# --------------- Turnos recurrentes ---------------
+def crear_turnos_recurrentes(db: Session, nombre: str, telefono: str, servicio_id: int,
+                             fecha_inicio: date, hora_inicio: time, hora_fin: time,
+                             frecuencia: str, intervalo: int = 1, repeticiones: Optional[int] = None,
+                             fecha_fin: Optional[date] = None, omitir_conflictos: bool = False,
+                             barbero_id: Optional[int] = None) -> dict:
+    """
+    Expande la regla y controla todas las fechas contra turnos y bloqueos con
+    una sola consulta por rango (máscaras de ocupación en memoria). Toda la
+    serie queda con un mismo barbero: el indicado o el que tenga menos
+    conflictos. Si hay conflictos y no se pide omitirlos no se guarda nada.
+    Retorna {recurrencia_id, barbero_id, turnos: [{id, fecha}], conflictos: [fecha]}.
+    """
+    validar_horario(hora_inicio, hora_fin)
+    barberos = ids_barberos(db)
+    validar_barbero(barbero_id, barberos)
+    fechas = agenda.fechas_recurrencia(fecha_inicio, frecuencia, intervalo, repeticiones, fecha_fin)
+    mascara = agenda.mascara_intervalo(hora_inicio, hora_fin)
+    ocupacion = _ocupacion_dias(db, fechas)
+    plantilla = plantilla_horario(db)
+    candidatos = [barbero_id] if barbero_id is not None else (barberos or [None])
+    mejor = None
+    for candidato in candidatos:
+        conflictos = [
+            fecha for fecha in fechas
+            if not horario_en_plazo(fecha, hora_inicio)
+            or ocupacion[fecha].de_barbero(candidato) & mascara
+            or not plantilla.cubre(fecha, candidato, mascara)
+        ]
+        if mejor is None or len(conflictos) < len(mejor[1]):
+            mejor = (candidato, conflictos)
+        if not conflictos:
+            break
+    barbero_id, conflictos = mejor
+    libres = [fecha for fecha in fechas if fecha not in set(conflictos)] if conflictos else fechas
+    resultado = {
+        "recurrencia_id": None, "barbero_id": barbero_id, "turnos": [],
+        "conflictos": [f.isoformat() for f in conflictos],
+    }
+    if (conflictos and not omitir_conflictos) or not libres:
+        return resultado
+
+    servicio = catalogo.catalogo(db).por_id.get(servicio_id)
+    try:
+        cliente = obtener_o_crear_cliente(db, nombre, telefono)
+        recurrencia = TurnoRecurrente(
+            cliente_id=cliente.id,
+            servicio_id=servicio_id,
+            barbero_id=barbero_id,
+            frecuencia=frecuencia,
+            intervalo=intervalo,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin,
+            repeticiones=repeticiones,
+            hora_inicio=hora_inicio,
+            hora_fin=hora_fin
+        )
+        db.add(recurrencia)
+        db.flush()
+        turnos = [
+            Turno(
+                cliente_id=cliente.id,
+                servicio_id=servicio_id,
+                barbero_id=barbero_id,
+                fecha=fecha,
+                hora_inicio=hora_inicio,
+                hora_fin=hora_fin,
+                estado="pendiente",
+                notificado=False,
+                recurrencia_id=recurrencia.id
+            )
+            for fecha in libres
+        ]
+        db.add_all(turnos)
+        db.flush()
+        _insertar_reservas(db, turnos)
+        _actualizar_resumen_lote(db, [
+            (None, resumen.aporte(t.fecha, barbero_id, servicio_id, "pendiente", hora_inicio, hora_fin, servicio.precio if servicio else 0))
+            for t in turnos
+        ])
+        # Tomados antes del commit, que expira los objetos
+        recurrencia_id = recurrencia.id
+        datos = [datos_evento_turno(t) for t in turnos]
+        versiones.registrar(db, *(versiones.clave_agenda(fecha) for fecha in libres))
+        db.commit()
+    except IntegrityError:
+        # Otra reserva ganó alguna franja mientras tanto: no se crea la serie
+        db.rollback()
+        raise ValueError("El horario no está disponible")
+    except Exception:
+        db.rollback()
+        raise
+
+    tenant = clave_tenant(db)
+    for turno in datos:
+        agenda.indice.registrar_turno(tenant, date.fromisoformat(turno["fecha"]), turno["id"], hora_inicio, hora_fin, barbero_id)
+        eventos.bus.publicar(tenant, "turno_creado", turno)
+    resultado["recurrencia_id"] = recurrencia_id
+    resultado["turnos"] = [{"id": t["id"], "fecha": t["fecha"]} for t in datos]
+    return resultado
+
+def cancelar_turnos_recurrentes(db: Session, recurrencia_id: int, desde: Optional[date] = None) -> Optional[List[dict]]:
+    """Cancela los turnos de la serie desde la fecha dada (por defecto hoy)."""
+    if db.get(TurnoRecurrente, recurrencia_id) is None:
+        return None
+    ids = [fila.id for fila in db.query(Turno.id).filter(
+        Turno.recurrencia_id == recurrencia_id,
+        Turno.fecha >= (desde or date.today())
+    )]
+    if not ids:
+        return []
+    return actualizar_estado_turnos(db, "cancelado", ids=ids)
 
 # --------------- Bloqueos Agenda ---------------
 def create_bloqueo(db: Session, bloqueo: BloqueoCreate) -> BloqueoAgenda:
     # Verificar si ya existe un bloqueo de todo el día para esta fecha
-    bloqueo_existente = db.query(BloqueoAgenda).filter(
-        and_(
-            BloqueoAgenda.fecha == bloqueo.fecha,
-            BloqueoAgenda.todo_dia == True
-        )
-    ).first()
+    bloqueo_existente = db.query(exists().where(
+        BloqueoAgenda.fecha == bloqueo.fecha,
+        BloqueoAgenda.todo_dia == True
+    )).scalar()
     
     if bloqueo_existente:
         raise ValueError("Ya existe un bloqueo de todo el día para esta fecha. No se pueden crear bloqueos adicionales.")
     
     # Si no es bloqueo de todo el día, verificar superposición con bloqueos parciales existentes
     if not bloqueo.todo_dia and bloqueo.hora_inicio and bloqueo.hora_fin:
-        bloqueos_parciales = db.query(BloqueoAgenda).filter(
-            and_(
-                BloqueoAgenda.fecha == bloqueo.fecha,
-                BloqueoAgenda.todo_dia == False
-            )
-        ).all()
-        
-        for bloqueo_existente in bloqueos_parciales:
-            if bloqueo_existente.hora_inicio and bloqueo_existente.hora_fin:
-                # Verificar superposición de horarios
-                if (
-                    (bloqueo.hora_inicio < bloqueo_existente.hora_fin and bloqueo.hora_fin > bloqueo_existente.hora_inicio) or
-                    (bloqueo_existente.hora_inicio < bloqueo.hora_fin and bloqueo_existente.hora_fin > bloqueo.hora_inicio)
-                ):
-                    raise ValueError("El horario seleccionado se superpone con un bloqueo existente.")
+        superpuesto = db.query(exists().where(
+            BloqueoAgenda.fecha == bloqueo.fecha,
+            BloqueoAgenda.todo_dia == False,
+            BloqueoAgenda.hora_inicio < bloqueo.hora_fin,
+            BloqueoAgenda.hora_fin > bloqueo.hora_inicio
+        )).scalar()
+        if superpuesto:
+            raise ValueError("El horario seleccionado se superpone con un bloqueo existente.")
     
     db_bloqueo = BloqueoAgenda(**bloqueo.dict())
     db.add(db_bloqueo)
+    versiones.registrar(db, versiones.BLOQUEOS, versiones.clave_agenda(bloqueo.fecha))
     db.commit()
     db.refresh(db_bloqueo)
+    agenda.indice.registrar_bloqueo(
+        clave_tenant(db), db_bloqueo.fecha, db_bloqueo.id, db_bloqueo.todo_dia,
+        db_bloqueo.hora_inicio, db_bloqueo.hora_fin, db_bloqueo.motivo
+    )
     return db_bloqueo
 
 def get_bloqueos(db: Session, fecha_inicio: Optional[date] = None, fecha_fin: Optional[date] = None) -> List[BloqueoAgenda]:
@@ -305,8 +1116,226 @@ def delete_bloqueo(db: Session, bloqueo_id: int) -> bool:
     bloqueo = db.query(BloqueoAgenda).filter(BloqueoAgenda.id == bloqueo_id).first()
     if not bloqueo:
         return False
+    fecha = bloqueo.fecha
     db.delete(bloqueo)
+    versiones.registrar(db, versiones.BLOQUEOS, versiones.clave_agenda(fecha))
     db.commit()
+    agenda.indice.quitar_bloqueo(clave_tenant(db), fecha, bloqueo_id)
+    return True
+
+# --------------- Horario de trabajo ---------------
+def plantilla_horario(db: Session) -> agenda.PlantillaHorario:
+    """Plantilla de jornadas del tenant (cacheada en el índice hasta que cambie el horario)."""
+    tenant = clave_tenant(db)
+    plantilla = agenda.indice.plantilla(tenant)
+    if plantilla is None:
+        tramos = db.query(
+            HorarioTrabajo.barbero_id, HorarioTrabajo.dia_semana, HorarioTrabajo.hora_inicio, HorarioTrabajo.hora_fin
+        ).all()
+        feriados = db.query(Feriado.fecha, Feriado.barbero_id).filter(Feriado.fecha >= date.today()).all()
+        plantilla = agenda.PlantillaHorario(tramos, feriados)
+        agenda.indice.guardar_plantilla(tenant, plantilla)
+    return plantilla
+
+def get_horarios_trabajo(db: Session, barbero_id: Optional[int] = None) -> List[HorarioTrabajo]:
+    query = db.query(HorarioTrabajo)
+    if barbero_id is not None:
+        query = query.filter(HorarioTrabajo.barbero_id == barbero_id)
+    return query.order_by(HorarioTrabajo.barbero_id, HorarioTrabajo.dia_semana, HorarioTrabajo.hora_inicio).all()
+
+def create_horario_trabajo(db: Session, horario: HorarioTrabajoCreate) -> HorarioTrabajo:
+    superpuesto = db.query(HorarioTrabajo).filter(
+        HorarioTrabajo.barbero_id.is_(None) if horario.barbero_id is None else HorarioTrabajo.barbero_id == horario.barbero_id,
+        HorarioTrabajo.dia_semana == horario.dia_semana,
+        HorarioTrabajo.hora_inicio < horario.hora_fin,
+        HorarioTrabajo.hora_fin > horario.hora_inicio
+    ).first()
+    if superpuesto:
+        raise ValueError("El tramo se superpone con otro del mismo día.")
+    db_horario = HorarioTrabajo(**horario.dict())
+    db.add(db_horario)
+    versiones.registrar(db, versiones.HORARIOS)
+    db.commit()
+    db.refresh(db_horario)
+    agenda.indice.invalidar_plantilla(clave_tenant(db))
+    return db_horario
+
+def delete_horario_trabajo(db: Session, horario_id: int) -> bool:
+    horario = db.get(HorarioTrabajo, horario_id)
+    if not horario:
+        return False
+    db.delete(horario)
+    versiones.registrar(db, versiones.HORARIOS)
+    db.commit()
+    agenda.indice.invalidar_plantilla(clave_tenant(db))
+    return True
+
+def get_feriados(db: Session, fecha_inicio: Optional[date] = None, fecha_fin: Optional[date] = None) -> List[Feriado]:
+    query = db.query(Feriado)
+    if fecha_inicio:
+        query = query.filter(Feriado.fecha >= fecha_inicio)
+    if fecha_fin:
+        query = query.filter(Feriado.fecha <= fecha_fin)
+    return query.order_by(Feriado.fecha, Feriado.id).all()
+
+def create_feriado(db: Session, feriado: FeriadoCreate) -> Feriado:
+    db_feriado = Feriado(**feriado.dict())
+    db.add(db_feriado)
+    versiones.registrar(db, versiones.HORARIOS)
+    db.commit()
+    db.refresh(db_feriado)
+    agenda.indice.invalidar_plantilla(clave_tenant(db))
+    return db_feriado
+
+def delete_feriado(db: Session, feriado_id: int) -> bool:
+    feriado = db.get(Feriado, feriado_id)
+    if not feriado:
+        return False
+    db.delete(feriado)
+    versiones.registrar(db, versiones.HORARIOS)
+    db.commit()
+    agenda.indice.invalidar_plantilla(clave_tenant(db))
     return True
 
 # Funciones de validación especiales siguen igual, ya funcionan con cliente_id
+
+# --------------- Estadísticas ---------------
+AGRUPACIONES_ESTADISTICAS = {
+    "dia": ResumenDiario.fecha,
+    "barbero": ResumenDiario.barbero_id,
+    "servicio": ResumenDiario.servicio_id,
+}
+
+def _minutos_turno(db: Session):
+    """Duración del turno en minutos, calculada en SQL según el motor."""
+    if db.get_bind().dialect.name == "sqlite":
+        return (func.strftime("%s", Turno.hora_fin) - func.strftime("%s", Turno.hora_inicio)) / 60
+    return func.extract("epoch", Turno.hora_fin - Turno.hora_inicio) / 60
+
+def _cerrar_resumen(valores: dict, disponibles: int) -> dict:
+    estadisticas = {
+        "total_turnos": valores["total"],
+        "confirmados": valores["confirmados"],
+        "completados": valores["completados"],
+        "cancelados": valores["cancelados"],
+        "en_curso": valores["en_curso"],
+        # Se mantiene el criterio histórico: pendientes = todo lo no confirmado/completado/cancelado
+        "pendientes": valores["total"] - valores["confirmados"] - valores["completados"] - valores["cancelados"],
+        "ingresos": valores["ingresos"],
+        "ingresos_previstos": valores["ingresos_previstos"],
+        "minutos_reservados": valores["minutos_reservados"],
+    }
+    estadisticas["ocupacion"] = round(valores["minutos_reservados"] / disponibles, 4) if disponibles else 0
+    return estadisticas
+
+def get_estadisticas_turnos(db: Session, fecha_inicio: date, fecha_fin: date, agrupar_por: Optional[str] = None) -> dict:
+    """
+    Estadísticas del rango leídas de resumen_diario (una fila por día, barbero
+    y servicio), opcionalmente agrupadas por día, barbero o servicio. La
+    ocupación es minutos reservados / minutos de trabajo de los barberos en el
+    rango, según el horario de trabajo y los feriados.
+    """
+    if agrupar_por is not None and agrupar_por not in AGRUPACIONES_ESTADISTICAS:
+        raise ValueError(f"agrupar_por debe ser uno de: {', '.join(AGRUPACIONES_ESTADISTICAS)}")
+
+    sumas = [func.coalesce(func.sum(getattr(ResumenDiario, campo)), 0) for campo in resumen.CAMPOS]
+    rango = and_(ResumenDiario.fecha >= fecha_inicio, ResumenDiario.fecha <= fecha_fin)
+    dias = agenda.dias_rango(fecha_inicio, fecha_fin)
+    # La plantilla cacheada sólo tiene los feriados futuros; acá hacen falta los del rango
+    plantilla = agenda.PlantillaHorario(
+        db.query(HorarioTrabajo.barbero_id, HorarioTrabajo.dia_semana, HorarioTrabajo.hora_inicio, HorarioTrabajo.hora_fin).all(),
+        db.query(Feriado.fecha, Feriado.barbero_id).filter(Feriado.fecha >= fecha_inicio, Feriado.fecha <= fecha_fin).all(),
+    )
+    barberos = ids_barberos(db) or [None]
+    disponibles = plantilla.minutos(dias, barberos)
+
+    total = db.query(*sumas).filter(rango).one()
+    resultado = {"estadisticas": _cerrar_resumen(dict(zip(resumen.CAMPOS, map(int, total))), disponibles)}
+    if agrupar_por:
+        columna = AGRUPACIONES_ESTADISTICAS[agrupar_por]
+        filas = db.query(columna, *sumas).filter(rango).group_by(columna).order_by(columna).all()
+        grupos = []
+        for clave, *valores in filas:
+            if agrupar_por == "dia":
+                disponibles_grupo = plantilla.minutos([clave], barberos)
+                clave = clave.isoformat()
+            elif agrupar_por == "barbero":
+                # Los turnos sin barbero se comparan con la capacidad de toda la barbería
+                clave = clave or None
+                disponibles_grupo = plantilla.minutos(dias, [clave] if clave else barberos)
+            else:
+                disponibles_grupo = disponibles
+            grupos.append({agrupar_por: clave, **_cerrar_resumen(dict(zip(resumen.CAMPOS, map(int, valores))), disponibles_grupo)})
+        resultado["grupos"] = grupos
+    return resultado
+
+def reconstruir_resumen(db: Session, desde: Optional[date] = None, hasta: Optional[date] = None) -> int:
+    """
+    Recalcula resumen_diario desde turnos (todo el historial o el rango dado)
+    con una consulta agrupada. Retorna la cantidad de filas generadas.
+    """
+    filtros_resumen, filtros_turnos = [], []
+    if desde:
+        filtros_resumen.append(ResumenDiario.fecha >= desde)
+        filtros_turnos.append(Turno.fecha >= desde)
+    if hasta:
+        filtros_resumen.append(ResumenDiario.fecha <= hasta)
+        filtros_turnos.append(Turno.fecha <= hasta)
+
+    barbero = func.coalesce(Turno.barbero_id, 0)
+    filas = db.query(
+        Turno.fecha, barbero, Turno.servicio_id, Turno.estado,
+        func.count(Turno.id),
+        func.coalesce(func.sum(Servicio.precio), 0),
+        func.coalesce(func.sum(_minutos_turno(db)), 0),
+    ).outerjoin(Servicio, Servicio.id == Turno.servicio_id).filter(*filtros_turnos).group_by(
+        Turno.fecha, barbero, Turno.servicio_id, Turno.estado
+    ).all()
+
+    totales = {}
+    for fecha, barbero_id, servicio_id, estado, cantidad, precio, minutos in filas:
+        clave = resumen.clave(fecha, barbero_id, servicio_id)
+        fila = totales.setdefault(clave, dict.fromkeys(resumen.CAMPOS, 0))
+        for campo, valor in resumen.contadores(estado, cantidad, int(minutos), int(precio)).items():
+            fila[campo] += valor
+
+    db.query(ResumenDiario).filter(*filtros_resumen).delete(synchronize_session=False)
+    if totales:
+        db.execute(insert(ResumenDiario), [
+            {"fecha": fecha, "barbero_id": barbero_id, "servicio_id": servicio_id, **valores}
+            for (fecha, barbero_id, servicio_id), valores in totales.items()
+        ])
+    db.commit()
+    return len(totales)
+
+# --------------- Exportación ---------------
+COLUMNAS_EXPORTACION = (
+    "id", "fecha", "hora_inicio", "hora_fin", "estado",
+    "cliente", "telefono", "servicio", "precio", "barbero_id",
+)
+
+def exportar_turnos(db: Session, fecha_inicio: Optional[date] = None, fecha_fin: Optional[date] = None,
+                    estado: Optional[str] = None, barbero_id: Optional[int] = None, tamano_lote: int = 1000):
+    """
+    Recorre los turnos como tuplas (ver COLUMNAS_EXPORTACION) con un cursor del
+    lado del servidor, trayendo de a ``tamano_lote`` filas y sin armar objetos ORM.
+    """
+    query = db.query(
+        Turno.id, Turno.fecha, Turno.hora_inicio, Turno.hora_fin, Turno.estado,
+        Clientes.nombre, Clientes.telefono, Servicio.nombre, Servicio.precio, Turno.barbero_id
+    ).join(Clientes, Clientes.id == Turno.cliente_id).join(Servicio, Servicio.id == Turno.servicio_id)
+
+    if fecha_inicio:
+        query = query.filter(Turno.fecha >= fecha_inicio)
+    if fecha_fin:
+        query = query.filter(Turno.fecha <= fecha_fin)
+    if estado:
+        query = query.filter(Turno.estado == estado)
+    if barbero_id is not None:
+        query = query.filter(Turno.barbero_id == barbero_id)
+
+    query = query.order_by(Turno.fecha, Turno.hora_inicio, Turno.id).execution_options(
+        stream_results=True, yield_per=tamano_lote
+    )
+    for fila in query:
+        yield tuple(fila)
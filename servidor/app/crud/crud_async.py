@@ -0,0 +1,208 @@
+"""Versiones async de las operaciones CRUD usadas por las rutas públicas de reservas.
+
+Comparten el índice de agenda, los filtros SQL y las validaciones con ``crud``;
+sólo cambia la forma de hablar con la base (AsyncSession).
+"""
+from sqlalchemy import and_, exists, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import date, time
+
+from app.core import eventos
+from app.core.config import clave_tenant
+from app.crud import agenda, catalogo, crud, resumen, telefonos, versiones
+from app.models.models import Usuario, Clientes, Turno, BloqueoAgenda, HorarioTrabajo, Feriado
+
+
+# Usuarios
+async def get_usuario_by_usuario(db: AsyncSession, usuario: str) -> Optional[Usuario]:
+    result = await db.execute(select(Usuario).where(Usuario.usuario == usuario).limit(1))
+    return result.scalars().first()
+
+async def ids_barberos(db: AsyncSession) -> List[int]:
+    """Equivalente async de crud.ids_barberos (comparten la caché del índice)."""
+    tenant = clave_tenant(db)
+    barberos = agenda.indice.barberos(tenant)
+    if barberos is None:
+        result = await db.execute(select(Usuario.id).where(Usuario.rol == "barbero").order_by(Usuario.id))
+        barberos = list(result.scalars().all())
+        agenda.indice.guardar_barberos(tenant, barberos)
+    return barberos
+
+
+# Horario de trabajo
+async def plantilla_horario(db: AsyncSession) -> agenda.PlantillaHorario:
+    """Equivalente async de crud.plantilla_horario (comparten la caché del índice)."""
+    tenant = clave_tenant(db)
+    plantilla = agenda.indice.plantilla(tenant)
+    if plantilla is None:
+        tramos = await db.execute(select(
+            HorarioTrabajo.barbero_id, HorarioTrabajo.dia_semana, HorarioTrabajo.hora_inicio, HorarioTrabajo.hora_fin
+        ))
+        feriados = await db.execute(select(Feriado.fecha, Feriado.barbero_id).where(Feriado.fecha >= date.today()))
+        plantilla = agenda.PlantillaHorario(tramos.all(), feriados.all())
+        agenda.indice.guardar_plantilla(tenant, plantilla)
+    return plantilla
+
+
+# Clientes
+async def get_cliente_by_telefono(db: AsyncSession, telefono: str) -> Optional[Clientes]:
+    normalizado = telefonos.normalizar(telefono)
+    result = await db.execute(select(Clientes).where(Clientes.telefono_normalizado == normalizado))
+    return result.scalars().first()
+
+async def obtener_o_crear_cliente(db: AsyncSession, nombre: str, telefono: str) -> Clientes:
+    """Equivalente async de crud.obtener_o_crear_cliente."""
+    normalizado = telefonos.normalizar(telefono)
+    consulta = select(Clientes).where(Clientes.telefono_normalizado == normalizado)
+    cliente = (await db.execute(consulta)).scalars().first()
+    if cliente:
+        return cliente
+    try:
+        async with db.begin_nested():
+            cliente = Clientes(nombre=nombre, telefono=telefono, telefono_normalizado=normalizado)
+            db.add(cliente)
+            await db.flush()
+        return cliente
+    except IntegrityError:
+        return (await db.execute(consulta)).scalars().one()
+
+
+# Servicios (desde el catálogo en memoria, ver app.crud.catalogo)
+async def get_servicio(db: AsyncSession, servicio_id: int) -> Optional[catalogo.ServicioCatalogo]:
+    return (await catalogo.catalogo_async(db)).por_id.get(servicio_id)
+
+async def get_servicios(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[catalogo.ServicioCatalogo]:
+    return (await catalogo.catalogo_async(db)).pagina(skip, limit)
+
+async def get_servicio_by_nombre(db: AsyncSession, nombre: str) -> Optional[catalogo.ServicioCatalogo]:
+    return (await catalogo.catalogo_async(db)).por_nombre.get(nombre)
+
+
+# Disponibilidad
+async def barberos_disponibles(db: AsyncSession, fecha: date, hora_inicio: time, hora_fin: time,
+                               barbero_id: Optional[int] = None) -> list:
+    """Equivalente async de crud.barberos_disponibles."""
+    if not crud.horario_en_plazo(fecha, hora_inicio):
+        return []
+    bloqueado = await db.scalar(select(exists().where(crud.filtro_bloqueos_solapados(fecha, hora_inicio, hora_fin))))
+    if bloqueado:
+        return []
+    result = await db.execute(
+        select(Turno.barbero_id).where(crud.filtro_turnos_solapados(fecha, hora_inicio, hora_fin)).distinct()
+    )
+    ocupados = set(result.scalars().all())
+    return crud.ordenar_candidatos(
+        clave_tenant(db), fecha, agenda.mascara_intervalo(hora_inicio, hora_fin),
+        await ids_barberos(db), ocupados, await plantilla_horario(db), barbero_id
+    )
+
+async def verificar_disponibilidad_turno(db: AsyncSession, fecha: date, hora_inicio: time, hora_fin: time,
+                                         barbero_id: Optional[int] = None) -> bool:
+    """Equivalente async de crud.verificar_disponibilidad_turno."""
+    return bool(await barberos_disponibles(db, fecha, hora_inicio, hora_fin, barbero_id))
+
+async def _cargar_rango(db: AsyncSession, tenant: str, pendientes: dict) -> dict:
+    desde, hasta = min(pendientes), max(pendientes)
+    turnos = await db.execute(
+        select(Turno.id, Turno.fecha, Turno.hora_inicio, Turno.hora_fin, Turno.barbero_id).where(
+            and_(
+                Turno.fecha >= desde,
+                Turno.fecha <= hasta,
+                Turno.estado != "cancelado"
+            )
+        )
+    )
+    bloqueos = await db.execute(
+        select(
+            BloqueoAgenda.id, BloqueoAgenda.fecha, BloqueoAgenda.todo_dia,
+            BloqueoAgenda.hora_inicio, BloqueoAgenda.hora_fin, BloqueoAgenda.motivo
+        ).where(BloqueoAgenda.fecha >= desde, BloqueoAgenda.fecha <= hasta)
+    )
+    return agenda.indice.cargar_rango(tenant, pendientes, turnos.all(), bloqueos.all())
+
+async def get_disponibilidad_rango(db: AsyncSession, fecha_inicio: date, fecha_fin: date,
+                                   barbero_id: Optional[int] = None,
+                                   duracion_min: int = agenda.MINUTOS_FRANJA) -> dict:
+    """Disponibilidad por día; sólo consulta la base por los días fríos del índice."""
+    tenant = clave_tenant(db)
+    dias = agenda.dias_rango(fecha_inicio, fecha_fin)
+    ocupacion, pendientes = agenda.indice.separar(tenant, dias)
+    if pendientes:
+        ocupacion.update(await _cargar_rango(db, tenant, pendientes))
+    barberos, franjas = await ids_barberos(db), agenda.franjas_duracion(duracion_min)
+    plantilla = await plantilla_horario(db)
+    return {
+        dia.isoformat(): agenda.respuesta_dia(dia, ocupacion[dia], barberos, franjas, barbero_id, plantilla)
+        for dia in dias
+    }
+
+async def get_disponibilidad_dia(db: AsyncSession, fecha: date, barbero_id: Optional[int] = None,
+                                 duracion_min: int = agenda.MINUTOS_FRANJA) -> dict:
+    dias = await get_disponibilidad_rango(db, fecha, fecha, barbero_id, duracion_min)
+    return dias[fecha.isoformat()]
+
+
+# Reserva de turnos
+async def _actualizar_resumen(db: AsyncSession, turno: Turno):
+    """Suma el turno nuevo a resumen_diario en la transacción actual."""
+    servicio = await get_servicio(db, turno.servicio_id)
+    aporte = resumen.aporte(
+        turno.fecha, turno.barbero_id, turno.servicio_id, turno.estado,
+        turno.hora_inicio, turno.hora_fin, servicio.precio if servicio else 0
+    )
+    for sentencia in resumen.sentencias(db.get_bind().dialect.name, None, aporte):
+        await db.execute(sentencia)
+
+async def reservar_turno(db: AsyncSession, nombre: str, telefono: str, servicio_id: int,
+                         fecha: date, hora_inicio: time, hora_fin: time,
+                         barbero_id: Optional[int] = None) -> Turno:
+    """
+    Equivalente async de crud.reservar_turno: cliente, turno y franjas en una
+    sola transacción, probando los barberos candidatos en savepoints.
+    Lanza ValueError si el horario no está disponible.
+    """
+    crud.validar_horario(hora_inicio, hora_fin)
+    try:
+        cliente = await obtener_o_crear_cliente(db, nombre, telefono)
+
+        db_turno = None
+        for candidato in await barberos_disponibles(db, fecha, hora_inicio, hora_fin, barbero_id):
+            try:
+                async with db.begin_nested():
+                    db_turno = Turno(
+                        cliente=cliente,
+                        servicio_id=servicio_id,
+                        barbero_id=candidato,
+                        fecha=fecha,
+                        hora_inicio=hora_inicio,
+                        hora_fin=hora_fin,
+                        estado="pendiente",
+                        notificado=False
+                    )
+                    db.add(db_turno)
+                    await db.flush()
+                    db.add_all(crud.filas_reserva(db_turno, await ids_barberos(db) if candidato is None else []))
+                    await db.flush()
+                break
+            except IntegrityError:
+                db_turno = None
+        if db_turno is None:
+            raise ValueError("El horario no está disponible")
+        await _actualizar_resumen(db, db_turno)
+        await versiones.registrar_async(db, versiones.clave_agenda(fecha))
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise ValueError("El horario no está disponible")
+    except Exception:
+        await db.rollback()
+        raise
+
+    tenant = clave_tenant(db)
+    agenda.indice.registrar_turno(
+        tenant, db_turno.fecha, db_turno.id, db_turno.hora_inicio, db_turno.hora_fin, db_turno.barbero_id
+    )
+    eventos.bus.publicar(tenant, "turno_creado", crud.datos_evento_turno(db_turno))
+    return db_turno
@@ -0,0 +1,79 @@
+"""Migraciones de datos que se aplican una sola vez por base, al arrancar.
+
+Completan lo que ``create_all`` y ``asegurar_columnas`` no pueden: datos
+derivados de filas que existían antes de una tabla o columna nueva. Cada
+una queda registrada con la fila "migracion:<nombre>" en ``versiones``; no
+se deduce de que la tabla ya tenga datos, porque las escrituras nuevas la
+llenan antes de completar lo viejo. Son idempotentes: si varios workers
+arrancan a la vez, más de uno puede ejecutarlas sin dañar nada.
+"""
+import logging
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.crud import crud, versiones
+from app.models.models import VersionDatos
+
+logger = logging.getLogger(__name__)
+
+PREFIJO = "migracion:"
+
+
+def _reservas_horario(db: Session) -> dict:
+    # Turnos futuros creados antes de la tabla reservas_horario
+    return {"turnos": crud.sincronizar_reservas(db)}
+
+
+def _resumen_diario(db: Session) -> dict:
+    # Historial de turnos anterior a la tabla resumen_diario
+    return {"filas": crud.reconstruir_resumen(db)}
+
+
+def _telefonos_normalizados(db: Session) -> dict:
+    # Clientes creados antes de la columna telefono_normalizado; los duplicados
+    # quedan en NULL (ver normalizar_telefonos.py --fusionar)
+    return crud.normalizar_telefonos(db)
+
+
+# En orden de aplicación
+MIGRACIONES: List[Tuple[str, Callable[[Session], dict]]] = [
+    ("reservas_horario", _reservas_horario),
+    ("resumen_diario", _resumen_diario),
+    ("telefonos_normalizados", _telefonos_normalizados),
+]
+
+
+def sentencia_marca(dialecto: str, nombre: str):
+    """Registra la migración como aplicada (sin error si ya lo estaba)."""
+    return versiones.insert_dialecto(dialecto)(VersionDatos).values(
+        clave=PREFIJO + nombre, version=1, cambio=0
+    ).on_conflict_do_nothing(index_elements=[VersionDatos.clave])
+
+
+def aplicadas(db: Session) -> set:
+    filas = db.execute(select(VersionDatos.clave).where(VersionDatos.clave.startswith(PREFIJO))).scalars()
+    return {clave[len(PREFIJO):] for clave in filas}
+
+
+def aplicar_pendientes(db: Session) -> Dict[str, dict]:
+    """Ejecuta las migraciones sin marca y las marca; retorna el resultado de cada una.
+
+    Si una falla se registra el error y queda sin marcar para el próximo arranque.
+    """
+    hechas = aplicadas(db)
+    db.rollback()
+    resultados = {}
+    for nombre, migracion in MIGRACIONES:
+        if nombre in hechas:
+            continue
+        try:
+            resultados[nombre] = migracion(db)
+            db.execute(sentencia_marca(db.get_bind().dialect.name, nombre))
+            db.commit()
+            logger.info("Migración de datos aplicada", extra={"migracion": nombre, **resultados[nombre]})
+        except Exception:
+            db.rollback()
+            logger.exception("Falló la migración de datos", extra={"migracion": nombre})
+    return resultados
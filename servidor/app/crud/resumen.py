@@ -0,0 +1,110 @@
+"""Mantenimiento incremental de la tabla ``resumen_diario``.
+
+Cada turno aporta a una fila (fecha, barbero, servicio) un vector de
+contadores que depende de su estado. Al modificarlo se resta el aporte
+anterior y se suma el nuevo con un upsert ``col = col + excluded.col``, que
+es atómico en PostgreSQL y SQLite y no necesita leer la fila antes.
+"""
+from datetime import date, time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert as insert_postgresql
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+
+from app.models.models import ResumenDiario
+
+CAMPOS = (
+    "total", "pendientes", "confirmados", "en_curso", "completados", "cancelados",
+    "minutos_reservados", "ingresos", "ingresos_previstos",
+)
+CAMPO_ESTADO = {
+    "pendiente": "pendientes",
+    "confirmado": "confirmados",
+    "en_curso": "en_curso",
+    "completado": "completados",
+    "cancelado": "cancelados",
+}
+
+Clave = Tuple[date, int, int]
+Aporte = Tuple[Clave, Dict[str, int]]
+
+
+def _minutos(hora_inicio: time, hora_fin: time) -> int:
+    return (hora_fin.hour * 60 + hora_fin.minute) - (hora_inicio.hour * 60 + hora_inicio.minute)
+
+
+def clave(fecha: date, barbero_id: Optional[int], servicio_id: int) -> Clave:
+    return fecha, barbero_id or 0, servicio_id
+
+
+def contadores(estado: str, cantidad: int, minutos: int, ingresos: int) -> Dict[str, int]:
+    """Contadores de ``cantidad`` turnos en ``estado`` que suman esos minutos e ingresos."""
+    valores = {"total": cantidad}
+    if estado in CAMPO_ESTADO:
+        valores[CAMPO_ESTADO[estado]] = cantidad
+    if estado != "cancelado":
+        valores["minutos_reservados"] = minutos
+        valores["ingresos_previstos"] = ingresos
+    if estado == "completado":
+        valores["ingresos"] = ingresos
+    return valores
+
+
+def aporte(fecha: date, barbero_id: Optional[int], servicio_id: int, estado: str,
+           hora_inicio: time, hora_fin: time, precio: int) -> Aporte:
+    """Contadores con los que un turno suma a su fila del resumen."""
+    return clave(fecha, barbero_id, servicio_id), contadores(estado, 1, _minutos(hora_inicio, hora_fin), precio)
+
+
+def diferencias(antes: Optional[Aporte], despues: Optional[Aporte]) -> List[Tuple[Clave, Dict[str, int]]]:
+    """Deltas por fila entre el aporte anterior y el nuevo (None = no existe)."""
+    return diferencias_lote([(antes, despues)])
+
+
+def diferencias_lote(pares: Iterable[Tuple[Optional[Aporte], Optional[Aporte]]]) -> List[Tuple[Clave, Dict[str, int]]]:
+    """Como ``diferencias`` pero sumando varios cambios, para escribir una vez por fila."""
+    deltas: Dict[Clave, Dict[str, int]] = {}
+    for antes, despues in pares:
+        for signo, item in ((-1, antes), (1, despues)):
+            if item is None:
+                continue
+            fila = deltas.setdefault(item[0], {})
+            for campo, valor in item[1].items():
+                fila[campo] = fila.get(campo, 0) + signo * valor
+    resultado = []
+    for clave_fila, valores in deltas.items():
+        valores = {campo: valor for campo, valor in valores.items() if valor}
+        if valores:
+            resultado.append((clave_fila, valores))
+    return resultado
+
+
+def sentencia_upsert(dialecto: str, deltas: List[Tuple[Clave, Dict[str, int]]]):
+    """Un único INSERT ... ON CONFLICT DO UPDATE que suma cada delta a su fila."""
+    if dialecto == "postgresql":
+        insert = insert_postgresql
+    elif dialecto == "sqlite":
+        insert = insert_sqlite
+    else:
+        raise ValueError(f"Motor sin soporte para resumen_diario: {dialecto}")
+    filas = [
+        {"fecha": fecha, "barbero_id": barbero_id, "servicio_id": servicio_id,
+         **{campo: delta.get(campo, 0) for campo in CAMPOS}}
+        for (fecha, barbero_id, servicio_id), delta in deltas
+    ]
+    modificados = [campo for campo in CAMPOS if any(campo in delta for _, delta in deltas)]
+    sentencia = insert(ResumenDiario).values(filas)
+    return sentencia.on_conflict_do_update(
+        index_elements=[ResumenDiario.fecha, ResumenDiario.barbero_id, ResumenDiario.servicio_id],
+        set_={campo: getattr(ResumenDiario, campo) + sentencia.excluded[campo] for campo in modificados},
+    )
+
+
+def sentencias(dialecto: str, antes: Optional[Aporte], despues: Optional[Aporte]) -> Iterable:
+    return sentencias_lote(dialecto, [(antes, despues)])
+
+
+def sentencias_lote(dialecto: str, pares: Iterable[Tuple[Optional[Aporte], Optional[Aporte]]]) -> Iterable:
+    # diferencias_lote ya agrupa por fila, así que las claves no se repiten
+    deltas = diferencias_lote(pares)
+    return [sentencia_upsert(dialecto, deltas)] if deltas else []
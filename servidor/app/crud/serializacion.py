@@ -0,0 +1,74 @@
+"""Listados de turnos como dicts listos para ``ORJSONResponse``.
+
+Se seleccionan sólo las columnas que van en la respuesta (tuplas, sin
+objetos ORM ni identity map) y se arman los dicts con la misma forma que
+producía FastAPI al serializar los objetos ORM o ``schemas.Turno``, sin
+pasar por ``jsonable_encoder`` ni por la validación de Pydantic. orjson
+codifica fechas y horas con el mismo formato ISO.
+"""
+from datetime import date
+from typing import List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.crud import crud
+from app.models.models import Clientes, Servicio, Turno
+
+
+class FormaTurno:
+    """Campos de un turno y de su cliente y servicio anidados."""
+
+    def __init__(self, turno: Sequence[str], cliente: Sequence[str], servicio: Sequence[str]):
+        self.turno = tuple(turno)
+        self.cliente = tuple(cliente)
+        self.servicio = tuple(servicio)
+        self.columnas = (
+            [getattr(Turno, c) for c in self.turno]
+            + [getattr(Clientes, c) for c in self.cliente]
+            + [getattr(Servicio, c) for c in self.servicio]
+        )
+
+    def armar(self, filas) -> List[dict]:
+        turno, cliente, servicio = self.turno, self.cliente, self.servicio
+        fin_turno = len(turno)
+        fin_cliente = fin_turno + len(cliente)
+        return [
+            {
+                **dict(zip(turno, fila[:fin_turno])),
+                # outer join, como el joinedload de crud.get_turnos: sin fila queda null
+                "cliente": dict(zip(cliente, fila[fin_turno:fin_cliente])) if fila[fin_turno] is not None else None,
+                "servicio": dict(zip(servicio, fila[fin_cliente:])) if fila[fin_cliente] is not None else None,
+            }
+            for fila in filas
+        ]
+
+
+# Todas las columnas, como el objeto ORM en /turnos/ y /turnos/fecha/{fecha}
+TURNO_COMPLETO = FormaTurno(
+    ("id", "cliente_id", "servicio_id", "barbero_id", "fecha", "hora_inicio", "hora_fin",
+     "estado", "creado_en", "notificado", "recurrencia_id"),
+    ("id", "nombre", "telefono", "telefono_normalizado", "fecha_registro"),
+    ("id", "nombre", "duracion_min", "precio", "barbero_id"),
+)
+# Los campos de schemas.Turno (response_model de /turnos/semana/{fecha})
+TURNO_ESQUEMA = FormaTurno(
+    ("id", "cliente_id", "servicio_id", "fecha", "hora_inicio", "hora_fin", "estado", "creado_en", "notificado"),
+    ("id", "nombre", "telefono", "fecha_registro"),
+    ("id", "nombre", "duracion_min", "precio"),
+)
+
+
+def get_turnos(db: Session, forma: FormaTurno = TURNO_COMPLETO, skip: int = 0, limit: Optional[int] = 100,
+               cliente_id: Optional[int] = None, fecha_inicio: Optional[date] = None, fecha_fin: Optional[date] = None,
+               estado: Optional[str] = None, cursor: Optional[str] = None) -> List[dict]:
+    """Mismos filtros y orden que crud.get_turnos; ``limit=None`` trae todos."""
+    query = db.query(*forma.columnas).select_from(Turno).outerjoin(
+        Clientes, Clientes.id == Turno.cliente_id
+    ).outerjoin(Servicio, Servicio.id == Turno.servicio_id)
+    filas = crud.filtrar_turnos(query, skip, limit, cliente_id, fecha_inicio, fecha_fin, estado, cursor).all()
+    return forma.armar(filas)
+
+
+def clave_turno(turno: dict) -> tuple:
+    """Clave del cursor (crud.clave_turno) para los dicts de este módulo."""
+    return turno["fecha"], turno["hora_inicio"], turno["id"]
@@ -0,0 +1,39 @@
+"""Normalización de teléfonos para identificar al cliente.
+
+El mismo número llega escrito de muchas formas ("11 2345-6789",
+"+54 9 11 2345-6789", "011 2345-6789"); todas se reducen a los dígitos del
+número nacional ("1123456789"), que es lo que se guarda en
+``Clientes.telefono_normalizado`` (índice único) y lo que se busca al
+reservar. Los números de otros países conservan "+" y su código.
+"""
+import re
+
+_NO_DIGITOS = re.compile(r"\D")
+CODIGO_PAIS = "54"
+MIN_DIGITOS = 6
+MAX_DIGITOS = 15  # E.164
+
+
+def normalizar(telefono: str) -> str:
+    """Forma canónica del teléfono; ValueError si no parece un número."""
+    texto = (telefono or "").strip()
+    digitos = _NO_DIGITOS.sub("", texto)
+    internacional = texto.startswith("+") or digitos.startswith("00")
+    if digitos.startswith("00"):
+        digitos = digitos[2:]
+    if internacional and not digitos.startswith(CODIGO_PAIS):
+        if not MIN_DIGITOS <= len(digitos) <= MAX_DIGITOS:
+            raise ValueError("Teléfono inválido")
+        return "+" + digitos
+    # Sin código de país sólo se quita si el número no entra en 10 dígitos
+    if digitos.startswith(CODIGO_PAIS) and (internacional or len(digitos) >= 12):
+        digitos = digitos[len(CODIGO_PAIS):]
+        # El 9 de los celulares al marcar desde el exterior
+        if len(digitos) == 11 and digitos.startswith("9"):
+            digitos = digitos[1:]
+    # Prefijo de larga distancia nacional
+    if digitos.startswith("0"):
+        digitos = digitos[1:]
+    if not MIN_DIGITOS <= len(digitos) <= MAX_DIGITOS:
+        raise ValueError("Teléfono inválido")
+    return digitos
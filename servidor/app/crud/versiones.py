@@ -0,0 +1,205 @@
+"""Versiones por tabla y por fecha para responder lecturas con ETag / 304.
+
+Cada escritura anota en su sesión las claves que afecta ("servicios",
+"bloqueos", "agenda:2030-01-18", ...). Justo antes del commit se suma 1 a la
+fila global "*" y a esas claves, que reciben como ``cambio`` el valor nuevo
+de la global. Cada worker se pone al día leyendo sólo las filas con
+``cambio`` mayor al último visto, a lo sumo una vez cada
+``VERSIONES_INTERVALO`` segundos; sus propios cambios los aplica al
+confirmar, con los valores que devolvió el upsert. Entre lecturas, un
+If-None-Match que coincide se responde 304 sin tocar la base.
+
+La fila global queda bloqueada sólo entre ese upsert y el commit (no durante
+toda la transacción), y eso alcanza para que los valores de ``cambio`` se
+hagan visibles en orden y ningún worker se saltee una modificación; una
+secuencia no lo garantiza, porque un ``cambio`` menor puede confirmarse
+después de uno mayor.
+"""
+import hashlib
+import threading
+import time as _reloj
+from datetime import date
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert as insert_postgresql
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+from sqlalchemy.orm import Session
+
+from app.core.config import clave_tenant, settings
+from app.models.models import VersionDatos
+
+GLOBAL = "*"
+SERVICIOS = "servicios"
+BLOQUEOS = "bloqueos"
+HORARIOS = "horarios"
+BARBEROS = "barberos"
+# Datos de clientes que van dentro de los listados de turnos
+CLIENTES = "clientes"
+
+
+def clave_agenda(fecha: date) -> str:
+    """Turnos y bloqueos de un día."""
+    return f"agenda:{fecha.isoformat()}"
+
+
+# --- Escritura (dentro de la transacción del cambio) ---
+def insert_dialecto(dialecto: str):
+    if dialecto == "postgresql":
+        return insert_postgresql
+    if dialecto == "sqlite":
+        return insert_sqlite
+    raise ValueError(f"Motor sin soporte para versiones: {dialecto}")
+
+
+def sentencia_global(dialecto: str):
+    """Incrementa el contador global y devuelve su valor nuevo."""
+    sentencia = insert_dialecto(dialecto)(VersionDatos).values(clave=GLOBAL, version=1, cambio=1)
+    return sentencia.on_conflict_do_update(
+        index_elements=[VersionDatos.clave],
+        set_={"version": VersionDatos.version + 1, "cambio": VersionDatos.version + 1},
+    ).returning(VersionDatos.version)
+
+
+def sentencia_claves(dialecto: str, claves: Iterable[str], cambio: int):
+    sentencia = insert_dialecto(dialecto)(VersionDatos).values(
+        [{"clave": clave, "version": 1, "cambio": cambio} for clave in claves]
+    )
+    return sentencia.on_conflict_do_update(
+        index_elements=[VersionDatos.clave],
+        set_={"version": VersionDatos.version + 1, "cambio": sentencia.excluded.cambio},
+    ).returning(VersionDatos.clave, VersionDatos.version, VersionDatos.cambio)
+
+
+def _sesion(db) -> Session:
+    # AsyncSession expone la Session interna en sync_session
+    return getattr(db, "sync_session", db)
+
+
+def registrar(db: Session, *claves: str):
+    """Anota claves a versionar; se escriben al confirmar la transacción de ``db``."""
+    if claves:
+        _sesion(db).info.setdefault("versiones_pendientes", set()).update(claves)
+
+
+async def registrar_async(db, *claves: str):
+    """Equivalente de registrar para AsyncSession."""
+    registrar(db, *claves)
+
+
+# --- Caché local de versiones ---
+class _Tenant:
+    __slots__ = ("versiones", "visto", "consultado_en")
+
+    def __init__(self):
+        self.versiones: Dict[str, int] = {}
+        self.visto = 0
+        self.consultado_en: Optional[float] = None
+
+
+class CacheVersiones:
+    def __init__(self, intervalo: float = 2.0):
+        self.intervalo = intervalo
+        self._tenants: Dict[str, _Tenant] = {}
+        self._lock = threading.Lock()
+
+    def pendiente(self, tenant: str) -> Optional[int]:
+        """Último ``cambio`` visto si toca releer la tabla, o None si la copia local está vigente."""
+        with self._lock:
+            estado = self._tenants.get(tenant)
+            if estado is None:
+                return 0
+            if estado.consultado_en is None or _reloj.monotonic() - estado.consultado_en >= self.intervalo:
+                return estado.visto
+            return None
+
+    def aplicar(self, tenant: str, filas: Iterable[tuple]):
+        with self._lock:
+            estado = self._tenants.setdefault(tenant, _Tenant())
+            for clave, version, cambio in filas:
+                estado.versiones[clave] = max(version, estado.versiones.get(clave, 0))
+                estado.visto = max(estado.visto, cambio)
+            estado.consultado_en = _reloj.monotonic()
+
+    def aplicar_propias(self, tenant: str, filas: Iterable[tuple]):
+        """Versiones escritas por este worker. No avanza ``visto``: los cambios
+        de otros workers con ``cambio`` menor pueden no haberse leído todavía."""
+        with self._lock:
+            estado = self._tenants.setdefault(tenant, _Tenant())
+            for clave, version, _cambio in filas:
+                estado.versiones[clave] = max(version, estado.versiones.get(clave, 0))
+
+    def version(self, tenant: str, clave: str) -> int:
+        with self._lock:
+            estado = self._tenants.get(tenant)
+            return estado.versiones.get(clave, 0) if estado else 0
+
+    def etag(self, tenant: str, claves: Iterable[str], extra: Iterable = ()) -> str:
+        with self._lock:
+            estado = self._tenants.get(tenant) or _Tenant()
+            partes = [tenant] + [f"{clave}={estado.versiones.get(clave, 0)}" for clave in claves]
+        partes.extend(str(valor) for valor in extra)
+        return '"' + hashlib.sha1("|".join(partes).encode()).hexdigest()[:24] + '"'
+
+
+cache = CacheVersiones(settings.VERSIONES_INTERVALO)
+
+
+@event.listens_for(Session, "before_commit")
+def _escribir_antes_del_commit(session: Session):
+    # También se llama al liberar un savepoint: sólo cuenta el commit externo
+    if session.in_nested_transaction():
+        return
+    claves = sorted(session.info.pop("versiones_pendientes", ()))
+    if not claves:
+        return
+    dialecto = session.get_bind().dialect.name
+    cambio = session.execute(sentencia_global(dialecto)).scalar_one()
+    filas = session.execute(sentencia_claves(dialecto, claves, cambio)).all()
+    # Se aplican a la caché local recién en el commit (after_commit)
+    session.info.setdefault("versiones_nuevas", {}).setdefault(clave_tenant(session), []).extend(filas)
+
+
+@event.listens_for(Session, "after_commit")
+def _aplicar_tras_commit(session: Session):
+    for tenant, filas in session.info.pop("versiones_nuevas", {}).items():
+        cache.aplicar_propias(tenant, filas)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_tras_rollback(session: Session, transaccion_anterior):
+    # Deshacer un savepoint no descarta lo anotado por la transacción externa
+    if transaccion_anterior.parent is None:
+        session.info.pop("versiones_pendientes", None)
+        session.info.pop("versiones_nuevas", None)
+
+
+# --- Lectura ---
+def _consulta(desde: int):
+    return select(VersionDatos.clave, VersionDatos.version, VersionDatos.cambio).where(VersionDatos.cambio > desde)
+
+
+def al_dia(db: Session) -> str:
+    """Pone al día la copia local del tenant (sólo consulta si venció el intervalo) y retorna su clave."""
+    tenant = clave_tenant(db)
+    desde = cache.pendiente(tenant)
+    if desde is not None:
+        cache.aplicar(tenant, db.execute(_consulta(desde)).all())
+    return tenant
+
+
+async def al_dia_async(db) -> str:
+    tenant = clave_tenant(db)
+    desde = cache.pendiente(tenant)
+    if desde is not None:
+        cache.aplicar(tenant, (await db.execute(_consulta(desde))).all())
+    return tenant
+
+
+def etag(db: Session, claves: Iterable[str], extra: Iterable = ()) -> str:
+    """ETag de las claves; sólo consulta la base si venció el intervalo de lectura."""
+    return cache.etag(al_dia(db), claves, extra)
+
+
+async def etag_async(db, claves: Iterable[str], extra: Iterable = ()) -> str:
+    return cache.etag(await al_dia_async(db), claves, extra)
@@ -1,27 +1,42 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from app.core.config import get_tenant_db
+from jose import jwt, JWTError
+from typing import Optional
+
+from app.core.autenticacion import Principal, principales
+from app.core.config import get_tenant_db, clave_tenant_url, SECRET_KEY, ALGORITHM
 from app.crud import crud
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_tenant_db)):
-    from jose import jwt, JWTError
-    from app.core.config import SECRET_KEY, ALGORITHM
-    from app.schemas.schemas import TokenData
-    
+def get_current_user(token: str = Depends(oauth2_scheme), tenant_db_url: Optional[str] = Header(None)) -> Principal:
+    """
+    Resuelve el usuario del token. Sólo consulta la base la primera vez que se
+    ve cada token; después se sirve desde la cache de principales.
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        usuario = payload.get("sub")
-        if usuario is None:
-            raise HTTPException(status_code=401, detail="Token inválido")
-        token_data = TokenData(usuario=usuario)
     except JWTError:
         raise HTTPException(status_code=401, detail="Token inválido")
-    
-    user = crud.get_usuario_by_usuario(db, token_data.usuario)
-    if user is None:
-        raise HTTPException(status_code=401, detail="Usuario no encontrado")
-    
-    return user
+    usuario = payload.get("sub")
+    if usuario is None:
+        raise HTTPException(status_code=401, detail="Token inválido")
+
+    tenant = clave_tenant_url(tenant_db_url)
+    iat = payload.get("iat")
+    principal = principales.obtener(tenant, usuario, iat)
+    if principal is None:
+        sesiones = get_tenant_db(tenant_db_url)
+        db = next(sesiones)
+        try:
+            user = crud.get_usuario_by_usuario(db, usuario)
+        finally:
+            sesiones.close()
+        if user is None:
+            raise HTTPException(status_code=401, detail="Usuario no encontrado")
+        # Un token emitido con otro rol (cambiado después) obliga a volver a loguearse
+        if payload.get("rol") not in (None, user.rol):
+            raise HTTPException(status_code=401, detail="Token desactualizado, inicie sesión nuevamente")
+        principal = Principal.desde_usuario(user)
+        principales.guardar(tenant, usuario, iat, principal)
+    return principal
@@ -1,9 +1,20 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.routes import routes
-from app.core.config import tenant_engine, TenantBase
+from app.core.config import tenant_engine, TenantBase, TenantSessionLocal, cerrar_engines, pools_abiertos
+from app.core import registro
+from app.core.metricas import MiddlewareMetricas, metricas
+from app.core.seguridad import pool_hash
+from app.crud import migraciones
+from app.models.models import asegurar_columnas
+import logging
 import os
 
+# Logging estructurado por cola antes de crear la app
+registro.configurar()
+logger = logging.getLogger("app.main")
+
 app = FastAPI(
     title="Sistema de Gestión de Turnos",
     description="API para gestionar turnos de barberos",
@@ -18,6 +29,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Latencia y consultas por pedido (la última en agregarse envuelve a las demás)
+app.add_middleware(MiddlewareMetricas)
+# Id de correlación (X-Request-ID) y registro de cada pedido
+app.add_middleware(registro.MiddlewareCorrelacion)
 
 # Incluir las rutas
 app.include_router(routes.router, prefix="/api/v1")
@@ -26,9 +41,23 @@ app.include_router(routes.router, prefix="/api/v1")
 def ensure_tables():
     try:
         TenantBase.metadata.create_all(bind=tenant_engine)
+        asegurar_columnas(tenant_engine)
     except Exception:
         # En caso de error, dejamos que el servidor siga y se vea en logs
-        pass
+        logger.exception("No se pudieron crear las tablas")
+        return
+    # Datos de filas anteriores a las tablas o columnas nuevas (una sola vez)
+    db = TenantSessionLocal()
+    try:
+        migraciones.aplicar_pendientes(db)
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+async def liberar_conexiones():
+    await cerrar_engines()
+    pool_hash.cerrar()
+    registro.detener()
 
 @app.get("/")
 async def root():
@@ -38,6 +67,12 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Métricas de este proceso en formato de texto de Prometheus."""
+    pools = [(metricas.tenant(url), tipo, pool) for url, tipo, pool in pools_abiertos()]
+    return PlainTextResponse(metricas.exponer(pools), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(os.environ.get("PORT",8000))
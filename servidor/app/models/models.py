@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Date, Time, Index, Boolean, JSON
+from sqlalchemy import inspect, text, Column, Integer, String, DateTime, ForeignKey, Date, Time, Index, Boolean, JSON, UniqueConstraint
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
 from app.core.config import TenantBase
@@ -19,10 +19,14 @@ class Clientes(TenantBase):
     id = Column(Integer, primary_key=True, index=True)
     nombre = Column(String(100), nullable=False)
     telefono = Column(String(20), nullable=False)
+    # Dígitos del número nacional (app.crud.telefonos); NULL en duplicados viejos
+    telefono_normalizado = Column(String(20), nullable=True)
     fecha_registro = Column(DateTime, server_default=func.now())
 
     turnos = relationship("Turno", back_populates="cliente")
 
+Index('idx_clientes_telefono_normalizado', Clientes.telefono_normalizado, unique=True)
+
 class Servicio(TenantBase):
     __tablename__ = "servicios"
     
@@ -48,15 +52,55 @@ class Turno(TenantBase):
     estado = Column(String(20), nullable=False, index=True)  # 'pendiente', 'confirmado', 'cancelado', 'completado'
     creado_en = Column(DateTime, server_default=func.now())
     notificado = Column(Boolean, default=False, nullable=False)
+    recurrencia_id = Column(Integer, ForeignKey("turnos_recurrentes.id"), nullable=True, index=True)
     
     cliente = relationship("Clientes", back_populates="turnos")
     servicio = relationship("Servicio", back_populates="turnos")
     # barbero = relationship("Usuario")
 
+class TurnoRecurrente(TenantBase):
+    """Regla de repetición (tipo RRULE) de la que salen turnos con recurrencia_id."""
+    __tablename__ = "turnos_recurrentes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cliente_id = Column(Integer, ForeignKey("clientes.id"), nullable=False, index=True)
+    servicio_id = Column(Integer, ForeignKey("servicios.id"), nullable=False)
+    barbero_id = Column(Integer, nullable=True)
+    frecuencia = Column(String(10), nullable=False)  # 'diaria', 'semanal', 'mensual'
+    intervalo = Column(Integer, nullable=False, default=1)
+    fecha_inicio = Column(Date, nullable=False)
+    fecha_fin = Column(Date, nullable=True)
+    repeticiones = Column(Integer, nullable=True)
+    hora_inicio = Column(Time, nullable=False)
+    hora_fin = Column(Time, nullable=False)
+    creado_en = Column(DateTime, server_default=func.now())
+
 # Índices compuestos para optimizar consultas
 Index('idx_turnos_cliente_fecha', Turno.cliente_id, Turno.fecha)
 Index('idx_turnos_fecha_estado', Turno.fecha, Turno.estado)
 Index('idx_turnos_cliente_estado', Turno.cliente_id, Turno.estado)
+Index('idx_turnos_fecha_hora_id', Turno.fecha, Turno.hora_inicio, Turno.id)  # paginación por cursor
+# Controles de superposición: rango por fecha con las horas en el propio índice
+Index('idx_turnos_fecha_estado_horario', Turno.fecha, Turno.estado, Turno.hora_inicio, Turno.hora_fin)
+
+class ReservaHorario(TenantBase):
+    """Franjas de 5 minutos ocupadas por cada turno activo.
+
+    La restricción única hace que dos reservas concurrentes del mismo horario
+    no puedan confirmarse ambas: la segunda falla al hacer commit. Un turno
+    sin barbero reserva la franja con barbero_id 0 y con el id de cada barbero.
+    """
+    __tablename__ = "reservas_horario"
+
+    id = Column(Integer, primary_key=True, index=True)
+    turno_id = Column(Integer, ForeignKey("turnos.id", ondelete="CASCADE"), nullable=False, index=True)
+    fecha = Column(Date, nullable=False)
+    barbero_id = Column(Integer, nullable=False, default=0)  # 0 = turnos sin barbero
+    franja = Column(Integer, nullable=False)  # minutos desde medianoche / 5
+
+    __table_args__ = (
+        UniqueConstraint('fecha', 'barbero_id', 'franja', name='uq_reservas_horario_franja'),
+    )
 
 class BloqueoAgenda(TenantBase):
     __tablename__ = "bloqueos_agenda"
@@ -69,4 +113,100 @@ class BloqueoAgenda(TenantBase):
     motivo = Column(String(255), nullable=True)
     creado_en = Column(DateTime, server_default=func.now())
 
-Index('idx_bloqueos_fecha', BloqueoAgenda.fecha)
\ No newline at end of file
+Index('idx_bloqueos_fecha', BloqueoAgenda.fecha)
+Index('idx_bloqueos_fecha_todo_dia', BloqueoAgenda.fecha, BloqueoAgenda.todo_dia)
+
+class HorarioTrabajo(TenantBase):
+    """Tramo de atención de un día de la semana (0 = lunes).
+
+    Varios tramos el mismo día dejan descansos entre ellos. Con barbero_id el
+    tramo es propio de ese barbero y reemplaza al horario general de ese día.
+    """
+    __tablename__ = "horarios_trabajo"
+
+    id = Column(Integer, primary_key=True, index=True)
+    barbero_id = Column(Integer, ForeignKey("usuarios.id"), nullable=True)  # None = toda la barbería
+    dia_semana = Column(Integer, nullable=False)
+    hora_inicio = Column(Time, nullable=False)
+    hora_fin = Column(Time, nullable=False)
+
+Index('idx_horarios_trabajo_barbero_dia', HorarioTrabajo.barbero_id, HorarioTrabajo.dia_semana)
+
+class Feriado(TenantBase):
+    """Día no laborable de toda la barbería o, con barbero_id, de un barbero."""
+    __tablename__ = "feriados"
+
+    id = Column(Integer, primary_key=True, index=True)
+    fecha = Column(Date, nullable=False, index=True)
+    barbero_id = Column(Integer, ForeignKey("usuarios.id"), nullable=True)
+    motivo = Column(String(255), nullable=True)
+    creado_en = Column(DateTime, server_default=func.now())
+
+class ResumenDiario(TenantBase):
+    """Totales por día, barbero y servicio, mantenidos desde las escrituras de turnos.
+
+    Los ingresos usan el precio del servicio al momento de cada cambio; si se
+    modifican precios, ``reconstruir_resumen.py`` los recalcula.
+    """
+    __tablename__ = "resumen_diario"
+
+    fecha = Column(Date, primary_key=True)
+    barbero_id = Column(Integer, primary_key=True, default=0)  # 0 = sin barbero asignado
+    servicio_id = Column(Integer, primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    pendientes = Column(Integer, nullable=False, default=0)
+    confirmados = Column(Integer, nullable=False, default=0)
+    en_curso = Column(Integer, nullable=False, default=0)
+    completados = Column(Integer, nullable=False, default=0)
+    cancelados = Column(Integer, nullable=False, default=0)
+    minutos_reservados = Column(Integer, nullable=False, default=0)  # sin cancelados
+    ingresos = Column(Integer, nullable=False, default=0)  # completados, en centavos
+    ingresos_previstos = Column(Integer, nullable=False, default=0)  # sin cancelados
+
+
+class VersionDatos(TenantBase):
+    """Contador de cambios por clave ("servicios", "agenda:2030-01-18", ...) para los ETag.
+
+    La fila "*" es el contador global; ``cambio`` guarda su valor en la última
+    modificación de cada clave, así los workers sólo leen lo nuevo.
+    """
+    __tablename__ = "versiones"
+
+    clave = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    cambio = Column(Integer, nullable=False, default=0, index=True)
+
+
+# Columnas agregadas a tablas que ya existían; create_all no las crea
+COLUMNAS_AGREGADAS = [
+    (Turno.__table__, "recurrencia_id", "INTEGER REFERENCES turnos_recurrentes(id)"),
+    (Clientes.__table__, "telefono_normalizado", "VARCHAR(20)"),
+]
+
+# Índices agregados a tablas que ya existían (create_all tampoco los crea)
+INDICES_AGREGADOS = [
+    'idx_turnos_fecha_hora_id',
+    'idx_turnos_fecha_estado_horario',
+    'idx_bloqueos_fecha_todo_dia',
+]
+
+def asegurar_columnas(engine):
+    """Agrega con ALTER TABLE las columnas nuevas que falten (y sus índices),
+    y crea los índices nuevos de tablas existentes."""
+    inspector = inspect(engine)
+    for tabla, columna, definicion in COLUMNAS_AGREGADAS:
+        if not inspector.has_table(tabla.name):
+            continue
+        existentes = {c["name"] for c in inspector.get_columns(tabla.name)}
+        if columna in existentes:
+            continue
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {tabla.name} ADD COLUMN {columna} {definicion}"))
+        for indice in tabla.indexes:
+            if columna in indice.columns:
+                indice.create(bind=engine, checkfirst=True)
+    indices = {indice.name: indice for tabla in TenantBase.metadata.tables.values() for indice in tabla.indexes}
+    for nombre in INDICES_AGREGADOS:
+        indice = indices[nombre]
+        if inspector.has_table(indice.table.name):
+            indice.create(bind=engine, checkfirst=True)
@@ -1,20 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+import asyncio
+import csv
+import io
+import json
+import logging
+from fastapi import APIRouter, Depends, File, HTTPException, status, Header, Request, Response, UploadFile
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime, date, time, timedelta
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 
 from app.dependencies.dependencies import get_current_user  # tu dependencia JWT que devuelve el usuario
 from sqlalchemy.orm import Session
 
-from app.core.config import get_tenant_db, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
-from app.crud import crud
+from app.core import eventos, seguridad
+from app.core.config import get_tenant_db, get_tenant_async_db, clave_tenant_url, settings, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.crud import agenda, crud, crud_async, serializacion, versiones
 from app.schemas import schemas
 from app.models.models import Turno
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 # --- Dependencias de DB ---
@@ -22,31 +29,89 @@ def get_tenant_db_dep(tenant_db_url: Optional[str] = Header(None)):
     # Permite definir la barbería por cabecera opcional 'tenant_db_url'
     yield from get_tenant_db(tenant_db_url)
 
+async def get_tenant_async_db_dep(tenant_db_url: Optional[str] = Header(None)):
+    # Sesión async para las rutas públicas (disponibilidad y reservas)
+    async for db in get_tenant_async_db(tenant_db_url):
+        yield db
+
+# --- Respuestas condicionales (ETag / 304) ---
+# Las lecturas públicas las puede guardar un proxy o CDN unos segundos; las
+# del panel se revalidan siempre, pero con el 304 no se vuelven a consultar.
+CACHE_PUBLICO = f"public, max-age={settings.CACHE_PUBLICO_MAX_AGE}"
+CACHE_PRIVADO = "private, no-cache"
+CABECERAS_CACHE = ("ETag", "Cache-Control", "Vary")
+
+def _etag_coincide(request: Request, etag: str) -> bool:
+    cabecera = request.headers.get("if-none-match")
+    if not cabecera:
+        return False
+    if cabecera.strip() == "*":
+        return True
+    return any(valor.strip().removeprefix("W/") == etag for valor in cabecera.split(","))
+
+def _condicional(request: Request, response: Response, etag: str, cache_control: str) -> Optional[Response]:
+    """Agrega ETag y Cache-Control; si el cliente ya tiene esa versión devuelve el 304 a responder."""
+    cabeceras = {"ETag": etag, "Cache-Control": cache_control, "Vary": "tenant-db-url"}
+    if _etag_coincide(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cabeceras)
+    response.headers.update(cabeceras)
+    return None
+
+def _json(contenido, response: Optional[Response] = None) -> ORJSONResponse:
+    """Respuesta codificada con orjson; conserva las cabeceras de caché puestas en ``response``."""
+    cabeceras = {c: response.headers[c] for c in CABECERAS_CACHE if c in response.headers} if response else None
+    return ORJSONResponse(contenido, headers=cabeceras)
+
+def _claves_disponibilidad(desde: date, hasta: date) -> tuple:
+    """Claves de versión y extras del ETag de disponibilidad: los horarios de hoy
+    dependen de la hora (anticipación mínima), así que cambian cada media hora."""
+    claves = [versiones.HORARIOS, versiones.BARBEROS, versiones.SERVICIOS]
+    claves += [versiones.clave_agenda(desde + timedelta(days=i)) for i in range((hasta - desde).days + 1)]
+    hoy = date.today()
+    extra = [hoy.isoformat()]
+    if desde <= hoy <= hasta:
+        ahora = datetime.now()
+        extra.append((ahora.hour * 60 + ahora.minute) // agenda.MINUTOS_FRANJA)
+    return claves, extra
+
 # --- JWT Helpers ---
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
-    to_encode.update({"exp": expire})
+    emitido = datetime.utcnow()
+    expire = emitido + (expires_delta or timedelta(minutes=15))
+    # 'iat' identifica el token en la cache de principales
+    to_encode.update({"exp": expire, "iat": emitido})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 # --- Autenticación ---
 @router.post("/auth/login", tags=["autenticación"])
-def login(credentials: schemas.LoginCredentials, db: Session = Depends(get_tenant_db_dep)):
-    
-    print("=== Intente de Login ===")
-    print("=== Usuario recibido: ", credentials.usuario)
-    print("=== Contraseña recibida: ", credentials.password)
-
-    db_usuario = crud.get_usuario_by_usuario(db, usuario=credentials.usuario)
-    print("=== Uuario encontrado: ", db_usuario)
-
-    if not db_usuario or not pwd_context.verify(credentials.password, db_usuario.password_hash):
+async def login(credentials: schemas.LoginCredentials, db: AsyncSession = Depends(get_tenant_async_db_dep)):
+    db_usuario = await crud_async.get_usuario_by_usuario(db, usuario=credentials.usuario)
+
+    valida, nuevo_hash = False, None
+    if db_usuario:
+        # bcrypt corre en el pool de seguridad; el event loop sigue atendiendo
+        try:
+            valida, nuevo_hash = await seguridad.verificar_y_actualizar(credentials.password, db_usuario.password_hash)
+        except seguridad.SaturacionHash:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Demasiados inicios de sesión simultáneos, intente nuevamente",
+                headers={"Retry-After": "1"},
+            )
+    if not valida:
+        # Nunca la contraseña: sólo el usuario y si existe
+        logger.warning("Login rechazado", extra={"usuario": credentials.usuario, "existe": db_usuario is not None})
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuario o contraseña incorrectos",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if nuevo_hash:
+        # Cambió el costo de bcrypt: se guarda el hash recalculado
+        db_usuario.password_hash = nuevo_hash
+        await db.commit()
     access_token = create_access_token(
         data={"sub": db_usuario.usuario, "rol": db_usuario.rol},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -67,11 +132,52 @@ def login(credentials: schemas.LoginCredentials, db: Session = Depends(get_tenan
 def create_usuario(usuario: schemas.UsuarioCreate, db: Session = Depends(get_tenant_db_dep)):
     if crud.get_usuario_by_usuario(db, usuario.usuario):
         raise HTTPException(status_code=400, detail="El nombre de usuario ya está registrado")
-    return crud.create_usuario(db=db, usuario=usuario)
+    try:
+        return crud.create_usuario(db=db, usuario=usuario)
+    except seguridad.SaturacionHash:
+        raise HTTPException(status_code=503, detail="Servidor ocupado, intente nuevamente", headers={"Retry-After": "1"})
 
 @router.get("/usuarios/", response_model=List[schemas.Usuario], tags=["usuarios"])
-def read_usuarios(skip: int = 0, limit: int = 100, rol: Optional[str] = None, db: Session = Depends(get_tenant_db_dep)):
-    return crud.get_usuarios(db, skip=skip, limit=limit, rol=rol)
+def read_usuarios(response: Response, skip: int = 0, limit: int = 100, rol: Optional[str] = None,
+                  cursor: Optional[str] = None, db: Session = Depends(get_tenant_db_dep)):
+    # La lista se mantiene como respuesta; el cursor siguiente va en el header X-Next-Cursor
+    try:
+        usuarios = crud.get_usuarios(db, skip=skip, limit=limit, rol=rol, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    siguiente = crud.siguiente_cursor(usuarios, limit, crud.clave_id)
+    if siguiente:
+        response.headers["X-Next-Cursor"] = siguiente
+    return usuarios
+
+# --- Clientes ---
+@router.get("/clientes/", tags=["clientes"])
+def read_clientes(limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_tenant_db_dep)):
+    try:
+        clientes = crud.get_clientes(db, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "clientes": clientes,
+        "next_cursor": crud.siguiente_cursor(clientes, limit, crud.clave_id),
+    }
+
+COLUMNAS_IMPORTACION = ("nombre", "telefono")
+
+@router.post("/clientes/importar", tags=["clientes"])
+def importar_clientes(archivo: UploadFile = File(...), db: Session = Depends(get_tenant_db_dep)):
+    """Alta o actualización de clientes desde un CSV con columnas nombre y telefono (por lotes)"""
+    lector = csv.DictReader(io.TextIOWrapper(archivo.file, encoding="utf-8-sig", newline=""))
+    columnas = {(c or "").strip().lower() for c in lector.fieldnames or ()}
+    if not set(COLUMNAS_IMPORTACION) <= columnas:
+        raise HTTPException(status_code=400, detail="El CSV debe tener las columnas: nombre, telefono")
+    filas = ({(k or "").strip().lower(): v for k, v in fila.items()} for fila in lector)
+    try:
+        return crud.importar_clientes(db, filas)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="El CSV debe estar en UTF-8")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al importar clientes: {str(e)}")
 
 # --- Servicios ---
 @router.post("/servicios/", response_model=schemas.Servicio, tags=["servicios"])
@@ -79,14 +185,24 @@ def create_servicio(servicio: schemas.ServicioCreate, db: Session = Depends(get_
     return crud.create_servicio(db=db, servicio=servicio)
 
 @router.get("/servicios/", response_model=List[schemas.Servicio], tags=["servicios"])
-def read_servicios(skip: int = 0, limit: int = 100, db: Session = Depends(get_tenant_db_dep)):
-    return crud.get_servicios(db, skip=skip, limit=limit)
+async def read_servicios(request: Request, response: Response, skip: int = 0, limit: int = 100,
+                         db: AsyncSession = Depends(get_tenant_async_db_dep)):
+    etag = await versiones.etag_async(db, [versiones.SERVICIOS])
+    no_modificado = _condicional(request, response, etag, CACHE_PUBLICO)
+    if no_modificado:
+        return no_modificado
+    return await crud_async.get_servicios(db, skip=skip, limit=limit)
 
 # --- Endpoints adicionales para servicios ---
 @router.get("/servicios/{servicio_id}", response_model=schemas.Servicio, tags=["servicios"])
-def get_servicio(servicio_id: int, db: Session = Depends(get_tenant_db_dep)):
+async def get_servicio(servicio_id: int, request: Request, response: Response,
+                       db: AsyncSession = Depends(get_tenant_async_db_dep)):
     """Obtiene un servicio específico por ID"""
-    servicio = crud.get_servicio(db, servicio_id)
+    etag = await versiones.etag_async(db, [versiones.SERVICIOS])
+    no_modificado = _condicional(request, response, etag, CACHE_PUBLICO)
+    if no_modificado:
+        return no_modificado
+    servicio = await crud_async.get_servicio(db, servicio_id)
     if not servicio:
         raise HTTPException(status_code=404, detail="Servicio no encontrado")
     return servicio
@@ -95,18 +211,12 @@ def get_servicio(servicio_id: int, db: Session = Depends(get_tenant_db_dep)):
 def update_servicio(servicio_id: int, servicio_update: dict, db: Session = Depends(get_tenant_db_dep)):
     """Actualiza un servicio existente"""
     try:
-        servicio = crud.get_servicio(db, servicio_id)
+        servicio = crud.update_servicio(db, servicio_id, servicio_update)
         if not servicio:
             raise HTTPException(status_code=404, detail="Servicio no encontrado")
-        
-        # Actualizar campos
-        for field, value in servicio_update.items():
-            if hasattr(servicio, field):
-                setattr(servicio, field, value)
-        
-        db.commit()
-        db.refresh(servicio)
         return servicio
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al actualizar servicio: {str(e)}")
 
@@ -123,18 +233,13 @@ def get_usuario(usuario_id: int, db: Session = Depends(get_tenant_db_dep)):
 def update_usuario(usuario_id: int, usuario_update: dict, db: Session = Depends(get_tenant_db_dep)):
     """Actualiza un usuario existente"""
     try:
-        usuario = crud.get_usuario(db, usuario_id)
+        # Actualizar campos (excluyendo password_hash por seguridad)
+        usuario = crud.update_usuario(db, usuario_id, usuario_update)
         if not usuario:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
-        
-        # Actualizar campos (excluyendo password_hash por seguridad)
-        for field, value in usuario_update.items():
-            if field != "password_hash" and hasattr(usuario, field):
-                setattr(usuario, field, value)
-        
-        db.commit()
-        db.refresh(usuario)
         return usuario
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al actualizar usuario: {str(e)}")
 
@@ -147,46 +252,90 @@ def read_turnos(
     fecha_inicio: Optional[str] = None,
     fecha_fin: Optional[str] = None,
     estado: Optional[str] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_tenant_db_dep)
 ):
+    """Lista turnos; para recorrer muchas páginas usar 'cursor' con el next_cursor recibido"""
     try:
         fecha_inicio_dt = datetime.strptime(fecha_inicio, "%Y-%m-%d").date() if fecha_inicio else None
         fecha_fin_dt = datetime.strptime(fecha_fin, "%Y-%m-%d").date() if fecha_fin else None
-        turnos = crud.get_turnos(db, skip, limit, cliente_id, fecha_inicio_dt, fecha_fin_dt, estado)
-        return {"turnos": turnos}
     except ValueError:
         raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+    try:
+        turnos = serializacion.get_turnos(
+            db, serializacion.TURNO_COMPLETO, skip, limit, cliente_id, fecha_inicio_dt, fecha_fin_dt, estado, cursor
+        )
+        return _json({"turnos": turnos, "next_cursor": crud.siguiente_cursor(turnos, limit, serializacion.clave_turno)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener turnos: {str(e)}")
 
+async def _duracion_servicio(db: AsyncSession, servicio_id: Optional[int]) -> int:
+    """Duración en minutos para calcular horarios (una franja si no se indica servicio)."""
+    if servicio_id is None:
+        return agenda.MINUTOS_FRANJA
+    servicio = await crud_async.get_servicio(db, servicio_id)
+    if not servicio:
+        raise HTTPException(status_code=400, detail="Servicio no encontrado")
+    return servicio.duracion_min or agenda.MINUTOS_FRANJA
+
 # --- Endpoint para obtener horarios disponibles ---
 @router.get("/turnos/disponibilidad", tags=["turnos"])
-def get_horarios_disponibles(fecha: str, db: Session = Depends(get_tenant_db_dep)):
+async def get_horarios_disponibles(request: Request, response: Response, fecha: str,
+                                   barbero_id: Optional[int] = None, servicio_id: Optional[int] = None,
+                                   db: AsyncSession = Depends(get_tenant_async_db_dep)):
+    """Horarios libres del día para ese barbero, o de cualquiera si no se indica.
+    Con servicio_id sólo se ofrecen inicios donde entra toda la duración del servicio."""
     try:
         fecha_dt = datetime.strptime(fecha, "%Y-%m-%d").date()
-        horarios = crud.get_horarios_disponibles(db, fecha_dt)
-        # Incluir bloqueos del día con motivo para informar al cliente
-        bloqueos = crud.get_bloqueos(db, fecha_dt, fecha_dt)
-        bloqueos_serializados = [
-            {
-                "id": b.id,
-                "fecha": b.fecha.isoformat(),
-                "todo_dia": b.todo_dia,
-                "hora_inicio": b.hora_inicio.strftime("%H:%M") if b.hora_inicio else None,
-                "hora_fin": b.hora_fin.strftime("%H:%M") if b.hora_fin else None,
-                "motivo": b.motivo,
-            }
-            for b in bloqueos
-        ]
-        return {"horarios_disponibles": horarios, "bloqueos": bloqueos_serializados}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+    claves, extra = _claves_disponibilidad(fecha_dt, fecha_dt)
+    etag = await versiones.etag_async(db, claves, extra)
+    no_modificado = _condicional(request, response, etag, CACHE_PUBLICO)
+    if no_modificado:
+        return no_modificado
+    duracion = await _duracion_servicio(db, servicio_id)
+    try:
+        # Horarios libres y bloqueos del día (con motivo para informar al cliente)
+        return await crud_async.get_disponibilidad_dia(db, fecha_dt, barbero_id, duracion)
     except ValueError:
         raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener horarios: {str(e)}")
 
+# --- Disponibilidad de varios días en una sola consulta (ej: un mes) ---
+MAX_DIAS_DISPONIBILIDAD = 62
+
+@router.get("/turnos/disponibilidad/rango", tags=["turnos"])
+async def get_disponibilidad_rango(request: Request, response: Response, desde: str, hasta: str,
+                                   barbero_id: Optional[int] = None, servicio_id: Optional[int] = None,
+                                   db: AsyncSession = Depends(get_tenant_async_db_dep)):
+    try:
+        desde_dt = datetime.strptime(desde, "%Y-%m-%d").date()
+        hasta_dt = datetime.strptime(hasta, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+    if hasta_dt < desde_dt:
+        raise HTTPException(status_code=400, detail="La fecha 'hasta' debe ser posterior o igual a 'desde'")
+    if (hasta_dt - desde_dt).days + 1 > MAX_DIAS_DISPONIBILIDAD:
+        raise HTTPException(status_code=400, detail=f"El rango no puede superar {MAX_DIAS_DISPONIBILIDAD} días")
+    claves, extra = _claves_disponibilidad(desde_dt, hasta_dt)
+    etag = await versiones.etag_async(db, claves, extra)
+    no_modificado = _condicional(request, response, etag, CACHE_PUBLICO)
+    if no_modificado:
+        return no_modificado
+    duracion = await _duracion_servicio(db, servicio_id)
+    try:
+        dias = await crud_async.get_disponibilidad_rango(db, desde_dt, hasta_dt, barbero_id, duracion)
+        return {"desde": desde, "hasta": hasta, "dias": dias}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener horarios: {str(e)}")
+
 # --- Crear turno desde cliente (frontend) ---
 @router.post("/turnos/", tags=["turnos"])
-async def crear_turno_desde_cliente(turno_data: dict, db: Session = Depends(get_tenant_db_dep)):
+async def crear_turno_desde_cliente(turno_data: dict, db: AsyncSession = Depends(get_tenant_async_db_dep)):
     try:
         nombre = turno_data.get("nombre")
         apellido = turno_data.get("apellido")
@@ -198,9 +347,15 @@ async def crear_turno_desde_cliente(turno_data: dict, db: Session = Depends(get_
         if not all([nombre, apellido, telefono, servicio_nombre, fecha_str, hora_str]):
             raise HTTPException(status_code=400, detail="Todos los campos son requeridos")
 
+        barbero_id = turno_data.get("barbero_id")
+        if barbero_id is not None:
+            try:
+                barbero_id = int(barbero_id)
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="barbero_id debe ser un número entero")
+
         fecha_dt = datetime.strptime(fecha_str, "%Y-%m-%d").date()
         hora_dt = datetime.strptime(hora_str, "%H:%M").time()
-        hora_fin_dt = (datetime.combine(fecha_dt, hora_dt) + timedelta(minutes=30)).time()
 
         # Validar que la fecha no sea pasada
         fecha_actual = datetime.now().date()
@@ -215,22 +370,19 @@ async def crear_turno_desde_cliente(turno_data: dict, db: Session = Depends(get_
             if hora_dt <= hora_minima:
                 raise HTTPException(status_code=400, detail="No se pueden agendar turnos para horarios pasados. Mínimo 30 minutos de anticipación")
 
-        # Buscar o crear cliente
-        cliente = crud.get_cliente_by_telefono(db, telefono)
-        if not cliente:
-            cliente = crud.create_cliente(db, f"{nombre} {apellido}", telefono)
-
         # Buscar servicio
-        servicio = crud.get_servicio_by_nombre(db, servicio_nombre)
+        servicio = await crud_async.get_servicio_by_nombre(db, servicio_nombre)
         if not servicio:
             raise HTTPException(status_code=400, detail="Servicio no encontrado")
 
-        # Verificar disponibilidad
-        if not crud.verificar_disponibilidad_turno(db, fecha_dt, hora_dt, hora_fin_dt):
-            raise HTTPException(status_code=400, detail="El horario no está disponible")
+        # El turno dura lo que el servicio (puede ocupar varias franjas)
+        hora_fin_dt = crud.hora_fin_servicio(servicio, fecha_dt, hora_dt)
 
-        # Crear turno
-        turno = crud.create_turno(db, cliente.id, servicio.id, fecha_dt, hora_dt, hora_fin_dt)
+        # Buscar o crear cliente y reservar el horario en una sola transacción
+        turno = await crud_async.reservar_turno(
+            db, f"{nombre} {apellido}", telefono, servicio.id, fecha_dt, hora_dt, hora_fin_dt, barbero_id
+        )
+        cliente = turno.cliente
 # -----------------------------------
 
         return {
@@ -238,10 +390,16 @@ async def crear_turno_desde_cliente(turno_data: dict, db: Session = Depends(get_
             "turno_id": turno.id,
             "cliente": cliente.nombre,
             "servicio": servicio.nombre,
+            "barbero_id": turno.barbero_id,
             "fecha": fecha_str,
-            "hora": hora_str
+            "hora": hora_str,
+            "hora_fin": hora_fin_dt.strftime("%H:%M")
         }
 
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al crear turno: {str(e)}")
 
@@ -308,6 +466,86 @@ async def crear_turno_desde_cliente(turno_data: dict, db: Session = Depends(get_
 
 # --- Actualizar estados de los turnos ---
 
+# --- Operaciones en lote ---
+@router.put("/turnos/estado/lote", tags=["turnos"])
+def actualizar_estado_lote(cambio: schemas.CambioEstadoLote, db: Session = Depends(get_tenant_db_dep)):
+    """Cambia el estado de varios turnos (lista de ids, o fecha y barbero) en una sola transacción"""
+    try:
+        resultados = crud.actualizar_estado_turnos(db, cambio.estado, cambio.ids, cambio.fecha, cambio.barbero_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al actualizar turnos: {str(e)}")
+    return {
+        "estado": cambio.estado,
+        "actualizados": sum(1 for r in resultados if r["resultado"] == "actualizado"),
+        "resultados": resultados,
+    }
+
+@router.post("/turnos/lote", tags=["turnos"])
+def reservar_turnos_lote(lote: schemas.ReservaLote, db: Session = Depends(get_tenant_db_dep)):
+    """Reserva varios turnos (clientes frecuentes, importaciones) en una sola transacción"""
+    items = [
+        {
+            "nombre": f"{t.nombre} {t.apellido}",
+            "telefono": t.telefono,
+            "servicio": t.servicio,
+            "fecha": t.fecha,
+            "hora_inicio": t.hora,
+            "barbero_id": t.barbero_id,
+        }
+        for t in lote.turnos
+    ]
+    try:
+        resultados = crud.reservar_turnos_lote(db, items)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al crear turnos: {str(e)}")
+    return {
+        "creados": sum(1 for r in resultados if r["resultado"] == "creado"),
+        "resultados": resultados,
+    }
+
+# --- Turnos recurrentes ---
+@router.post("/turnos/recurrentes", tags=["turnos"])
+def crear_turnos_recurrentes(datos: schemas.TurnoRecurrenteCreate, db: Session = Depends(get_tenant_db_dep)):
+    """Crea una serie de turnos (ej: todos los viernes 10:00 por 12 semanas).
+    Si alguna fecha está ocupada responde 409 con los conflictos, salvo omitir_conflictos=true"""
+    servicio = crud.get_servicio_by_nombre(db, datos.servicio)
+    if not servicio:
+        raise HTTPException(status_code=400, detail="Servicio no encontrado")
+    try:
+        hora_fin = crud.hora_fin_servicio(servicio, datos.fecha_inicio, datos.hora)
+        resultado = crud.crear_turnos_recurrentes(
+            db, f"{datos.nombre} {datos.apellido}", datos.telefono, servicio.id,
+            datos.fecha_inicio, datos.hora, hora_fin, datos.frecuencia, datos.intervalo,
+            datos.repeticiones, datos.fecha_fin, datos.omitir_conflictos, datos.barbero_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al crear turnos recurrentes: {str(e)}")
+    if resultado["recurrencia_id"] is None:
+        raise HTTPException(status_code=409, detail={
+            "mensaje": "Hay fechas con el horario ocupado",
+            "conflictos": resultado["conflictos"],
+        })
+    return resultado
+
+@router.put("/turnos/recurrentes/{recurrencia_id}/cancelar", tags=["turnos"])
+def cancelar_turnos_recurrentes(recurrencia_id: int, desde: Optional[str] = None, db: Session = Depends(get_tenant_db_dep)):
+    """Cancela los turnos de la serie a partir de 'desde' (por defecto hoy)"""
+    try:
+        desde_dt = datetime.strptime(desde, "%Y-%m-%d").date() if desde else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+    try:
+        resultados = crud.cancelar_turnos_recurrentes(db, recurrencia_id, desde_dt)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al cancelar turnos recurrentes: {str(e)}")
+    if resultados is None:
+        raise HTTPException(status_code=404, detail="Serie de turnos no encontrada")
+    return {"resultados": resultados}
+
 @router.put("/turnos/cancelar/{turno_id}", tags=["turnos"])
 def cancelar_turno(turno_id: int, db: Session = Depends(get_tenant_db_dep)):
     """Cancela un turno existente"""
@@ -350,18 +588,24 @@ def restaurar_turno(turno_id: int, db: Session = Depends(get_tenant_db_dep)):
         if not turno:
             raise HTTPException(status_code=404, detail="Turno no encontrado")
         return turno
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al restaurar turno: {str(e)}")
 
 # --- Endpoints adicionales para el frontend del barbero ---
 
 @router.get("/turnos/fecha/{fecha}", tags=["turnos"])
-def get_turnos_por_fecha(fecha: str, db: Session = Depends(get_tenant_db_dep)):
+def get_turnos_por_fecha(fecha: str, request: Request, response: Response, db: Session = Depends(get_tenant_db_dep)):
     """Obtiene todos los turnos para una fecha específica"""
     try:
         fecha_dt = datetime.strptime(fecha, "%Y-%m-%d").date()
-        turnos = crud.get_turnos(db, fecha_inicio=fecha_dt, fecha_fin=fecha_dt)
-        return {"turnos": turnos}
+        etag = versiones.etag(db, [versiones.clave_agenda(fecha_dt), versiones.SERVICIOS, versiones.CLIENTES])
+        no_modificado = _condicional(request, response, etag, CACHE_PRIVADO)
+        if no_modificado:
+            return no_modificado
+        turnos = serializacion.get_turnos(db, limit=None, fecha_inicio=fecha_dt, fecha_fin=fecha_dt)
+        return _json({"turnos": turnos}, response)
     except ValueError:
         raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
 
@@ -373,8 +617,9 @@ def get_turnos_semana(fecha: str, db: Session = Depends(get_tenant_db_dep)):
         # Calcular inicio y fin de la semana (lunes a domingo)
         inicio_semana = fecha_dt - timedelta(days=fecha_dt.weekday())
         fin_semana = inicio_semana + timedelta(days=6)
-        turnos = crud.get_turnos(db, fecha_inicio=inicio_semana, fecha_fin=fin_semana)
-        return turnos
+        return _json(serializacion.get_turnos(
+            db, serializacion.TURNO_ESQUEMA, limit=None, fecha_inicio=inicio_semana, fecha_fin=fin_semana
+        ))
     except ValueError:
         raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
 
@@ -386,6 +631,8 @@ def update_turno(turno_id: int, turno_update: dict, db: Session = Depends(get_te
         if not turno:
             raise HTTPException(status_code=404, detail="Turno no encontrado")
         return turno
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al actualizar turno: {str(e)}")
 
@@ -400,32 +647,80 @@ def delete_turno(turno_id: int, db: Session = Depends(get_tenant_db_dep)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al eliminar turno: {str(e)}")
 
+# --- Exportación de turnos (CSV / NDJSON) ---
+FORMATOS_EXPORTACION = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+FILAS_POR_BLOQUE = 500
+
+def _lineas_exportacion(filas, formato: str):
+    """Serializa las filas en bloques de texto para no enviar un chunk por fila."""
+    buffer = io.StringIO()
+    if formato == "csv":
+        escritor = csv.writer(buffer)
+        escritor.writerow(crud.COLUMNAS_EXPORTACION)
+        escribir = escritor.writerow
+    else:
+        def escribir(fila):
+            buffer.write(json.dumps(dict(zip(crud.COLUMNAS_EXPORTACION, fila)), default=str, ensure_ascii=False))
+            buffer.write("\n")
+    pendientes = 0
+    for fila in filas:
+        escribir(fila)
+        pendientes += 1
+        if pendientes >= FILAS_POR_BLOQUE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pendientes = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@router.get("/turnos/exportar", tags=["turnos"])
+def exportar_turnos(
+    formato: str = "csv",
+    fecha_inicio: Optional[str] = None,
+    fecha_fin: Optional[str] = None,
+    estado: Optional[str] = None,
+    barbero_id: Optional[int] = None,
+    tenant_db_url: Optional[str] = Header(None),
+):
+    """Exporta el historial de turnos en CSV o NDJSON, enviando filas a medida que se leen"""
+    if formato not in FORMATOS_EXPORTACION:
+        raise HTTPException(status_code=400, detail=f"Formato inválido. Use: {', '.join(FORMATOS_EXPORTACION)}")
+    try:
+        fecha_inicio_dt = datetime.strptime(fecha_inicio, "%Y-%m-%d").date() if fecha_inicio else None
+        fecha_fin_dt = datetime.strptime(fecha_fin, "%Y-%m-%d").date() if fecha_fin else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+
+    def generar():
+        # La sesión vive lo que dura el envío, no lo que dura la función de la ruta
+        sesiones = get_tenant_db(tenant_db_url)
+        db = next(sesiones)
+        try:
+            filas = crud.exportar_turnos(db, fecha_inicio_dt, fecha_fin_dt, estado, barbero_id)
+            yield from _lineas_exportacion(filas, formato)
+        finally:
+            sesiones.close()
+
+    nombre = f"turnos_{fecha_inicio or 'inicio'}_{fecha_fin or 'hoy'}.{formato}"
+    return StreamingResponse(
+        generar(),
+        media_type=FORMATOS_EXPORTACION[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'},
+    )
+
 @router.get("/turnos/estadisticas", tags=["turnos"])
-def get_estadisticas_turnos(fecha_inicio: str, fecha_fin: str, db: Session = Depends(get_tenant_db_dep)):
-    """Obtiene estadísticas de turnos para un rango de fechas"""
+def get_estadisticas_turnos(fecha_inicio: str, fecha_fin: str, agrupar_por: Optional[str] = None, db: Session = Depends(get_tenant_db_dep)):
+    """Obtiene estadísticas de turnos para un rango de fechas (agrupar_por: dia, barbero o servicio)"""
     try:
         fecha_inicio_dt = datetime.strptime(fecha_inicio, "%Y-%m-%d").date()
         fecha_fin_dt = datetime.strptime(fecha_fin, "%Y-%m-%d").date()
-        
-        turnos = crud.get_turnos(db, fecha_inicio=fecha_inicio_dt, fecha_fin=fecha_fin_dt)
-        
-        # Calcular estadísticas básicas
-        total_turnos = len(turnos)
-        turnos_confirmados = len([t for t in turnos if t.estado == "confirmado"])
-        turnos_completados = len([t for t in turnos if t.estado == "completado"])
-        turnos_cancelados = len([t for t in turnos if t.estado == "cancelado"])
-        
-        estadisticas = {
-            "total_turnos": total_turnos,
-            "confirmados": turnos_confirmados,
-            "completados": turnos_completados,
-            "cancelados": turnos_cancelados,
-            "pendientes": total_turnos - turnos_confirmados - turnos_completados - turnos_cancelados
-        }
-        
-        return {"estadisticas": estadisticas}
     except ValueError:
         raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+    try:
+        return crud.get_estadisticas_turnos(db, fecha_inicio_dt, fecha_fin_dt, agrupar_por)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # --- Bloqueos de agenda ---
 @router.post("/bloqueos/", response_model=schemas.Bloqueo, tags=["bloqueos"])
@@ -438,10 +733,14 @@ def crear_bloqueo(bloqueo: schemas.BloqueoCreate, db: Session = Depends(get_tena
         raise HTTPException(status_code=500, detail=f"Error al crear bloqueo: {str(e)}")
 
 @router.get("/bloqueos/", response_model=List[schemas.Bloqueo], tags=["bloqueos"])
-def listar_bloqueos(fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None, db: Session = Depends(get_tenant_db_dep)):
+def listar_bloqueos(request: Request, response: Response, fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
+                    db: Session = Depends(get_tenant_db_dep)):
     try:
         fi = datetime.strptime(fecha_inicio, "%Y-%m-%d").date() if fecha_inicio else None
         ff = datetime.strptime(fecha_fin, "%Y-%m-%d").date() if fecha_fin else None
+        no_modificado = _condicional(request, response, versiones.etag(db, [versiones.BLOQUEOS]), CACHE_PRIVADO)
+        if no_modificado:
+            return no_modificado
         return crud.get_bloqueos(db, fi, ff)
     except ValueError:
         raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
@@ -457,15 +756,57 @@ def eliminar_bloqueo(bloqueo_id: int, db: Session = Depends(get_tenant_db_dep)):
         raise HTTPException(status_code=500, detail=f"Error al eliminar bloqueo: {str(e)}")
 
 @router.get("/bloqueos/fecha/{fecha}", tags=["bloqueos"])
-def verificar_bloqueos_fecha(fecha: str, db: Session = Depends(get_tenant_db_dep)):
+def verificar_bloqueos_fecha(fecha: str, request: Request, response: Response, db: Session = Depends(get_tenant_db_dep)):
     """Verifica si una fecha específica tiene bloqueos"""
     try:
         fecha_dt = datetime.strptime(fecha, "%Y-%m-%d").date()
+        no_modificado = _condicional(request, response, versiones.etag(db, [versiones.BLOQUEOS]), CACHE_PRIVADO)
+        if no_modificado:
+            return no_modificado
         bloqueos = crud.get_bloqueos(db, fecha_dt, fecha_dt)
         return {"bloqueos": bloqueos}
     except ValueError:
         raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
-    
+
+# --- Horario de trabajo y feriados ---
+@router.get("/horarios-trabajo/", response_model=List[schemas.HorarioTrabajo], tags=["horarios"])
+def listar_horarios_trabajo(barbero_id: Optional[int] = None, db: Session = Depends(get_tenant_db_dep)):
+    """Tramos de atención por día de la semana (sin tramos cargados se atiende de 9:00 a 22:00)"""
+    return crud.get_horarios_trabajo(db, barbero_id)
+
+@router.post("/horarios-trabajo/", response_model=schemas.HorarioTrabajo, tags=["horarios"])
+def crear_horario_trabajo(horario: schemas.HorarioTrabajoCreate, db: Session = Depends(get_tenant_db_dep)):
+    try:
+        return crud.create_horario_trabajo(db, horario)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al crear horario: {str(e)}")
+
+@router.delete("/horarios-trabajo/{horario_id}", tags=["horarios"])
+def eliminar_horario_trabajo(horario_id: int, db: Session = Depends(get_tenant_db_dep)):
+    if not crud.delete_horario_trabajo(db, horario_id):
+        raise HTTPException(status_code=404, detail="Horario no encontrado")
+    return {"message": "Horario eliminado"}
+
+@router.get("/feriados/", response_model=List[schemas.Feriado], tags=["horarios"])
+def listar_feriados(fecha_inicio: Optional[date] = None, fecha_fin: Optional[date] = None,
+                    db: Session = Depends(get_tenant_db_dep)):
+    return crud.get_feriados(db, fecha_inicio, fecha_fin)
+
+@router.post("/feriados/", response_model=schemas.Feriado, tags=["horarios"])
+def crear_feriado(feriado: schemas.FeriadoCreate, db: Session = Depends(get_tenant_db_dep)):
+    try:
+        return crud.create_feriado(db, feriado)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al crear feriado: {str(e)}")
+
+@router.delete("/feriados/{feriado_id}", tags=["horarios"])
+def eliminar_feriado(feriado_id: int, db: Session = Depends(get_tenant_db_dep)):
+    if not crud.delete_feriado(db, feriado_id):
+        raise HTTPException(status_code=404, detail="Feriado no encontrado")
+    return {"message": "Feriado eliminado"}
+
 
 # --- OBTENER NOTIFICACIONES NO LEIDAS ---
 
@@ -499,17 +840,58 @@ def obtener_notificaciones(db: Session = Depends(get_tenant_db_dep)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener notificaciones: {str(e)}")
 
+# --- STREAM DE EVENTOS (SSE) PARA EL DASHBOARD ---
+
+@router.get("/turnos/eventos", tags=["notificaciones"])
+async def stream_eventos(
+    request: Request,
+    ultimo_id: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None),
+    tenant_db_url: Optional[str] = Header(None),
+):
+    """Envía turnos nuevos y cambios de estado a medida que ocurren (Server-Sent Events).
+
+    Retoma desde el header Last-Event-ID (o ?ultimo_id=); si no puede garantizar
+    continuidad emite un evento 'resincronizar' para que el cliente recargue.
+    """
+    tenant = clave_tenant_url(tenant_db_url)
+    suscripcion, pendientes, resincronizar = eventos.bus.suscribir(tenant, last_event_id or ultimo_id)
+
+    async def generar():
+        try:
+            yield "retry: 5000\n\n"
+            if resincronizar:
+                yield "event: resincronizar\ndata: {}\n\n"
+            for evento in pendientes:
+                yield evento.sse()
+            while True:
+                try:
+                    evento = await asyncio.wait_for(suscripcion.cola.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                if evento is None:
+                    yield "event: resincronizar\ndata: {}\n\n"
+                else:
+                    yield evento.sse()
+        finally:
+            eventos.bus.desuscribir(tenant, suscripcion)
+
+    return StreamingResponse(
+        generar(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # --- MARCAR COMO LEIDAS LAS NOTIFICACIONES ---
 
 @router.put("/notificaciones/marcar-leidas", tags=["notificaciones"])
 def marcar_notificaciones_leidas(db: Session = Depends(get_tenant_db_dep)):
     """Marca todas las notificaciones como leídas (notificado=True)"""
     try:
-        db.query(Turno).filter(
-            Turno.notificado == False
-        ).update({"notificado": True}, synchronize_session=False)
-        
-        db.commit()
+        crud.marcar_notificados(db)
         return {"message": "Notificaciones marcadas como leídas"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al marcar notificaciones: {str(e)}")
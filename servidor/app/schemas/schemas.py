@@ -162,6 +162,56 @@ class Turno(TurnoBase):
     class Config:
         orm_mode = True
 
+class CambioEstadoLote(BaseModel):
+    estado: str
+    ids: Optional[List[int]] = None
+    fecha: Optional[date] = None
+    barbero_id: Optional[int] = None
+
+    @validator('estado')
+    def validate_estado(cls, v):
+        if v not in ['pendiente', 'confirmado', 'en_curso', 'cancelado', 'completado']:
+            raise ValueError('El estado debe ser: pendiente, confirmado, en_curso, cancelado o completado')
+        return v
+
+class TurnoLoteItem(BaseModel):
+    nombre: str
+    apellido: str
+    telefono: str
+    servicio: str
+    fecha: date
+    hora: time
+    barbero_id: Optional[int] = None
+
+class ReservaLote(BaseModel):
+    turnos: List[TurnoLoteItem]
+
+    @validator('turnos')
+    def validate_turnos(cls, v):
+        if not v or len(v) > 500:
+            raise ValueError('Se pueden reservar entre 1 y 500 turnos por lote')
+        return v
+
+class TurnoRecurrenteCreate(BaseModel):
+    nombre: str
+    apellido: str
+    telefono: str
+    servicio: str
+    fecha_inicio: date
+    hora: time
+    frecuencia: str = "semanal"
+    intervalo: int = 1
+    repeticiones: Optional[int] = None
+    fecha_fin: Optional[date] = None
+    omitir_conflictos: bool = False
+    barbero_id: Optional[int] = None
+
+    @validator('frecuencia')
+    def validate_frecuencia(cls, v):
+        if v not in ['diaria', 'semanal', 'mensual']:
+            raise ValueError('La frecuencia debe ser: diaria, semanal o mensual')
+        return v
+
 # ---------------------------
 # Esquemas para Bloqueos
 # ---------------------------
@@ -192,6 +242,57 @@ class Bloqueo(BloqueoBase):
     class Config:
         orm_mode = True
 
+# ---------------------------
+# Esquemas para Horario de trabajo
+# ---------------------------
+class HorarioTrabajoBase(BaseModel):
+    barbero_id: Optional[int] = None
+    dia_semana: int  # 0 = lunes ... 6 = domingo
+    hora_inicio: time
+    hora_fin: time
+
+    @validator('dia_semana')
+    def validate_dia_semana(cls, v):
+        if not 0 <= v <= 6:
+            raise ValueError('dia_semana debe estar entre 0 (lunes) y 6 (domingo)')
+        return v
+
+    @validator('hora_inicio', 'hora_fin')
+    def validate_media_hora(cls, v):
+        if v.minute % 30 or v.second:
+            raise ValueError('Los horarios deben ser en punto o y media')
+        return v
+
+    @validator('hora_fin')
+    def validate_hora_fin(cls, v, values):
+        if values.get('hora_inicio') is not None and v <= values['hora_inicio']:
+            raise ValueError('hora_fin debe ser posterior a hora_inicio')
+        return v
+
+class HorarioTrabajoCreate(HorarioTrabajoBase):
+    pass
+
+class HorarioTrabajo(HorarioTrabajoBase):
+    id: int
+
+    class Config:
+        orm_mode = True
+
+class FeriadoBase(BaseModel):
+    fecha: date
+    barbero_id: Optional[int] = None
+    motivo: Optional[str] = None
+
+class FeriadoCreate(FeriadoBase):
+    pass
+
+class Feriado(FeriadoBase):
+    id: int
+    creado_en: datetime
+
+    class Config:
+        orm_mode = True
+
 # ---------------------------
 # Esquemas para JWT / Tokens
 # ---------------------------
@@ -0,0 +1,120 @@
+"""Serialización de una semana de turnos: ORM + Pydantic + jsonable_encoder contra columnas + orjson.
+
+Carga una semana con ``--turnos`` turnos (por defecto 1000) en una base aparte
+y mide, para las dos formas de respuesta:
+
+- antes: ``crud.get_turnos`` (objetos ORM con joinedload) y la misma
+  conversión que hacía FastAPI: ``schemas.Turno`` (response_model de
+  /turnos/semana) o ``vars()`` de los objetos (/turnos/fecha), luego
+  ``jsonable_encoder`` y ``JSONResponse``;
+- después: ``serializacion.get_turnos`` (tuplas de columnas) y ``ORJSONResponse``.
+
+Uso (desde ``servidor/``):
+
+    python -m benchmarks.serializacion
+    python -m benchmarks.serializacion --turnos 5000 --repeticiones 50
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time as reloj
+from datetime import date, time, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "bench_app.db"))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.core.config import TenantBase  # noqa: E402
+from app.crud import crud, serializacion  # noqa: E402
+from app.models.models import Clientes, Servicio, Turno  # noqa: E402
+from app.schemas import schemas  # noqa: E402
+
+LUNES = date(2030, 1, 14)
+DOMINGO = LUNES + timedelta(days=6)
+
+
+def cargar_datos(engine, turnos: int):
+    TenantBase.metadata.drop_all(engine)
+    TenantBase.metadata.create_all(engine)
+    azar = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(insert(Clientes), [{"nombre": f"Cliente {i}", "telefono": f"11{i:08d}"} for i in range(200)])
+        conn.execute(insert(Servicio), [
+            {"nombre": nombre, "duracion_min": 30, "precio": precio}
+            for nombre, precio in (("Corte", 1000), ("Barba", 700), ("Color", 2500))
+        ])
+        filas = []
+        for i in range(turnos):
+            minutos = 9 * 60 + (i // 7 % 26) * 30
+            filas.append({
+                "cliente_id": azar.randint(1, 200), "servicio_id": azar.randint(1, 3), "barbero_id": i % 8 + 1,
+                "fecha": LUNES + timedelta(days=i % 7), "hora_inicio": time(minutos // 60, minutos % 60),
+                "hora_fin": time((minutos + 30) // 60, (minutos + 30) % 60),
+                "estado": azar.choice(("pendiente", "confirmado", "completado")), "notificado": True,
+            })
+        conn.execute(insert(Turno), filas)
+
+
+def semana_antes(db) -> bytes:
+    turnos = crud.get_turnos(db, limit=None, fecha_inicio=LUNES, fecha_fin=DOMINGO)
+    validados = [schemas.Turno.model_validate(t, from_attributes=True) for t in turnos]
+    return JSONResponse(jsonable_encoder(validados)).body
+
+def semana_despues(db) -> bytes:
+    return ORJSONResponse(serializacion.get_turnos(
+        db, serializacion.TURNO_ESQUEMA, limit=None, fecha_inicio=LUNES, fecha_fin=DOMINGO
+    )).body
+
+def completo_antes(db) -> bytes:
+    turnos = crud.get_turnos(db, limit=None, fecha_inicio=LUNES, fecha_fin=DOMINGO)
+    return JSONResponse(jsonable_encoder({"turnos": turnos})).body
+
+def completo_despues(db) -> bytes:
+    return ORJSONResponse({"turnos": serializacion.get_turnos(
+        db, limit=None, fecha_inicio=LUNES, fecha_fin=DOMINGO
+    )}).body
+
+
+def medir(Sesion, funcion, repeticiones: int) -> float:
+    """Respuestas por segundo, con una sesión nueva por pedido como en las rutas."""
+    inicio = reloj.perf_counter()
+    for _ in range(repeticiones):
+        with Sesion() as db:
+            funcion(db)
+    return repeticiones / (reloj.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turnos", type=int, default=1000)
+    parser.add_argument("--url", default="sqlite:///" + os.path.join(tempfile.gettempdir(), "bench_serializacion.db"))
+    parser.add_argument("--repeticiones", type=int, default=30)
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    cargar_datos(engine, args.turnos)
+    Sesion = sessionmaker(bind=engine)
+
+    for titulo, antes, despues in (
+        ("/turnos/semana (schemas.Turno)", semana_antes, semana_despues),
+        ("/turnos/fecha y /turnos/ (objeto ORM)", completo_antes, completo_despues),
+    ):
+        with Sesion() as db:
+            iguales = json.loads(antes(db)) == json.loads(despues(db))
+        # Una vuelta de calentamiento para cada lado
+        medir(Sesion, antes, 2), medir(Sesion, despues, 2)
+        por_seg_antes = medir(Sesion, antes, args.repeticiones)
+        por_seg_despues = medir(Sesion, despues, args.repeticiones)
+        print(f"\n== {titulo}, {args.turnos} turnos (misma respuesta: {iguales})")
+        print(f"  antes:   {por_seg_antes:8.1f} respuestas/s  ({1000 / por_seg_antes:7.2f} ms)")
+        print(f"  después: {por_seg_despues:8.1f} respuestas/s  ({1000 / por_seg_despues:7.2f} ms)")
+        print(f"  x{por_seg_despues / por_seg_antes:.1f}")
+
+
+if __name__ == "__main__":
+    main()
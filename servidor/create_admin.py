@@ -1,11 +1,9 @@
 """Crea un usuario admin en la base TENANT (ej: juancho-barber)."""
 from app.core.config import TenantSessionLocal
 from app.models.models import Usuario
-from passlib.context import CryptContext
+from app.core.seguridad import pwd_context
 from sqlalchemy.exc import IntegrityError
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 def crear_admin():
     db = TenantSessionLocal()
     try:
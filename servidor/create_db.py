@@ -1,13 +1,26 @@
 """Crea tablas en la base de datos del tenant (clientes/servicios/turnos)."""
-from app.core.config import tenant_engine, TenantBase  # <<--- cambiar Base por TenantBase
+from app.core.config import tenant_engine, TenantBase, TenantSessionLocal  # <<--- cambiar Base por TenantBase
+from app.crud import migraciones
 from app.models import models  # importa definiciones
 
 
 def crear_base_de_datos():
     print("Creando tablas en base TENANT (barbería)...")
     TenantBase.metadata.create_all(bind=tenant_engine)  # <<--- usar TenantBase
+    models.asegurar_columnas(tenant_engine)
     print("OK base TENANT")
 
 
+def aplicar_migraciones():
+    # Las mismas que corre la app al arrancar; cada una se aplica una sola vez
+    db = TenantSessionLocal()
+    try:
+        for nombre, resultado in migraciones.aplicar_pendientes(db).items():
+            print(f"Migración {nombre}: {resultado}")
+    finally:
+        db.close()
+
+
 if __name__ == "__main__":
     crear_base_de_datos()
+    aplicar_migraciones()
@@ -0,0 +1,282 @@
+"""Genera datos sintéticos en volumen (millones de turnos) para reproducir
+problemas de rendimiento con bases del tamaño de producción.
+
+Los turnos se reparten hacia atrás desde hoy + ``--dias-futuro`` hasta
+completar la cantidad pedida (con muchos turnos abarca años), sin
+superponerse por barbero, con menos trabajo entre semana que los sábados,
+domingos cerrados, almuerzos y vacaciones bloqueados y estados según si el
+día ya pasó. También se generan sus franjas de ``reservas_horario`` y el
+``resumen_diario``. Con la misma semilla y ``--hoy`` se obtienen
+exactamente las mismas filas.
+
+Las filas se insertan por lotes con ``insert()`` executemany; en PostgreSQL
+(psycopg) con ``COPY``.
+
+Uso:
+    python generar_datos.py --turnos 2000000 --clientes 200000 --barberos 12 --vaciar
+    python generar_datos.py --tenant postgresql://u:p@localhost/barberia_a --tenant postgresql://u:p@localhost/barberia_b
+
+Sin ``--vaciar`` las tablas de clientes y turnos deben estar vacías; los
+servicios y barberos que ya existan se reutilizan. ``--vaciar`` borra TODAS
+las tablas (también usuarios: correr ``create_admin.py`` después). Los
+servidores levantados deben reiniciarse para no servir caches viejas.
+"""
+import argparse
+import random
+import time as reloj
+from datetime import date, time, timedelta
+from typing import Dict, List
+
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlalchemy.orm import sessionmaker
+
+from app.core import seguridad
+from app.core.config import TenantBase, settings
+from app.crud import agenda, crud, migraciones, telefonos
+from app.models import models
+from app.models.models import BloqueoAgenda, Clientes, ReservaHorario, Servicio, Turno, Usuario
+
+LOTE = 50_000
+SERVICIOS = (
+    # nombre, duración, precio en centavos, peso en la demanda
+    ("Corte de cabello", 30, 2500, 50),
+    ("Arreglo de barba", 30, 1500, 20),
+    ("Corte + Barba", 60, 3500, 20),
+    ("Tinte", 90, 5000, 5),
+    ("Peinado", 30, 2000, 5),
+)
+JORNADA = (time(9, 0), time(22, 0))
+ALMUERZO = (time(13, 0), time(14, 0))
+# Demanda relativa por día de la semana (lunes = 0; domingo cerrado)
+DEMANDA_DIA = (0.7, 0.75, 0.8, 0.9, 1.0, 1.2, 0.0)
+ESTADOS_PASADO = (("completado", 78), ("cancelado", 12), ("confirmado", 5), ("pendiente", 5))
+ESTADOS_FUTURO = (("pendiente", 60), ("confirmado", 35), ("cancelado", 5))
+NO_NOTIFICADOS = 30
+
+NOMBRES = ("Juan", "Carlos", "Martín", "Lucas", "Diego", "Pablo", "Matías", "Nicolás", "Santiago", "Federico",
+           "Tomás", "Agustín", "Facundo", "Gonzalo", "Javier", "Sofía", "Lucía", "Valentina", "Camila", "Julieta")
+APELLIDOS = ("González", "Rodríguez", "Gómez", "Fernández", "López", "Díaz", "Martínez", "Pérez", "García",
+             "Sánchez", "Romero", "Sosa", "Álvarez", "Torres", "Ruiz", "Ramírez", "Flores", "Acosta", "Benítez")
+
+
+def _hora(minutos: int) -> time:
+    return time(minutos // 60, minutos % 60)
+
+def _minutos(hora: time) -> int:
+    return hora.hour * 60 + hora.minute
+
+
+def telefono(numero: int, azar: random.Random) -> str:
+    """Mismo número (área 11 + 8 dígitos) escrito como lo cargaría la gente."""
+    local = f"{numero % 100_000_000:08d}"
+    return azar.choice((
+        f"11{local}",
+        f"11 {local[:4]}-{local[4:]}",
+        f"+54 9 11 {local[:4]}-{local[4:]}",
+        f"011 {local[:4]}-{local[4:]}",
+    ))
+
+
+class Insertador:
+    """Acumula filas por tabla y las escribe de a ``LOTE``."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.copy = conn.dialect.driver == "psycopg"
+        self.pendientes: Dict[object, List[dict]] = {}
+        self.totales: Dict[str, int] = {}
+
+    def agregar(self, tabla, fila: dict):
+        filas = self.pendientes.setdefault(tabla, [])
+        filas.append(fila)
+        if len(filas) >= LOTE:
+            self.escribir(tabla)
+
+    def escribir(self, tabla):
+        filas = self.pendientes.pop(tabla, None)
+        if not filas:
+            return
+        if self.copy:
+            columnas = list(filas[0])
+            cursor = self.conn.connection.dbapi_connection.cursor()
+            try:
+                with cursor.copy(f"COPY {tabla.__tablename__} ({', '.join(columnas)}) FROM STDIN") as copia:
+                    for fila in filas:
+                        copia.write_row([fila[c] for c in columnas])
+            finally:
+                cursor.close()
+        else:
+            self.conn.execute(insert(tabla), filas)
+        self.totales[tabla.__tablename__] = self.totales.get(tabla.__tablename__, 0) + len(filas)
+
+    def terminar(self):
+        for tabla in list(self.pendientes):
+            self.escribir(tabla)
+
+
+def _barberos(conn, cantidad: int) -> List[int]:
+    existentes = dict(conn.execute(select(Usuario.usuario, Usuario.id).where(Usuario.rol == "barbero")).all())
+    faltantes = [f"barbero{i}" for i in range(1, cantidad + 1) if f"barbero{i}" not in existentes]
+    if faltantes:
+        # Un solo hash para todos: bcrypt por fila haría la carga muy lenta
+        password_hash = seguridad.hashear("barbero")
+        conn.execute(insert(Usuario), [
+            {"nombre": f"Barbero {u[7:]}", "usuario": u, "password_hash": password_hash, "rol": "barbero"}
+            for u in faltantes
+        ])
+    ids = conn.execute(select(Usuario.id).where(Usuario.rol == "barbero").order_by(Usuario.id)).scalars().all()
+    return list(ids[:cantidad])
+
+
+def _servicios(conn) -> List[tuple]:
+    """(id, duración, peso) de los servicios; si no hay, se crean los de ejemplo."""
+    if conn.execute(select(func.count(Servicio.id))).scalar() == 0:
+        conn.execute(insert(Servicio), [
+            {"nombre": nombre, "duracion_min": duracion, "precio": precio} for nombre, duracion, precio, _ in SERVICIOS
+        ])
+    pesos = {nombre: peso for nombre, _, _, peso in SERVICIOS}
+    return [(id_, duracion, pesos.get(nombre, 5))
+            for id_, nombre, duracion in conn.execute(
+                select(Servicio.id, Servicio.nombre, Servicio.duracion_min).order_by(Servicio.id)
+            )]
+
+
+def _ajustar_secuencias(conn):
+    # Los ids se insertaron explícitos: en PostgreSQL las secuencias quedan atrás
+    if conn.dialect.name == "postgresql":
+        for tabla in ("clientes", "turnos"):
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{tabla}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {tabla}))"
+            ))
+
+
+def generar(engine, turnos: int, clientes: int, barberos: int, dias_futuro: int = 30, ocupacion: float = 0.6,
+            bloqueos: float = 0.3, semilla: int = 42, hoy: date = None, vaciar: bool = False) -> dict:
+    """Llena la base de ``engine`` y devuelve un resumen con el rango de fechas generado."""
+    azar = random.Random(semilla)
+    hoy = hoy or date.today()
+    if vaciar:
+        TenantBase.metadata.drop_all(engine)
+    TenantBase.metadata.create_all(engine)
+    models.asegurar_columnas(engine)
+
+    inicio_jornada, fin_jornada = map(_minutos, JORNADA)
+    inicio_almuerzo, fin_almuerzo = map(_minutos, ALMUERZO)
+    with engine.begin() as conn:
+        if conn.execute(select(Turno.id).limit(1)).first() or conn.execute(select(Clientes.id).limit(1)).first():
+            raise SystemExit("La base ya tiene clientes o turnos; usar --vaciar para reemplazarlos")
+        ids_barberos = _barberos(conn, barberos)
+        servicios = _servicios(conn)
+        pesos_servicios = [peso for _, _, peso in servicios]
+        lote = Insertador(conn)
+
+        for i in range(1, clientes + 1):
+            numero = telefono(10_000_000 + i, azar)
+            lote.agregar(Clientes, {
+                "id": i, "nombre": f"{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)}",
+                "telefono": numero, "telefono_normalizado": telefonos.normalizar(numero),
+            })
+
+        generados = bloqueados = 0
+        fecha = hoy + timedelta(days=dias_futuro)
+        while generados < turnos:
+            demanda = DEMANDA_DIA[fecha.weekday()]
+            if demanda == 0:
+                fecha -= timedelta(days=1)
+                continue
+            if azar.random() < 0.01:
+                # Vacaciones / día no laborable: sin turnos
+                lote.agregar(BloqueoAgenda, {"fecha": fecha, "todo_dia": True, "hora_inicio": None,
+                                             "hora_fin": None, "motivo": "Cerrado"})
+                bloqueados += 1
+                fecha -= timedelta(days=1)
+                continue
+            almuerzo = azar.random() < bloqueos
+            if almuerzo:
+                lote.agregar(BloqueoAgenda, {"fecha": fecha, "todo_dia": False, "hora_inicio": ALMUERZO[0],
+                                             "hora_fin": ALMUERZO[1], "motivo": "Almuerzo"})
+                bloqueados += 1
+            pasado = fecha < hoy
+            estados, pesos_estados = zip(*(ESTADOS_PASADO if pasado else ESTADOS_FUTURO))
+            probabilidad = min(1.0, ocupacion * demanda)
+            for barbero in ids_barberos:
+                minuto = inicio_jornada
+                while minuto < fin_jornada and generados < turnos:
+                    servicio_id, duracion, _ = azar.choices(servicios, pesos_servicios)[0]
+                    fin = minuto + duracion
+                    if almuerzo and minuto < fin_almuerzo and fin > inicio_almuerzo:
+                        minuto = fin_almuerzo
+                        continue
+                    if fin > fin_jornada or azar.random() >= probabilidad:
+                        minuto += agenda.MINUTOS_FRANJA
+                        continue
+                    generados += 1
+                    estado = azar.choices(estados, pesos_estados)[0]
+                    hora_inicio, hora_fin = _hora(minuto), _hora(fin)
+                    lote.agregar(Turno, {
+                        "id": generados, "cliente_id": azar.randint(1, clientes), "servicio_id": servicio_id,
+                        "barbero_id": barbero, "fecha": fecha, "hora_inicio": hora_inicio, "hora_fin": hora_fin,
+                        "estado": estado,
+                        # Los primeros generados son los más nuevos: el panel los ve sin avisar
+                        "notificado": generados > NO_NOTIFICADOS, "recurrencia_id": None,
+                    })
+                    if estado != "cancelado":
+                        for franja in agenda.franjas_reserva(hora_inicio, hora_fin):
+                            lote.agregar(ReservaHorario, {"turno_id": generados, "fecha": fecha,
+                                                          "barbero_id": barbero, "franja": franja})
+                    minuto = fin
+            fecha -= timedelta(days=1)
+        lote.terminar()
+        _ajustar_secuencias(conn)
+        # Las franjas, teléfonos y resumen ya se generan completos
+        for nombre, _ in migraciones.MIGRACIONES:
+            conn.execute(migraciones.sentencia_marca(conn.dialect.name, nombre))
+
+    with sessionmaker(bind=engine)() as db:
+        filas_resumen = crud.reconstruir_resumen(db)
+
+    return {
+        "hoy": hoy,
+        "desde": fecha + timedelta(days=1),
+        "hasta": hoy + timedelta(days=dias_futuro),
+        # Primer día posterior sin turnos
+        "disputado": hoy + timedelta(days=dias_futuro + 1),
+        "barberos": ids_barberos,
+        "servicios": [id_ for id_, _, _ in servicios],
+        "turnos": generados,
+        "bloqueos": bloqueados,
+        "filas": {**lote.totales, "resumen_diario": filas_resumen},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenant", action="append", help="URL de la base (se puede repetir); por defecto DATABASE_URL")
+    parser.add_argument("--turnos", type=int, default=1_000_000)
+    parser.add_argument("--clientes", type=int, default=100_000)
+    parser.add_argument("--barberos", type=int, default=8)
+    parser.add_argument("--dias-futuro", type=int, default=30)
+    parser.add_argument("--ocupacion", type=float, default=0.6, help="fracción de franjas con turno un viernes")
+    parser.add_argument("--bloqueos", type=float, default=0.3, help="fracción de días con almuerzo bloqueado")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--hoy", type=date.fromisoformat, help="fecha de referencia (AAAA-MM-DD) para repetir la carga")
+    parser.add_argument("--vaciar", action="store_true", help="borrar todas las tablas antes de cargar")
+    args = parser.parse_args()
+
+    for indice, url in enumerate(args.tenant or [settings.DATABASE_URL]):
+        inicio = reloj.perf_counter()
+        engine = create_engine(url)
+        try:
+            # Cada barbería con su propia secuencia, repetible desde la semilla
+            datos = generar(engine, args.turnos, args.clientes, args.barberos, args.dias_futuro, args.ocupacion,
+                            args.bloqueos, args.semilla + indice, args.hoy, args.vaciar)
+        finally:
+            engine.dispose()
+        print(f"{engine.url.render_as_string(hide_password=True)}: {datos['turnos']} turnos del "
+              f"{datos['desde']} al {datos['hasta']} en {reloj.perf_counter() - inicio:.1f} s")
+        for tabla, filas in datos["filas"].items():
+            print(f"  {tabla}: {filas}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Importa clientes desde un CSV (columnas nombre y telefono) por lotes.
+
+Los teléfonos se comparan normalizados: un cliente que ya existe con el
+mismo número (escrito de cualquier forma) se actualiza en lugar de duplicarse.
+
+Uso:
+    python importar_clientes.py clientes.csv
+    python importar_clientes.py clientes.csv --tenant postgresql://u:p@localhost/barberia --lote 5000
+"""
+import argparse
+import csv
+
+from app.core.config import get_tenant_db
+from app.crud import crud
+
+
+def importar(ruta: str, tenant_db_url: str = None, tamano_lote: int = 1000) -> dict:
+    sesiones = get_tenant_db(tenant_db_url)
+    db = next(sesiones)
+    try:
+        with open(ruta, encoding="utf-8-sig", newline="") as archivo:
+            lector = csv.DictReader(archivo)
+            filas = ({(k or "").strip().lower(): v for k, v in fila.items()} for fila in lector)
+            return crud.importar_clientes(db, filas, tamano_lote)
+    finally:
+        sesiones.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("archivo")
+    parser.add_argument("--tenant", help="URL de la base de la barbería; por defecto DATABASE_URL")
+    parser.add_argument("--lote", type=int, default=1000, help="filas por transacción")
+    args = parser.parse_args()
+
+    resultado = importar(args.archivo, args.tenant, args.lote)
+    print(f"Creados: {resultado['creados']}, actualizados: {resultado['actualizados']}, "
+          f"sin cambios: {resultado['sin_cambios']}, con error: {resultado['errores']}")
+    for error in resultado["detalle_errores"]:
+        print(f"  fila {error['fila']}: {error['detalle']}")
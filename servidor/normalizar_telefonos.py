@@ -0,0 +1,29 @@
+"""Completa el teléfono normalizado de los clientes existentes.
+
+Uso:
+    python normalizar_telefonos.py              # normaliza; los duplicados quedan sin normalizar
+    python normalizar_telefonos.py --fusionar   # además pasa sus turnos al cliente que queda
+
+Los clientes duplicados (mismo número escrito distinto) no se borran.
+``create_db.py`` ya corre la normalización sin fusionar.
+"""
+import argparse
+
+from app.core.config import TenantSessionLocal
+from app.crud import crud
+
+
+def normalizar_telefonos(fusionar: bool = False):
+    db = TenantSessionLocal()
+    try:
+        resultado = crud.normalizar_telefonos(db, fusionar)
+        print(f"Teléfonos normalizados: {resultado['normalizados']}, duplicados: {resultado['duplicados']}, "
+              f"inválidos: {resultado['invalidos']}, clientes fusionados: {resultado['clientes_fusionados']}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fusionar", action="store_true", help="reasignar los turnos de los duplicados")
+    normalizar_telefonos(parser.parse_args().fusionar)
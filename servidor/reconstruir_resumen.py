@@ -0,0 +1,37 @@
+"""Recalcula la tabla resumen_diario a partir de los turnos.
+
+Uso:
+    python reconstruir_resumen.py                      # todo el historial
+    python reconstruir_resumen.py 2024-01-01 2024-12-31 # sólo ese rango
+
+Conviene correrlo fuera del horario de atención: las reservas que se hagan
+mientras se reconstruye un rango pueden quedar sin contar hasta la próxima
+reconstrucción de ese rango.
+"""
+import sys
+from datetime import datetime
+
+from app.core.config import TenantSessionLocal
+from app.crud import crud
+from app.models import models  # importa definiciones
+
+
+def _fecha(valor: str):
+    return datetime.strptime(valor, "%Y-%m-%d").date()
+
+
+def reconstruir_resumen(desde=None, hasta=None):
+    db = TenantSessionLocal()
+    try:
+        filas = crud.reconstruir_resumen(db, desde, hasta)
+        print(f"Resumen diario reconstruido: {filas} filas")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    argumentos = sys.argv[1:]
+    reconstruir_resumen(
+        _fecha(argumentos[0]) if len(argumentos) > 0 else None,
+        _fecha(argumentos[1]) if len(argumentos) > 1 else None,
+    )